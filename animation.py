@@ -1,7 +1,13 @@
+import heapq
+import math
 from abc import ABC, abstractmethod
-from typing import Any, Callable, List, Tuple
-from shapes import ColorNames, Point, Shape, Circle, Color
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+from time import perf_counter
+from shapes import BoundingBox, ColorNames, Point, Shape, Circle, Color, Text, approximate_text_size
 from utility import ratiod
+import profiling
 
 
 class Animation(ABC):
@@ -16,17 +22,202 @@ class Animation(ABC):
     If you do that, the rest of the framework will be able to run
     your animation. Feel free to add as much or as little as you 
     like.
+
+    If you know your animation never draws outside some area, say so
+    with `bounds`. Culling can then skip it without running it.
     """
 
-    def __init__(self, duration: int, name: str = ''):
+    def __init__(self, duration: int, name: str = '', bounds: BoundingBox | None = None):
         self.duration = duration
         self.name = name
+        self.bounds = bounds
+
+    @property
+    def seekable(self) -> bool:
+        """True if get_state depends only on the time it's given, so
+        frames can be asked for in any order. Override this if your
+        animation is a pure function of time.
+        """
+        return False
 
     @abstractmethod
     def get_state(self, time:int) -> List[Shape]:
         raise NotImplementedError
 
 
+@dataclass
+class TimelineEntry():
+    """A leaf animation pinned to the outermost Scene's clock.
+
+    `offset` is what you subtract from the outer time to get the
+    animation's local time. `start`/`end` is the window (inclusive)
+    where it's active, already clipped by every Scene it was nested in.
+    `order` is its position in a depth-first walk, so shapes come out
+    in the same order they always have. `bounds` is the tightest area
+    declared by it or any Scene it's in (None if nobody declared one).
+    """
+    start: float
+    end: float
+    offset: int
+    order: int
+    animation: Animation
+    path: Tuple[str, ...] = field(default_factory=tuple)
+    bounds: BoundingBox | None = None
+
+
+def flatten_timeline(
+    animations: List[Tuple[int, Animation]],
+    offset: int = 0,
+    window: Tuple[float, float] = (float('-inf'), float('inf')),
+    path: Tuple[str, ...] = (),
+    into: List[TimelineEntry] | None = None,
+    bounds: BoundingBox | None = None
+) -> List[TimelineEntry]:
+    """Walks nested Scenes and returns their leaf animations.
+
+    Only plain Scenes are flattened. If you subclass Scene and override
+    get_state, your Scene is treated as a leaf so your code still runs.
+    """
+    entries: List[TimelineEntry] = [] if into is None else into
+    for (start_time, a) in animations:
+        start = max(window[0], offset + start_time)
+        end = min(window[1], offset + start_time + a.duration)
+        if start > end:
+            continue
+
+        declared = bounds
+        if a.bounds is not None:
+            declared = a.bounds if bounds is None else bounds.intersection(a.bounds)
+
+        if isinstance(a, Scene) and type(a).get_state is Scene.get_state:
+            flatten_timeline(
+                a._animations, offset + start_time, (start, end),
+                path + (a.name,), entries, declared
+            )
+        else:
+            entries.append(TimelineEntry(
+                start=start,
+                end=end,
+                offset=offset + start_time,
+                order=len(entries),
+                animation=a,
+                path=path + (a.name,),
+                bounds=declared
+            ))
+    return entries
+
+
+class _IntervalNode():
+    "A node in a centered interval tree (helper for TimelineIndex)"
+
+    def __init__(self, entries: List[TimelineEntry]):
+        points = sorted(p for e in entries for p in (e.start, e.end))
+        self.center = points[len(points) // 2]
+
+        here = [e for e in entries if e.start <= self.center <= e.end]
+        left = [e for e in entries if e.end < self.center]
+        right = [e for e in entries if e.start > self.center]
+
+        self.by_start = sorted(here, key=lambda e: e.start)
+        self.by_end = sorted(here, key=lambda e: e.end, reverse=True)
+        self.left = _IntervalNode(left) if left else None
+        self.right = _IntervalNode(right) if right else None
+
+
+class TimelineIndex():
+    """Answers "which leaf animations are active at time t?"
+
+    Builds a centered interval tree over the flattened leaves, so a
+    query costs O(log n + k) where k is the number of active leaves
+    rather than touching every child of every Scene.
+    """
+
+    def __init__(self, entries: List[TimelineEntry]):
+        self.entries = entries
+        self._root = _IntervalNode(entries) if entries else None
+
+    def active_at(self, time: float) -> List[TimelineEntry]:
+        "Active entries, in the order their shapes should be drawn"
+        found: List[TimelineEntry] = []
+        node = self._root
+        while node is not None:
+            if time < node.center:
+                for e in node.by_start:
+                    if e.start > time: break
+                    found.append(e)
+                node = node.left
+            elif time > node.center:
+                for e in node.by_end:
+                    if e.end < time: break
+                    found.append(e)
+                node = node.right
+            else:
+                found += node.by_start
+                node = None
+
+        found.sort(key=lambda e: e.order)
+        return found
+
+    def cursor(self) -> 'TimelineCursor':
+        return TimelineCursor(self)
+
+
+class TimelineCursor():
+    """Walks a TimelineIndex forward in time
+
+    Playback mostly asks for time t, then a little later than t, then
+    a little later than that. The cursor keeps the active set around
+    between calls and only adds the leaves that started and drops the
+    ones that ended since last time. Going backward just re-seeks
+    using the index.
+    """
+
+    def __init__(self, index: TimelineIndex):
+        self._index = index
+        self._by_start = sorted(index.entries, key=lambda e: (e.start, e.order))
+        self.reset()
+
+    def reset(self) -> None:
+        self.time = float('-inf')
+        self._next = 0
+        self._ends: List[Tuple[float, int]] = []
+        self._active_orders: List[int] = []
+
+    def seek(self, time: float) -> List[TimelineEntry]:
+        "Jump straight to time (forward or backward)"
+        active = self._index.active_at(time)
+        self.time = time
+        self._next = bisect_left(
+            self._by_start, (time, float('inf')),
+            key=lambda e: (e.start, e.order)
+        )
+        self._active_orders = [e.order for e in active]
+        self._ends = [(e.end, e.order) for e in active]
+        heapq.heapify(self._ends)
+        return active
+
+    def advance(self, time: float) -> List[TimelineEntry]:
+        "Move forward to time and return the active entries"
+        if time < self.time:
+            return self.seek(time)
+
+        entries = self._index.entries
+        by_start = self._by_start
+        while self._next < len(by_start) and by_start[self._next].start <= time:
+            e = by_start[self._next]
+            self._next += 1
+            if e.end >= time:
+                insort(self._active_orders, e.order)
+                heapq.heappush(self._ends, (e.end, e.order))
+
+        while self._ends and self._ends[0][0] < time:
+            _, order = heapq.heappop(self._ends)
+            del self._active_orders[bisect_left(self._active_orders, order)]
+
+        self.time = time
+        return [entries[o] for o in self._active_orders]
+
+
 class Scene(Animation):
     """Combining animations
 
@@ -34,26 +225,126 @@ class Scene(Animation):
     in a tuple that describes when that animation starts. Since Scenes
     can be aribrarily nested, this lets you build complex animations 
     from more primitive ones.
+
+    Nested Scenes are flattened into a TimelineIndex when the Scene is
+    built, so each frame only touches the animations that are running.
     """
 
-    def __init__(self, animations: List[Tuple[int, Animation]], name: str = ''):
+    def __init__(self, animations: List[Tuple[int, Animation]], name: str = '', bounds: BoundingBox | None = None):
         self._animations = animations
         super().__init__(
             name=name,
             duration=max(
                 map(lambda v: v[0] + v[1].duration, animations)
-            )
+            ),
+            bounds=bounds
         )
+        self.timeline = TimelineIndex(flatten_timeline(animations))
+        self._cursor = self.timeline.cursor()
+
+    @property
+    def seekable(self) -> bool:
+        return all(e.animation.seekable for e in self.timeline.entries)
 
     def get_state(self, time:int) -> List[Shape]:
-        shapes = []
-        for (start_time, a) in self._animations:
-            if(time >= start_time and time <= start_time + a.duration):
-                shapes += a.get_state(time - start_time)
+        shapes: List[Shape] = []
+        profiler = profiling.current
+        if profiler is None:
+            for e in self._cursor.advance(time):
+                shapes += e.animation.get_state(time - e.offset)
+        else:
+            for e in self._cursor.advance(time):
+                start = perf_counter()
+                state = e.animation.get_state(time - e.offset)
+                profiler.record_state(e.path, perf_counter() - start, len(state))
+                shapes += state
         
         return shapes
 
 
+class StreamingScene(Animation):
+    """A Scene whose children are made as they're needed
+
+    Takes (start_time, child) pairs in order of start time, from any
+    iterable (a generator is the point). A child can be an Animation or
+    a function that makes one. Children are pulled (and made) at most
+    `lookahead` milliseconds before they start and let go of as soon
+    as they end, so only what's running (or about to) is in memory.
+    An hour long show never exists all at once.
+
+    The duration can't be worked out without making every child, so
+    give it if you know it; otherwise it's infinite (it plays until
+    you stop it). Time can only go forward, unless `children` is a
+    function returning a fresh iterable, then going back starts over.
+    """
+
+    def __init__(self,
+        children: Iterable[Tuple[int, Animation | Callable[[], Animation]]] | Callable[[], Iterable[Tuple[int, Animation | Callable[[], Animation]]]],
+        duration: float | None = None,
+        lookahead: int = 500,
+        name: str = '',
+        bounds: BoundingBox | None = None
+    ):
+        super().__init__(math.inf if duration is None else duration, name, bounds)  # type: ignore
+        self._source = children
+        self.lookahead = lookahead
+        self._rewind()
+
+    def _rewind(self) -> None:
+        source = self._source() if callable(self._source) else self._source
+        self._children: Iterator = iter(source)
+        self._upcoming: Tuple[int, Any] | None = None
+        self._last_start = -math.inf
+        # (start time, animation) in the order they were pulled
+        self._active: List[Tuple[int, Animation]] = []
+        self._time = -math.inf
+
+    def _pull(self, until: float) -> None:
+        while True:
+            if self._upcoming is None:
+                self._upcoming = next(self._children, None)
+                if self._upcoming is None:
+                    return
+                if self._upcoming[0] < self._last_start:
+                    raise ValueError("StreamingScene children have to come in order of start time")
+                self._last_start = self._upcoming[0]
+
+            start, child = self._upcoming
+            if start > until:
+                return
+            self._active.append((start, child if isinstance(child, Animation) else child()))
+            self._upcoming = None
+
+    @property
+    def active(self) -> List[Tuple[int, Animation]]:
+        "The children in memory right now, (start time, animation)"
+        return list(self._active)
+
+    def get_state(self, time:int) -> List[Shape]:
+        if time < self._time:
+            if not callable(self._source):
+                raise ValueError("this StreamingScene can't go back in time")
+            self._rewind()
+        self._time = time
+
+        self._pull(time + self.lookahead)
+        self._active = [(start, a) for start, a in self._active if time <= start + a.duration]
+
+        shapes: List[Shape] = []
+        profiler = profiling.current
+        for start, a in self._active:
+            if time < start:
+                continue
+            if profiler is None:
+                shapes += a.get_state(time - start)
+            else:
+                begin = perf_counter()
+                state = a.get_state(time - start)
+                profiler.record_state((self.name, a.name), perf_counter() - begin, len(state))
+                shapes += state
+        return shapes
+
+
 class CirleMove(Animation):
     """Animation
 
@@ -81,6 +372,10 @@ class CirleMove(Animation):
 
         super().__init__(*args, **kwargs)
 
+    @property
+    def seekable(self) -> bool:
+        return True
+
     def get_state(self, time:int) -> List[Shape]:
         if(time > 0 and time < self.duration):
 
@@ -122,6 +417,10 @@ class CircleTravelAlongAFunction(Animation):
 
         super().__init__(*args, **kwargs)
 
+    @property
+    def seekable(self) -> bool:
+        return True
+
 
     def get_state(self, time:int) -> List[Shape]:
         if(time > 0 and time < self.duration):
@@ -136,3 +435,63 @@ class CircleTravelAlongAFunction(Animation):
             return [self._init_circle]
         
         return []
+
+
+class ProfilerOverlay(Animation):
+    """Draws a profiler's last finished frame on the canvas
+
+    Runs forever, add it to a Compositor alongside whatever you're
+    watching and remove its layer to hide it. The slowest layers and
+    animations are listed, one Text per line (reused every frame).
+    """
+
+    def __init__(self,
+        profiler: 'profiling.Profiler',
+        position: Point = Point(10, 10),
+        rows: int = 5,
+        color: Color = ColorNames.RED(),
+        font_size: int = 9
+    ):
+        super().__init__(float('inf'), 'Profiler')  # type: ignore
+        self.profiler = profiler
+        self.rows = rows
+        self._left = position.x
+        self._font_size = font_size
+        self._lines = [
+            Text(
+                position=Point(position.x, position.y + round(i * font_size * 1.6)),
+                color=color.copy(),
+                font_family='Courier',
+                font_size=font_size
+            )
+            for i in range(2 * rows + 2)
+        ]
+
+    @property
+    def seekable(self) -> bool:
+        return True
+
+    def lines(self) -> List[str]:
+        frame = self.profiler.last
+        if frame is None:
+            return ['profiling...']
+
+        text = [f'frame {frame.elapsed * 1000:6.1f} ms   canvas.update {frame.canvas_update * 1000:5.1f} ms']
+        for name, l in frame.slowest_layers(self.rows):
+            text.append(
+                f'{name[:24]:24} {l.total * 1000:6.1f} ms  eval {l.evaluate * 1000:5.1f}'
+                f'  +{l.created} ~{l.updated} -{l.deleted}'
+            )
+        text.append('')
+        for path, a in frame.slowest_animations(self.rows):
+            text.append(f"{'/'.join(path)[-24:]:24} {a.seconds * 1000:6.1f} ms  {a.shapes} shapes")
+        return text
+
+    def get_state(self, time:int) -> List[Shape]:
+        shapes: List[Shape] = []
+        for line, text in zip(self._lines, self.lines()):
+            # Text is centered on its position, shift it to line up on the left
+            line.position.x = self._left + approximate_text_size(text or ' ', self._font_size).x // 2
+            line.text = text
+            shapes.append(line)
+        return shapes
@@ -1,14 +1,25 @@
-import copy
 from animation import Animation
-from typing import Any, Callable, List, TypeVar
-from shapes import Picture, Point, Shape, Color
+from typing import Any, Callable, Dict, List, Tuple, TypeVar
+from shapes import Picture, Point, Shape, Color, clone_value, copy_into
+from easing import ease, easing_id
+from gradient import Gradient
 from utility import clamp_int, ratiod
 
 
 class AnimationBuilder(Animation):
     """Animate properties on a subject (Picture)
 
-    Be careful, 
+    Animators made with animate_property (and the animate_* helpers
+    below) are pure functions of time. When they're added, the builder
+    snapshots the subject's properties and works out what each
+    animator starts from (whatever the animators before it left the
+    property at when it starts). After that, get_state(t) gives the
+    same answer for any t, asked in any order. Frames can be skipped,
+    scrubbed or split between workers.
+
+    Be careful, any other kind of animator (a plain function of the
+    subject) is just called every frame and may depend on the order
+    frames are asked for. Such a builder isn't seekable.
     """
     def __init__(self, 
         subject: Picture,
@@ -18,20 +29,114 @@ class AnimationBuilder(Animation):
     ):
         self._subject = subject
         self._animators: List[Callable[[int], None]] = []
+        # prop -> (snapshot of its value before any animation, when the
+        # first track for it starts)
+        self._initial: Dict[str, Tuple[Any, int]] = dict()
+        self._seekable = True
         self.add_animators(*animators)
         super().__init__(duration, *args, **kwargs)
 
+    @property
+    def seekable(self) -> bool:
+        return self._seekable
+
     def add_animators(self, *setters: Callable[[Picture], Callable[[int], None]]) -> None:
-        self._animators += [f(self._subject) for f in setters]
+        for f in setters:
+            animator = f(self._subject)
+            if isinstance(animator, BoundTrack):
+                self._resolve(animator)
+            else:
+                self._seekable = False
+            self._animators.append(animator)
+
+    def tracks(self) -> List['BoundTrack']:
+        return [a for a in self._animators if isinstance(a, BoundTrack)]
+
+    def _resolve(self, track: 'BoundTrack') -> None:
+        """Snapshots the property (the first time) and works out where
+        every track on it starts from.
+
+        A track starts from whatever the property is at its start time,
+        which is decided by the tracks that are already running then
+        (applied in the order they were added, like get_state does).
+        Going through the tracks by start time means those have always
+        been worked out already.
+        """
+        prop = track.prop
+        if prop not in self._initial:
+            self._initial[prop] = (clone_value(getattr(self._subject, prop)), track.start_time)
+        snapshot, first_start = self._initial[prop]
+        self._initial[prop] = (snapshot, min(first_start, track.start_time))
+
+        on_prop = [t for t in self.tracks() if t.prop == prop] + [track]
+        for current in sorted(on_prop, key=lambda t: t.start_time):
+            value = clone_value(snapshot)
+            for earlier in on_prop:
+                if earlier.start_time < current.start_time:
+                    value = earlier.evaluate(value, current.start_time)
+            current.init = value
+
+    def _restore(self, prop: str) -> None:
+        "Puts a property back how it was before any animation touched it"
+        snapshot, _ = self._initial[prop]
+        if not copy_into(getattr(self._subject, prop), snapshot):
+            setattr(self._subject, prop, clone_value(snapshot))
         
     def get_state(self, time:int) -> List[Shape]:
         if(time > 0 and time < self.duration):
 
+            for prop, (_, first_start) in self._initial.items():
+                if time - first_start <= 0:
+                    self._restore(prop)
             for anamate in self._animators:
                 anamate(time)
             return self._subject.get_shapes()
         
         return []
+
+
+class BoundTrack():
+    """An animate_property animator attached to a subject
+
+    Call it with a time to update the subject. `init` is what the
+    property is at start_time; AnimationBuilder works that out up
+    front. Used on its own (outside a builder) it captures init the
+    first time it runs, like it always has.
+    """
+
+    def __init__(self, track: 'PropertyTrack', src: Any):
+        self.track = track
+        self.src = src
+        self.prop = track.prop
+        self.start_time = track.start_time
+        self.prop_val = getattr(src, track.prop)
+        self.init: Any = None
+
+    def evaluate(self, value: Any, time: int) -> Any:
+        "Applies this track at time to a value that isn't on the subject"
+        newval = self.track.setter(value, self.init, time - self.start_time, **self.track.kwargs)
+        return value if newval is None else newval
+
+    def __call__(self, time: int) -> None:
+        local_time = time - self.start_time
+        if local_time > 0:
+            if self.init is None: self.init = clone_value(getattr(self.src, self.prop))
+            newval = self.track.setter(self.prop_val, self.init, local_time, **self.track.kwargs)
+            if not (newval is None): setattr(self.src, self.prop, newval)
+
+
+class PropertyTrack():
+    "What animate_property returns. Give it a subject to get a BoundTrack"
+
+    def __init__(self, prop: str, start_time: int, setter: Callable[..., Any], kwargs: Dict[str, Any]):
+        self.prop = prop
+        self.start_time = start_time
+        self.setter = setter
+        self.kwargs = kwargs
+
+    def __call__(self, src: Any) -> BoundTrack:
+        return BoundTrack(self, src)
+
         
 T = TypeVar('T')
 def animate_property(
@@ -39,19 +144,8 @@ def animate_property(
     start_time: int,
     setter: Callable[..., T|None],
     **kwargs: Any
-):
-    def curry_source(src: Any):
-        prop_val: T = getattr(src, prop)
-        init: T | None = None
-        def curry_time(time: int):
-            nonlocal init
-            local_time = time - start_time
-            if local_time > 0:
-                if init is None: init = copy.deepcopy(getattr(src, prop))
-                newval = setter(prop_val, init, local_time, **kwargs)
-                if not (newval is None): setattr(src, prop, newval)
-        return curry_time
-    return curry_source
+) -> PropertyTrack:
+    return PropertyTrack(prop, start_time, setter, kwargs)
 
 # Setters always have the form 
 #
@@ -62,42 +156,61 @@ def animate_property(
 # animate_property just passes any kwargs its given unchanged to the
 # setter. This lets you create a setter with any number of arguements
 
-def _int_setter_linear(property: int, initial:int, time:int, *, target:int, duration:int) -> int:
+# The "linear" setters take an optional easing (see easing.py), the
+# name stuck from before they did.
+
+def _int_setter_linear(property: int, initial:int, time:int, *, target:int, duration:int, easing: str = 'linear') -> int:
     "Type: UpdaterFunction[int]"
-    when = time/duration
+    when = ease(easing, time/duration)
     return ratiod(initial, target, when)
 
-def _point_setter_linear(property: Point, initial: Point, time: int, *, target: Point, duration: int) -> None:
+def _point_setter_linear(property: Point, initial: Point, time: int, *, target: Point, duration: int, easing: str = 'linear') -> None:
     "UpdaterFunction for Points"
-    when = time/duration
+    when = ease(easing, time/duration)
     property.x = ratiod(initial.x, target.x, when)
     property.y = ratiod(initial.y, target.y, when)
 
-def _color_setter_linear(property: Color, initial: Color, time: int, *, target: Color, duration: int) -> None:
+def _color_setter_linear(property: Color, initial: Color, time: int, *, target: Color, duration: int, easing: str = 'linear') -> None:
     "UpdaterFunction for Colors"
-    when = time/duration
+    when = ease(easing, time/duration)
     property.red = clamp_int(ratiod(initial.red, target.red, when), 0 ,255)
     property.green = clamp_int(ratiod(initial.green, target.green, when), 0 ,255)
     property.blue = clamp_int(ratiod(initial.blue, target.blue, when), 0 ,255)
 
-def _vertices_setter_linear(property: List[Point], initial: List[Point], time: int, *, target: List[Point], duration: int) -> None:
+def _gradient_setter(property: Color, initial: Color, time: int, *, gradient: Gradient, duration: int, easing: str = 'linear') -> None:
+    "UpdaterFunction for Colors, a table lookup rather than blending"
+    gradient.apply(property, ease(easing, time/duration))
+
+def _vertices_setter_linear(property: List[Point], initial: List[Point], time: int, *, target: List[Point], duration: int, easing: str = 'linear') -> None:
     "UpdaterFunction for a list of points"
     for p, i, t in zip(property, initial, target):
-        _point_setter_linear(p, i, time, target=t, duration=duration)
+        _point_setter_linear(p, i, time, target=t, duration=duration, easing=easing)
 
 # animate_property is a bit unweildy from an API perspective. It gives
 # you almost too much flexibility. So here we define a public api for
 # some ways to animate certain types of properties. These just defer
 # to animate_property underneith.
 
-def animate_int(prop: str, target: int, duration: int, start: int = 0):
-    return animate_property(prop, start, _int_setter_linear, target=target, duration=duration)
+def animate_int(prop: str, target: int, duration: int, start: int = 0, easing: str = 'linear'):
+    easing_id(easing)
+    return animate_property(prop, start, _int_setter_linear, target=target, duration=duration, easing=easing)
 
-def animate_point(prop: str, target: Point, duration: int, start:int = 0):
-    return animate_property(prop, start, _point_setter_linear, target=target, duration=duration)
+def animate_point(prop: str, target: Point, duration: int, start:int = 0, easing: str = 'linear'):
+    easing_id(easing)
+    return animate_property(prop, start, _point_setter_linear, target=target, duration=duration, easing=easing)
 
-def animate_color(prop: str, target: Color, duration: int, start:int = 0):
-    return animate_property(prop, start, _color_setter_linear, target=target, duration=duration)
+def animate_color(prop: str, target: Color, duration: int, start:int = 0, easing: str = 'linear'):
+    easing_id(easing)
+    return animate_property(prop, start, _color_setter_linear, target=target, duration=duration, easing=easing)
 
-def animate_vertices(prop: str, target: List[Point], duration: int, start:int = 0):
-    return animate_property(prop, start, _vertices_setter_linear, target=target, duration=duration)
\ No newline at end of file
+def animate_vertices(prop: str, target: List[Point], duration: int, start:int = 0, easing: str = 'linear'):
+    easing_id(easing)
+    return animate_property(prop, start, _vertices_setter_linear, target=target, duration=duration, easing=easing)
+
+def animate_gradient(prop: str, gradient: Gradient, duration: int, start: int = 0, easing: str = 'linear'):
+    """Runs a color through a Gradient. Unlike animate_color it doesn't
+    start from the color's current value, it starts at the gradient's
+    first color.
+    """
+    easing_id(easing)
+    return animate_property(prop, start, _gradient_setter, gradient=gradient, duration=duration, easing=easing)
@@ -0,0 +1,301 @@
+import mmap
+import os
+import struct
+from typing import Dict, List, Tuple
+import numpy as np
+from animation import Animation
+from export import frame_count, frame_time
+from shapes import Arc, BoxCoords, Circle, Color, Line, Oval, Point, Polygon, PrimitiveShape, Rectangle, Shape, Text
+from utility import gen_unique_number
+
+# Baked file layout (everything little-endian):
+#
+#   magic     8 bytes  b'HNBAKE01'
+#   header    fps (f64), duration, frames, records, coords, strings,
+#             name (string index) all i64
+#   sections  (offset, length) as two i64 for each entry in _COLUMNS
+#   data      each section, 8-byte aligned
+#
+# A "record" is one shape in one frame. Records are stored column by
+# column. frame_start[i] is the first record of frame i, so finding a
+# frame is one lookup.
+_MAGIC = b'HNBAKE01'
+_HEADER = struct.Struct('<d6q')
+_SECTION = struct.Struct('<2q')
+
+_COLUMNS: List[Tuple[str, type]] = [
+    ('frame_start', np.int64),
+    ('id', np.int64),
+    ('kind', np.uint8),
+    ('fill', np.int32),        # packed Color, -1 is invisible
+    ('outline', np.int32),
+    ('width', np.int32),       # border width, or line width
+    ('coord_start', np.int64),
+    ('coord_len', np.int32),
+    ('text', np.int32),        # string index, -1 for none
+    ('font_family', np.int32), # string index
+    ('font_size', np.int32),
+    ('flags', np.uint8),       # font style bits
+    ('arc_start', np.int32),
+    ('arc_extent', np.int32),
+    ('arc_style', np.int32),
+    ('coords', np.int32),      # x, y, x, y ... (Circle: x, y, radius)
+    ('string_start', np.int64),
+    ('string_data', np.uint8)
+]
+
+_KINDS: List[type] = [Text, Line, Circle, Polygon, Rectangle, Oval, Arc]
+_KIND_OF: Dict[type, int] = {k: i for i, k in enumerate(_KINDS)}
+
+_BOLD, _SLANT, _UNDERLINE, _OVERSTRIKE = 1, 2, 4, 8
+
+
+class _Columns():
+    "Collects records while baking"
+
+    def __init__(self) -> None:
+        self.data: Dict[str, list] = {name: [] for name, _ in _COLUMNS}
+        self.strings: Dict[str, int] = dict()
+
+    def string(self, s: str) -> int:
+        if s not in self.strings:
+            self.strings[s] = len(self.strings)
+        return self.strings[s]
+
+    def add(self, shape: Shape) -> None:
+        d = self.data
+        kind = _KIND_OF.get(type(shape))
+        if kind is None:
+            raise NotImplementedError(f'Cannot bake {type(shape).__name__}')
+
+        coords: List[int] = []
+        fill, outline, width = -1, -1, 0
+        text, family, size, flags = -1, -1, -1, 0
+        arc = (0, 0, 0)
+
+        if isinstance(shape, Text):
+            coords = [shape.position.x, shape.position.y]
+            fill = shape.color.packed
+            text = self.string(shape.text)
+            family = self.string(shape.font_family)
+            size = shape.font_size
+            flags = (
+                (_BOLD if shape.font_bold else 0) |
+                (_SLANT if shape.font_slant else 0) |
+                (_UNDERLINE if shape.font_underline else 0) |
+                (_OVERSTRIKE if shape.font_overstrike else 0)
+            )
+        if isinstance(shape, Line):
+            coords = [c for p in shape.vertices for c in (p.x, p.y)]
+            fill = shape.color.packed
+            width = shape.width
+        if isinstance(shape, PrimitiveShape):
+            fill = shape.fill_color.packed
+            outline = shape.border_color.packed
+            width = shape.border_width
+        if isinstance(shape, BoxCoords):
+            coords = [shape.upper_left.x, shape.upper_left.y, shape.lower_right.x, shape.lower_right.y]
+        if isinstance(shape, Circle):
+            coords = [shape.position.x, shape.position.y, shape.radius]
+        if isinstance(shape, Polygon):
+            coords = [c for p in shape.vertices for c in (p.x, p.y)]
+        if isinstance(shape, Arc):
+            arc = (shape.start, shape.extent, shape.style)
+
+        d['id'].append(shape.id)
+        d['kind'].append(kind)
+        d['fill'].append(fill)
+        d['outline'].append(outline)
+        d['width'].append(width)
+        d['coord_start'].append(len(d['coords']))
+        d['coord_len'].append(len(coords))
+        d['coords'] += coords
+        d['text'].append(text)
+        d['font_family'].append(family)
+        d['font_size'].append(size)
+        d['flags'].append(flags)
+        d['arc_start'].append(arc[0])
+        d['arc_extent'].append(arc[1])
+        d['arc_style'].append(arc[2])
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        encoded = [s.encode('utf-8') for s in self.strings]
+        self.data['string_start'] = list(np.cumsum([0] + [len(b) for b in encoded]))
+        self.data['string_data'] = list(b''.join(encoded))
+        return {name: np.asarray(self.data[name], dtype=dtype) for name, dtype in _COLUMNS}
+
+
+class BakedClip(Animation):
+    """A pre-sampled animation
+
+    Every frame of the original animation is stored as columns of
+    numbers (ids, shape types, coords, colors ...). Playing it back
+    doesn't run any of the original animation's code, and a loaded
+    clip reads straight out of a memory-mapped file, so opening a big
+    library of clips costs next to nothing until a frame is drawn.
+
+    It's an Animation, so it can go anywhere an Animation can (a Scene
+    for instance). get_state picks the nearest baked frame.
+
+    Shapes get fresh ids per clip. To put the same clip in a Scene
+    more than once use instance(), which shares the baked data but
+    not the ids, so the copies don't fight over canvas items.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], fps: float, duration: int, name: str = '', _mmap: mmap.mmap | None = None):
+        self._c = columns
+        self.fps = fps
+        self.frames = len(columns['frame_start']) - 1
+        self._mmap = _mmap
+        self._strings: Dict[int, str] = dict()
+        self._shapes: Dict[int, Shape] = dict()
+        self._ids: Dict[int, int] = dict()
+        super().__init__(duration, name)
+
+    @property
+    def seekable(self) -> bool:
+        return True
+
+    def instance(self) -> 'BakedClip':
+        return BakedClip(self._c, self.fps, self.duration, self.name, self._mmap)
+
+    def _string(self, index: int) -> str:
+        s = self._strings.get(index)
+        if s is None:
+            starts = self._c['string_start']
+            s = bytes(self._c['string_data'][starts[index]:starts[index + 1]]).decode('utf-8')
+            self._strings[index] = s
+        return s
+
+    def _shape(self, baked_id: int, kind: int) -> Shape:
+        shape = self._shapes.get(baked_id)
+        if shape is None or _KINDS[kind] is not type(shape):
+            if baked_id not in self._ids:
+                self._ids[baked_id] = gen_unique_number()
+            shape = _KINDS[kind](id=self._ids[baked_id])
+            self._shapes[baked_id] = shape
+        return shape
+
+    def frame_at(self, time: int) -> int:
+        return min(self.frames - 1, round(time * self.fps / 1000))
+
+    def get_state(self, time: int) -> List[Shape]:
+        if time < 0 or time > self.duration or self.frames == 0:
+            return []
+
+        c = self._c
+        frame = self.frame_at(time)
+        first, last = int(c['frame_start'][frame]), int(c['frame_start'][frame + 1])
+        rows = zip(*(c[name][first:last].tolist() for name in (
+            'id', 'kind', 'fill', 'outline', 'width', 'coord_start', 'coord_len',
+            'text', 'font_family', 'font_size', 'flags',
+            'arc_start', 'arc_extent', 'arc_style'
+        )))
+
+        shapes: List[Shape] = []
+        for (baked_id, kind, fill, outline, width, cs, cl, text, family, size, flags, a0, a1, a2) in rows:
+            shape = self._shape(baked_id, kind)
+            xy = c['coords'][cs:cs + cl].tolist()
+
+            if isinstance(shape, Text):
+                shape.position = Point(xy[0], xy[1])
+                shape.color = Color.from_packed(fill)
+                shape.text = self._string(text)
+                shape.font_family = self._string(family)
+                shape.font_size = size
+                shape.font_bold = bool(flags & _BOLD)
+                shape.font_slant = bool(flags & _SLANT)
+                shape.font_underline = bool(flags & _UNDERLINE)
+                shape.font_overstrike = bool(flags & _OVERSTRIKE)
+            if isinstance(shape, Line):
+                shape.vertices = [Point(xy[i], xy[i + 1]) for i in range(0, cl, 2)]
+                shape.color = Color.from_packed(fill)
+                shape.width = width
+            if isinstance(shape, PrimitiveShape):
+                shape.fill_color = Color.from_packed(fill)
+                shape.border_color = Color.from_packed(outline)
+                shape.border_width = width
+            if isinstance(shape, BoxCoords):
+                shape.upper_left = Point(xy[0], xy[1])
+                shape.lower_right = Point(xy[2], xy[3])
+            if isinstance(shape, Circle):
+                shape.position = Point(xy[0], xy[1])
+                shape.radius = xy[2]
+            if isinstance(shape, Polygon):
+                shape.vertices = [Point(xy[i], xy[i + 1]) for i in range(0, cl, 2)]
+            if isinstance(shape, Arc):
+                shape.start, shape.extent, shape.style = a0, a1, a2
+
+            shapes.append(shape)
+        return shapes
+
+    def save(self, path: str) -> None:
+        "Writes this clip in the baked file format"
+        name = self.name.encode('utf-8')
+        columns = dict(self._c)
+        # The clip's name rides along as one extra string
+        name_index = len(columns['string_start']) - 1
+        columns['string_start'] = np.append(columns['string_start'], columns['string_start'][-1] + len(name))
+        columns['string_data'] = np.concatenate([columns['string_data'], np.frombuffer(name, dtype=np.uint8)])
+
+        offset = len(_MAGIC) + _HEADER.size + _SECTION.size * len(_COLUMNS)
+        sections = []
+        for column, _ in _COLUMNS:
+            offset += -offset % 8
+            sections.append((offset, len(columns[column])))
+            offset += columns[column].nbytes
+
+        with open(path, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(
+                self.fps, self.duration, self.frames, len(columns['id']),
+                len(columns['coords']), name_index + 1, name_index
+            ))
+            for section in sections:
+                f.write(_SECTION.pack(*section))
+            for (column, _), (start, _) in zip(_COLUMNS, sections):
+                f.write(b'\0' * (start - f.tell()))
+                f.write(columns[column].tobytes())
+
+    @staticmethod
+    def load(path: str) -> 'BakedClip':
+        "Memory-maps a baked file. Nothing is copied until it's drawn"
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if mm[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f'{path} is not a baked clip')
+        fps, duration, _, _, _, _, name_index = _HEADER.unpack_from(mm, len(_MAGIC))
+
+        columns: Dict[str, np.ndarray] = dict()
+        position = len(_MAGIC) + _HEADER.size
+        for column, dtype in _COLUMNS:
+            start, length = _SECTION.unpack_from(mm, position)
+            position += _SECTION.size
+            columns[column] = np.frombuffer(mm, dtype=dtype, count=length, offset=start)
+
+        clip = BakedClip(columns, fps, duration, _mmap=mm)
+        clip.name = clip._string(name_index)
+        return clip
+
+
+def bake(animation: Animation, fps: float = 20) -> BakedClip:
+    "Samples an animation, frame by frame, into a BakedClip"
+    columns = _Columns()
+    frame_start = [0]
+    for i in range(frame_count(animation, fps)):
+        for shape in animation.get_state(frame_time(i, fps)):
+            columns.add(shape)
+        frame_start.append(len(columns.data['id']))
+
+    columns.data['frame_start'] = frame_start
+    return BakedClip(columns.arrays(), fps, animation.duration, animation.name)
+
+
+def load_library(directory: str, extension: str = '.bake') -> Dict[str, BakedClip]:
+    "Loads every baked clip in a directory, by file name (without extension)"
+    return {
+        entry[:-len(extension)]: BakedClip.load(os.path.join(directory, entry))
+        for entry in sorted(os.listdir(directory))
+        if entry.endswith(extension)
+    }
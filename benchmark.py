@@ -0,0 +1,233 @@
+"""Benchmarks for the evaluate/render pipeline
+
+    python benchmark.py                       # every workload, default sizes
+    python benchmark.py fireworks --size 200  # just one
+    python benchmark.py --renderer raster --output results.json
+
+Evaluation (Animation.get_state) and rendering
+(Renderer.update_animation_layer) are timed separately. No display is
+needed, the canvas renderer draws to a stub canvas that just counts
+calls. Results are printed (or written) as JSON so runs can be diffed.
+"""
+import argparse
+import gc
+import itertools
+import json
+import math
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Dict, List
+import examples
+from animation import Animation, Scene
+from animation_builder import AnimationBuilder, animate_color, animate_point, animate_vertices
+from fonts import ApproximateFonts, FontRegistry
+from raster import RasterRenderer
+from rendering import CanvasRenderer, Renderer
+from shapes import Color, ColorNames, Point, Polygon, PurePicture, Text
+
+
+class StubCanvas():
+    "Enough of tkinter.Canvas for CanvasRenderer, it only counts calls"
+
+    def __init__(self) -> None:
+        self.calls: Counter = Counter()
+        self._ids = itertools.count(1)
+
+    def _create(self, *args: Any, **kwargs: Any) -> int:
+        self.calls['create'] += 1
+        return next(self._ids)
+
+    create_text = create_oval = create_line = create_polygon = create_rectangle = create_arc = _create
+
+    def __getattr__(self, name: str) -> Callable[..., None]:
+        def call(*args: Any, **kwargs: Any) -> None:
+            self.calls[name] += 1
+        return call
+
+
+class HeadlessCanvasRenderer(CanvasRenderer):
+    "A CanvasRenderer on a StubCanvas. Tk fonts need a display, so fonts are approximate"
+
+    def __init__(self) -> None:
+        super().__init__(StubCanvas(), fonts=FontRegistry(ApproximateFonts()))  # type: ignore
+
+
+# Workloads. Each takes a size and returns an Animation
+
+def fireworks(size: int) -> Animation:
+    "size builder fireworks, staggered"
+    return Scene(
+        name=f"{size} Fireworks",
+        animations=[(i * 100, examples.firework_via_builder()) for i in range(size)]
+    )
+
+
+def deep_nesting(size: int) -> Animation:
+    "A few fireworks wrapped in size levels of Scenes"
+    animation: Animation = Scene([(0, examples.firework_via_builder()) for _ in range(4)])
+    for depth in range(size):
+        animation = Scene(name=f"Level {depth}", animations=[(10, animation), (0, examples.firework_via_subclassing_animiation())])
+    return animation
+
+
+def many_text(size: int) -> Animation:
+    "size Text shapes drifting and changing color"
+    return Scene(name=f"{size} Texts", animations=[
+        (i % 50, AnimationBuilder(
+            subject=PurePicture(Text(
+                text=f"Caption {i}",
+                position=Point(i * 7 % 800, i * 13 % 450),
+                font_size=8 + i % 10
+            )),
+            duration=3000,
+            animators=[
+                animate_point('position', Point(i * 11 % 800, i * 3 % 450), 3000),
+                animate_color('color', Color.random(), 3000)
+            ]
+        ))
+        for i in range(size)
+    ])
+
+
+def polygon_morph(size: int) -> Animation:
+    "One polygon with size vertices morphing from a circle to a star"
+    def ring(radius: Callable[[int], float]) -> List[Point]:
+        return [
+            Point(
+                round(400 + radius(i) * math.cos(2 * math.pi * i / size)),
+                round(225 + radius(i) * math.sin(2 * math.pi * i / size))
+            )
+            for i in range(size)
+        ]
+    return AnimationBuilder(
+        subject=PurePicture(Polygon(vertices=ring(lambda i: 200), fill_color=ColorNames.TEAL())),
+        duration=3000,
+        animators=[animate_vertices('vertices', ring(lambda i: 200 if i % 2 else 80), 3000)],
+        name=f"{size}-gon morph"
+    )
+
+
+WORKLOADS: Dict[str, Callable[[int], Animation]] = {
+    'fireworks': fireworks,
+    'nesting': deep_nesting,
+    'text': many_text,
+    'polygon': polygon_morph,
+}
+
+DEFAULT_SIZES = {'fireworks': 100, 'nesting': 50, 'text': 500, 'polygon': 2000}
+
+RENDERERS: Dict[str, Callable[[], Renderer]] = {
+    'canvas': HeadlessCanvasRenderer,
+    'raster': RasterRenderer,
+}
+
+
+def _summary(latencies: List[float], peak: int) -> Dict[str, Any]:
+    ms = sorted(l * 1000 for l in latencies)
+    pick = lambda q: ms[min(len(ms) - 1, round(q * (len(ms) - 1)))]
+    total = sum(latencies)
+    return {
+        'frames': len(ms),
+        'fps': len(ms) / total if total > 0 else None,
+        'latency_ms': {
+            'mean': statistics.fmean(ms),
+            'p50': pick(0.5),
+            'p90': pick(0.9),
+            'p99': pick(0.99),
+            'max': ms[-1]
+        },
+        'peak_memory_bytes': peak
+    }
+
+
+def _peak_memory(run: Callable[[], None]) -> int:
+    "Peak memory allocated while run() runs (a separate pass, tracing is slow)"
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(name: str, size: int, renderer_name: str, fps: float) -> Dict[str, Any]:
+    animation = WORKLOADS[name](size)
+    times = [round(i * 1000 / fps) for i in range(int(animation.duration * fps / 1000) + 1)]
+
+    # Evaluation
+    def evaluate() -> List[float]:
+        latencies = []
+        for t in times:
+            start = time.perf_counter()
+            animation.get_state(t)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    evaluate() # warm up (fills caches, lets builders snapshot)
+    evaluation = _summary(evaluate(), _peak_memory(lambda: None if evaluate() else None))
+
+    # Rendering
+    def render(renderer: Renderer) -> List[float]:
+        latencies = []
+        for t in times:
+            shapes = animation.get_state(t)
+            start = time.perf_counter()
+            renderer.update_animation_layer('bench', shapes)
+            if isinstance(renderer, RasterRenderer):
+                renderer.render()
+            latencies.append(time.perf_counter() - start)
+        renderer.clear_everything()
+        return latencies
+
+    renderer = RENDERERS[renderer_name]()
+    rendering = _summary(render(renderer), _peak_memory(lambda: None if render(RENDERERS[renderer_name]()) else None))
+    if isinstance(renderer, HeadlessCanvasRenderer):
+        rendering['canvas_calls'] = dict(renderer.canvas.calls)
+
+    return {
+        'workload': name,
+        'size': size,
+        'renderer': renderer_name,
+        'sample_fps': fps,
+        'duration_ms': animation.duration,
+        'evaluate': evaluation,
+        'render': rendering
+    }
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('workloads', nargs='*', help=f"any of {', '.join(WORKLOADS)} (defaults to all of them)")
+    parser.add_argument('--size', type=int, help='workload size (fireworks, nesting depth, texts, vertices)')
+    parser.add_argument('--renderer', choices=list(RENDERERS), default='canvas')
+    parser.add_argument('--fps', type=float, default=20, help='how often the animation is sampled')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error(f"unknown workload '{name}'")
+
+    results = {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': [
+            bench(name, args.size or DEFAULT_SIZES[name], args.renderer, args.fps)
+            for name in (args.workloads or list(WORKLOADS))
+        ]
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import math
+from typing import Dict, Iterator, List, Set, Tuple
+from animation import Animation
+from shapes import BoundingBox, Circle, Oval, Polygon, Rectangle, Shape
+
+# What the narrow phase works with. Shapes are boiled down to one of
+#
+#   ('circle', (x, y, radius))
+#   ('box', (left, top, right, bottom))
+#   ('polygon', ((x0, y0), (x1, y1), ...))
+#
+# Circles, Rectangles and Polygons are exact. Ovals become polygons
+# (close enough at _OVAL_SEGMENTS sides), anything else is tested by
+# its bounding box. Borders are ignored, it's the geometry that counts.
+Geometry = Tuple[str, tuple]
+Cell = Tuple[int, int]
+
+_OVAL_SEGMENTS = 24
+
+
+def geometry(shape: Shape) -> Geometry:
+    if isinstance(shape, Circle):
+        return ('circle', (shape.position.x, shape.position.y, abs(shape.radius)))
+    if isinstance(shape, Rectangle):
+        a, b = shape.upper_left, shape.lower_right
+        return ('box', (min(a.x, b.x), min(a.y, b.y), max(a.x, b.x), max(a.y, b.y)))
+    if isinstance(shape, Polygon):
+        return ('polygon', tuple((p.x, p.y) for p in shape.vertices))
+    if isinstance(shape, Oval):
+        a, b = shape.upper_left, shape.lower_right
+        cx, cy = (a.x + b.x) / 2, (a.y + b.y) / 2
+        rx, ry = abs(b.x - a.x) / 2, abs(b.y - a.y) / 2
+        return ('polygon', tuple(
+            (cx + rx * math.cos(2 * math.pi * i / _OVAL_SEGMENTS), cy + ry * math.sin(2 * math.pi * i / _OVAL_SEGMENTS))
+            for i in range(_OVAL_SEGMENTS)
+        ))
+    box = shape.bounds()
+    return ('box', (box.left, box.top, box.right, box.bottom))
+
+
+def _box_polygon(box: tuple) -> tuple:
+    left, top, right, bottom = box
+    return ((left, top), (right, top), (right, bottom), (left, bottom))
+
+
+def _contains(polygon: tuple, x: float, y: float) -> bool:
+    "Even-odd rule, same as the rasterizer fills with"
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def _edges(polygon: tuple) -> Iterator[Tuple[Tuple[float, float], Tuple[float, float]]]:
+    for i in range(len(polygon)):
+        yield polygon[i - 1], polygon[i]
+
+
+def _cross(o: tuple, a: tuple, b: tuple) -> float:
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _segments_cross(p1: tuple, p2: tuple, q1: tuple, q2: tuple) -> bool:
+    "Touching counts"
+    d1, d2 = _cross(q1, q2, p1), _cross(q1, q2, p2)
+    d3, d4 = _cross(p1, p2, q1), _cross(p1, p2, q2)
+    if ((d1 > 0) != (d2 > 0) or d1 == 0 or d2 == 0) and ((d3 > 0) != (d4 > 0) or d3 == 0 or d4 == 0):
+        # Collinear segments only touch if their extents overlap
+        if d1 == d2 == d3 == d4 == 0:
+            return (
+                min(p1[0], p2[0]) <= max(q1[0], q2[0]) and min(q1[0], q2[0]) <= max(p1[0], p2[0]) and
+                min(p1[1], p2[1]) <= max(q1[1], q2[1]) and min(q1[1], q2[1]) <= max(p1[1], p2[1])
+            )
+        return True
+    return False
+
+
+def _segment_distance_sq(x: float, y: float, a: tuple, b: tuple) -> float:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length_sq = dx * dx + dy * dy
+    t = 0 if length_sq == 0 else max(0, min(1, ((x - a[0]) * dx + (y - a[1]) * dy) / length_sq))
+    ex, ey = a[0] + t * dx - x, a[1] + t * dy - y
+    return ex * ex + ey * ey
+
+
+def _circle_polygon(circle: tuple, polygon: tuple) -> bool:
+    x, y, r = circle
+    if not polygon:
+        return False
+    if _contains(polygon, x, y):
+        return True
+    return any(_segment_distance_sq(x, y, a, b) <= r * r for a, b in _edges(polygon))
+
+
+def _polygon_polygon(a: tuple, b: tuple) -> bool:
+    if not a or not b:
+        return False
+    if _contains(b, *a[0]) or _contains(a, *b[0]):
+        return True
+    return any(_segments_cross(p1, p2, q1, q2) for p1, p2 in _edges(a) for q1, q2 in _edges(b))
+
+
+def geometries_overlap(a: Geometry, b: Geometry) -> bool:
+    (kind_a, ga), (kind_b, gb) = a, b
+    if kind_a > kind_b:
+        # Only one order of each pair needs handling below
+        (kind_a, ga), (kind_b, gb) = b, a
+
+    if kind_a == 'box' and kind_b == 'box':
+        return ga[0] <= gb[2] and gb[0] <= ga[2] and ga[1] <= gb[3] and gb[1] <= ga[3]
+    if kind_a == 'box' and kind_b == 'circle':
+        x, y, r = gb
+        dx = x - max(ga[0], min(x, ga[2]))
+        dy = y - max(ga[1], min(y, ga[3]))
+        return dx * dx + dy * dy <= r * r
+    if kind_a == 'circle' and kind_b == 'circle':
+        dx, dy = ga[0] - gb[0], ga[1] - gb[1]
+        return dx * dx + dy * dy <= (ga[2] + gb[2]) ** 2
+    if kind_a == 'circle' and kind_b == 'polygon':
+        return _circle_polygon(ga, gb)
+    if kind_a == 'box' and kind_b == 'polygon':
+        return _polygon_polygon(_box_polygon(ga), gb)
+    return _polygon_polygon(ga, gb)
+
+
+def overlaps(a: Shape, b: Shape) -> bool:
+    "Exact overlap test between two shapes (see geometry for what exact means)"
+    return a.bounds().intersects(b.bounds()) and geometries_overlap(geometry(a), geometry(b))
+
+
+class SpatialHash():
+    """A uniform grid broad phase
+
+    Each key is filed under every cell its box touches. Moving a key
+    only touches the grid when it changes cells, which most keys don't
+    from one frame to the next. Pick a cell size around the size of a
+    typical shape.
+    """
+
+    def __init__(self, cell_size: float = 64):
+        self.cell_size = cell_size
+        self._cells: Dict[Cell, Set[int]] = dict()
+        # key -> the range of cells it's in (x0, y0, x1, y1)
+        self._ranges: Dict[int, Tuple[int, int, int, int]] = dict()
+
+    def _range(self, box: BoundingBox) -> Tuple[int, int, int, int]:
+        s = self.cell_size
+        return (
+            math.floor(box.left / s), math.floor(box.top / s),
+            math.floor(box.right / s), math.floor(box.bottom / s)
+        )
+
+    @staticmethod
+    def _cells_in(r: Tuple[int, int, int, int]) -> Iterator[Cell]:
+        for cx in range(r[0], r[2] + 1):
+            for cy in range(r[1], r[3] + 1):
+                yield (cx, cy)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._ranges
+
+    def __len__(self) -> int:
+        return len(self._ranges)
+
+    def keys(self) -> List[int]:
+        return list(self._ranges)
+
+    def update(self, key: int, box: BoundingBox) -> None:
+        "Adds a key, or moves it if it's already here"
+        new = self._range(box)
+        old = self._ranges.get(key)
+        if old == new:
+            return
+        if old is not None:
+            self.remove(key)
+        self._ranges[key] = new
+        for cell in self._cells_in(new):
+            bucket = self._cells.get(cell)
+            if bucket is None:
+                bucket = self._cells[cell] = set()
+            bucket.add(key)
+
+    def remove(self, key: int) -> None:
+        r = self._ranges.pop(key, None)
+        if r is None:
+            return
+        for cell in self._cells_in(r):
+            bucket = self._cells[cell]
+            bucket.discard(key)
+            if not bucket:
+                del self._cells[cell]
+
+    def query(self, box: BoundingBox) -> Set[int]:
+        "Every key in a cell the box touches (candidates, not hits)"
+        found: Set[int] = set()
+        r = self._range(box)
+        if (r[2] - r[0] + 1) * (r[3] - r[1] + 1) > len(self._cells):
+            # A huge box, quicker to look at the cells we have
+            for (cx, cy), bucket in self._cells.items():
+                if r[0] <= cx <= r[2] and r[1] <= cy <= r[3]:
+                    found |= bucket
+            return found
+        for cell in self._cells_in(r):
+            bucket = self._cells.get(cell)
+            if bucket:
+                found |= bucket
+        return found
+
+    def pairs(self) -> Set[Tuple[int, int]]:
+        "Every pair of keys that share a cell, (smaller, larger)"
+        found: Set[Tuple[int, int]] = set()
+        for bucket in self._cells.values():
+            if len(bucket) < 2:
+                continue
+            keys = sorted(bucket)
+            for i, a in enumerate(keys):
+                for b in keys[i + 1:]:
+                    found.add((a, b))
+        return found
+
+
+class CollisionWorld():
+    """Knows where every shape was on the last frame it was given
+
+    Give it each frame's shapes with update(). Shapes are tracked by
+    id: ones that moved are re-filed in the grid, ones that are gone
+    are dropped. Each shape is copied as it's filed, animations change
+    their shapes in place and the grid and the geometry have to agree
+    on which frame they describe. Geometry is worked out lazily from
+    those copies, only for shapes a query actually has to test.
+    """
+
+    def __init__(self, cell_size: float = 64):
+        self.grid = SpatialHash(cell_size)
+        self.time: int | None = None
+        self._shapes: Dict[int, Shape] = dict()
+        # The shapes as they were at the last update
+        self._snapshots: Dict[int, Shape] = dict()
+        self._bounds: Dict[int, BoundingBox] = dict()
+        self._geometry: Dict[int, Geometry] = dict()
+
+    def __len__(self) -> int:
+        return len(self._shapes)
+
+    def update(self, shapes: List[Shape], time: int | None = None) -> None:
+        seen: Set[int] = set()
+        for shape in shapes:
+            box = shape.bounds()
+            seen.add(shape.id)
+            self._shapes[shape.id] = shape
+            self._snapshots[shape.id] = shape.copy()
+            self._bounds[shape.id] = box
+            self.grid.update(shape.id, box)
+        self._geometry.clear()
+
+        for id in [id for id in self._shapes if id not in seen]:
+            self.remove(id)
+        self.time = time
+
+    def remove(self, id: int) -> None:
+        self._shapes.pop(id, None)
+        self._snapshots.pop(id, None)
+        self._bounds.pop(id, None)
+        self._geometry.pop(id, None)
+        self.grid.remove(id)
+
+    def _geometry_of(self, id: int) -> Geometry:
+        g = self._geometry.get(id)
+        if g is None:
+            g = self._geometry[id] = geometry(self._snapshots[id])
+        return g
+
+    def _hit(self, a: int, b: int) -> bool:
+        return (
+            self._bounds[a].intersects(self._bounds[b]) and
+            geometries_overlap(self._geometry_of(a), self._geometry_of(b))
+        )
+
+    def overlapping(self, shape: Shape) -> List[Shape]:
+        """What a shape overlaps, as of the last update. Shapes that
+        aren't in the world are tested where they are right now.
+        """
+        if shape.id not in self._shapes:
+            return self.test(shape)
+        return [
+            self._shapes[other] for other in self.grid.query(self._bounds[shape.id])
+            if other != shape.id and self._hit(shape.id, other)
+        ]
+
+    def test(self, shape: Shape) -> List[Shape]:
+        "What a shape would overlap where it is right now (itself excluded)"
+        return self._against(shape.bounds(), geometry(shape), shape.id)
+
+    def at(self, box: BoundingBox) -> List[Shape]:
+        "Shapes whose geometry overlaps a box"
+        return self._against(box, ('box', (box.left, box.top, box.right, box.bottom)))
+
+    def _against(self, box: BoundingBox, g: Geometry, exclude: int | None = None) -> List[Shape]:
+        return [
+            self._shapes[other] for other in self.grid.query(box)
+            if other != exclude and self._bounds[other].intersects(box) and
+            geometries_overlap(g, self._geometry_of(other))
+        ]
+
+    def collisions(self) -> List[Tuple[Shape, Shape]]:
+        "Every overlapping pair"
+        return [
+            (self._shapes[a], self._shapes[b])
+            for a, b in self.grid.pairs() if self._hit(a, b)
+        ]
+
+
+class Collider(Animation):
+    """Plays an animation and keeps a CollisionWorld in step with it
+
+    After each frame the world holds that frame's shapes. Animations
+    that react to collisions can hold on to the world and ask it what
+    they're overlapping; during get_state(t) the answer is as of the
+    previous frame (the usual one frame of lag), world.time says which.
+    """
+
+    def __init__(self, animation: Animation, cell_size: float = 64, name: str | None = None):
+        self.animation = animation
+        self.world = CollisionWorld(cell_size)
+        super().__init__(
+            animation.duration,
+            animation.name if name is None else name,
+            animation.bounds
+        )
+
+    @property
+    def seekable(self) -> bool:
+        return self.animation.seekable
+
+    def overlapping(self, shape: Shape, time: int) -> List[Shape]:
+        """What shape is overlapping at time. If the world hasn't got
+        to that frame yet, the shape is tested where it is now against
+        everything else where it was on the last frame.
+        """
+        if self.world.time == time:
+            return self.world.overlapping(shape)
+        return self.world.test(shape)
+
+    def get_state(self, time: int) -> List[Shape]:
+        shapes = self.animation.get_state(time)
+        self.world.update(shapes, time)
+        return shapes
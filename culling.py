@@ -0,0 +1,78 @@
+from typing import List
+from animation import Animation, Scene
+from rendering import Renderer
+from shapes import BoundingBox, Shape
+
+
+def visible(shape: Shape, viewport: BoundingBox) -> bool:
+    "Shapes that can't say where they are always count as visible"
+    try:
+        return shape.bounds().intersects(viewport)
+    except NotImplementedError:
+        return True
+
+
+def cull(shapes: List[Shape], viewport: BoundingBox) -> List[Shape]:
+    "Drops the shapes that are completely outside the viewport"
+    return [shape for shape in shapes if visible(shape, viewport)]
+
+
+class CullingRenderer(Renderer):
+    """Wraps another Renderer and only passes on visible shapes
+
+    Shapes that leave the viewport are dropped from their layer (so
+    the wrapped renderer deletes them) and come back when they return.
+    """
+
+    def __init__(self, inner: Renderer, viewport: BoundingBox):
+        self.inner = inner
+        self.viewport = viewport
+
+    def update_animation_layer(self, layer: str, shapes: List[Shape]) -> None:
+        self.inner.update_animation_layer(layer, cull(shapes, self.viewport))
+
+    def clear_animation_layer(self, layer: str) -> None:
+        self.inner.clear_animation_layer(layer)
+
+    def clear_everything(self) -> None:
+        self.inner.clear_everything()
+
+    def flush(self) -> None:
+        self.inner.flush()
+
+
+class Culled(Animation):
+    """An Animation (usually a Scene) seen through a viewport
+
+    Any part of a Scene tree that declared bounds outside the viewport
+    isn't evaluated at all. Whatever is evaluated is culled shape by
+    shape before it's handed on.
+    """
+
+    def __init__(self, animation: Animation, viewport: BoundingBox, name: str | None = None):
+        self.animation = animation
+        self.viewport = viewport
+        self._cursor = animation.timeline.cursor() if isinstance(animation, Scene) else None
+        super().__init__(
+            animation.duration,
+            animation.name if name is None else name,
+            animation.bounds
+        )
+
+    @property
+    def seekable(self) -> bool:
+        return self.animation.seekable
+
+    def get_state(self, time: int) -> List[Shape]:
+        # The timeline's entries only know the bounds declared below the
+        # Scene, so the Scene's own are checked here either way
+        if self.animation.bounds is not None and not self.animation.bounds.intersects(self.viewport):
+            return []
+        if self._cursor is None:
+            return cull(self.animation.get_state(time), self.viewport)
+
+        shapes: List[Shape] = []
+        for e in self._cursor.advance(time):
+            if e.bounds is None or e.bounds.intersects(self.viewport):
+                shapes += e.animation.get_state(time - e.offset)
+        return cull(shapes, self.viewport)
@@ -0,0 +1,137 @@
+from dataclasses import fields
+from typing import Any, Dict, List, Tuple, Type
+from shapes import Arc, Circle, Color, Line, Oval, Point, Polygon, Rectangle, Shape, Text
+
+# Shapes as plain (JSON friendly) data. A shape is its kind plus its
+# fields, with Points as [x, y], Colors packed (0xRRGGBB, -1 when
+# invisible) and lists of Points flattened to [x0, y0, x1, y1, ...].
+KINDS: Dict[str, Type[Shape]] = {
+    k.__name__: k for k in (Text, Line, Circle, Polygon, Rectangle, Oval, Arc)
+}
+
+
+def encode_value(value: Any) -> Any:
+    if isinstance(value, Point):
+        return [value.x, value.y]
+    if isinstance(value, Color):
+        return value.packed
+    if isinstance(value, list):
+        return [c for p in value for c in (p.x, p.y)]
+    return value
+
+
+def shape_fields(shape: Shape) -> Dict[str, Any]:
+    "Every field but the id, encoded"
+    if type(shape).__name__ not in KINDS:
+        raise NotImplementedError
+    return {f.name: encode_value(getattr(shape, f.name)) for f in fields(shape) if f.name != 'id'}
+
+
+def decode_value(current: Any, encoded: Any) -> Any:
+    "The inverse of encode_value, given what the field holds now"
+    if isinstance(current, Point):
+        return Point(encoded[0], encoded[1])
+    if isinstance(current, Color):
+        return Color.from_packed(encoded)
+    if isinstance(current, list):
+        return [Point(encoded[i], encoded[i + 1]) for i in range(0, len(encoded), 2)]
+    return encoded
+
+
+def apply_fields(shape: Shape, changed: Dict[str, Any]) -> None:
+    for name, encoded in changed.items():
+        setattr(shape, name, decode_value(getattr(shape, name), encoded))
+
+
+def shape_from_fields(kind: str, id: int, encoded: Dict[str, Any]) -> Shape:
+    shape = KINDS[kind](id=id)
+    apply_fields(shape, encoded)
+    return shape
+
+
+# Ops. Layers are numbered as they show up, a cleared layer's number
+# is handed out again to the next new one (so numbers stay small on a
+# stream that runs for days). Layers are stacked in the order they
+# showed up, items in a layer in the order they were created (the same
+# way a Tk canvas stacks them).
+#
+#   ['L', layer, name]                  a new layer
+#   ['c', layer, id, kind, fields]      a new item
+#   ['u', layer, id, changed fields]    an item changed
+#   ['d', layer, id]                    an item is gone
+#   ['D', layer]                        a layer (and its items) is gone
+Op = List[Any]
+
+
+class DeltaEncoder():
+    """Turns layers of shapes into ops, only sending what changed
+
+    Remembers what every item looked like when it was last encoded.
+    An item is created once per shape.id (per layer), after that only
+    the fields that changed are sent, so the output grows with how
+    much changes rather than how much there is.
+    """
+
+    def __init__(self) -> None:
+        self.layers: Dict[str, int] = dict()
+        # layer -> id -> (kind, fields as last encoded)
+        self.items: Dict[int, Dict[int, Tuple[str, Dict[str, Any]]]] = dict()
+        self._next_layer = 0
+        self._free_layers: List[int] = [] # numbers of cleared layers
+
+    def update_layer(self, layer: str, shapes: List[Shape]) -> List[Op]:
+        ops: List[Op] = []
+        index = self.layers.get(layer)
+        if index is None:
+            if self._free_layers:
+                index = self._free_layers.pop()
+            else:
+                index = self._next_layer
+                self._next_layer += 1
+            self.layers[layer] = index
+            self.items[index] = dict()
+            ops.append(['L', index, layer])
+
+        items = self.items[index]
+        seen = set()
+        for shape in shapes:
+            seen.add(shape.id)
+            now = shape_fields(shape)
+            kind = type(shape).__name__
+            last = items.get(shape.id)
+            if last is None:
+                ops.append(['c', index, shape.id, kind, now])
+            else:
+                changed = {k: v for k, v in now.items() if last[1][k] != v}
+                if changed:
+                    ops.append(['u', index, shape.id, changed])
+            items[shape.id] = (kind, now)
+
+        for id in [id for id in items if id not in seen]:
+            del items[id]
+            ops.append(['d', index, id])
+        return ops
+
+    def clear_layer(self, layer: str) -> List[Op]:
+        index = self.layers.pop(layer, None)
+        if index is None:
+            return []
+        del self.items[index]
+        self._free_layers.append(index)
+        return [['D', index]]
+
+    def clear(self) -> List[Op]:
+        return [op for layer in list(self.layers) for op in self.clear_layer(layer)]
+
+
+    def keyframe(self) -> List[Op]:
+        """Ops that build everything as it is now from nothing, for
+        readers that join late or missed some ops
+        """
+        ops: List[Op] = []
+        # self.layers is in the order they showed up, numbers get reused
+        for name, index in self.layers.items():
+            ops.append(['L', index, name])
+            for id, (kind, item) in self.items[index].items():
+                ops.append(['c', index, id, kind, item])
+        return ops
@@ -0,0 +1,74 @@
+from typing import Callable, Dict, List
+import numpy as np
+
+# Easing curves map how far along an animation is (0 to 1) to how far
+# along the value should be. They're written with NumPy operations so
+# the same function works on a single float or on a whole array of
+# them (that's how the track engine evaluates many tracks at once).
+#
+# Linear is special: it isn't clamped, so a linear animation that
+# keeps running past its duration keeps going (that's how animators
+# have always behaved). Every other curve holds at its end points.
+
+def _linear(t):
+    return t
+
+def _ease_in(t):
+    return t * t
+
+def _ease_out(t):
+    return 1 - (1 - t) * (1 - t)
+
+def _ease_in_out(t):
+    return np.where(t < 0.5, 2 * t * t, 1 - (-2 * t + 2) ** 2 / 2)
+
+def _ease_in_cubic(t):
+    return t * t * t
+
+def _ease_out_cubic(t):
+    return 1 - (1 - t) ** 3
+
+def _ease_in_out_cubic(t):
+    return np.where(t < 0.5, 4 * t * t * t, 1 - (-2 * t + 2) ** 3 / 2)
+
+def _sine_in_out(t):
+    return -(np.cos(np.pi * t) - 1) / 2
+
+_CURVES: Dict[str, Callable] = {
+    'linear': _linear,
+    'ease_in': _ease_in,
+    'ease_out': _ease_out,
+    'ease_in_out': _ease_in_out,
+    'ease_in_cubic': _ease_in_cubic,
+    'ease_out_cubic': _ease_out_cubic,
+    'ease_in_out_cubic': _ease_in_out_cubic,
+    'sine_in_out': _sine_in_out,
+}
+
+# An easing's id is its index here
+EASINGS: List[str] = list(_CURVES)
+LINEAR = EASINGS.index('linear')
+
+
+def easing_id(name: str) -> int:
+    if name not in _CURVES:
+        raise ValueError(f'Unknown easing "{name}", try one of {EASINGS}')
+    return EASINGS.index(name)
+
+
+def ease(name: str, t: float) -> float:
+    "Applies a named easing curve to a single progress value"
+    if name == 'linear':
+        return t
+    return float(_CURVES[name](min(1.0, max(0.0, t))))
+
+
+def ease_array(ids: np.ndarray, t: np.ndarray) -> np.ndarray:
+    "Applies each entry's easing curve (by id) to its progress value"
+    out = t.astype(np.float64, copy=True)
+    for i in np.unique(ids).tolist():
+        if i == LINEAR:
+            continue
+        mask = ids == i
+        out[mask] = _CURVES[EASINGS[i]](np.clip(t[mask], 0, 1))
+    return out
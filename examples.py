@@ -1,8 +1,11 @@
 from random import randint
+import numpy as np
 from typing import Any, List
 from shapes import Circle, Color, ColorNames, Point, PurePicture
 from animation import Animation, Scene, CircleTravelAlongAFunction, CirleMove
 from animation_builder import AnimationBuilder, animate_color, animate_int, animate_point
+from particles import ParticleSystem
+from simulation import BouncingBalls
 from utility import gen_unique_number
 
 def firework_via_builder() -> Animation:
@@ -138,4 +141,41 @@ def firework_via_subclassing_animiation() -> Animation:
     return Scene(
         name="Subclassing Firework", 
         animations=[(0, trunk)] + list(map(lambda v: (3000, v), peaks))
-    )
\ No newline at end of file
+    )
+
+
+def firework_via_particles(fireworks: int = 10, sparks: int = 300) -> Animation:
+    """Lots of sparks! Every spark is a row in a few NumPy arrays
+    instead of its own AnimationBuilder.
+    """
+    system = ParticleSystem(
+        name="Particle Fireworks",
+        gravity=Point(0, 60),
+        drag=0.8
+    )
+    for x in range(fireworks):
+        system.burst(
+            at=x * 400,
+            position=Point(randint(100, 700), randint(50, 200)),
+            count=sparks,
+            speed=(20, 160),
+            lifetime=(1500, 2500),
+            radius=(3, 1),
+            end_color=ColorNames.BLACK()
+        )
+    return system
+
+def bouncing_balls(balls: int = 50, duration: int = 10000) -> Animation:
+    """Balls dropped into the canvas. They're simulated step by step
+    (gravity, drag and bounces) rather than solved for a given time.
+    """
+    rng = np.random.default_rng()
+    radii = rng.integers(5, 20, balls)
+    return BouncingBalls(
+        name="Bouncing Balls",
+        duration=duration,
+        positions=np.column_stack([rng.uniform(20, 780, balls), rng.uniform(20, 200, balls)]),
+        velocities=rng.uniform(-200, 200, (balls, 2)),
+        radii=radii,
+        colors=rng.integers(0, 256, (balls, 3))
+    )
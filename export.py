@@ -0,0 +1,326 @@
+import math
+import os
+import struct
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import BinaryIO, Callable, Deque, Iterator, List, Tuple
+from collections import deque
+import numpy as np
+from animation import Animation
+from parallel import worker_context
+from raster import RasterRenderer
+from shapes import Color, ColorNames
+from svg import SvgRenderer
+
+
+def frame_count(animation: Animation, fps: float) -> int:
+    "How many frames it takes to cover the whole animation"
+    return math.floor(animation.duration * fps / 1000) + 1
+
+
+def frame_time(index: int, fps: float) -> int:
+    "When (in milliseconds) a frame is sampled"
+    return round(index * 1000 / fps)
+
+
+def encode_png(rgba: np.ndarray, compression: int = 6) -> bytes:
+    "Encodes a (height x width x 4) uint8 array as a PNG file"
+    height, width, _ = rgba.shape
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack('>I', len(data)) + kind + data +
+            struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF)
+        )
+
+    # Every row starts with a filter byte, 0 means "no filter"
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = rgba.reshape(height, width * 4)
+
+    return (
+        b'\x89PNG\r\n\x1a\n' +
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)) +
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), compression)) +
+        chunk(b'IEND', b'')
+    )
+
+
+# GIFs can only hold 256 colors per frame. We use a fixed 3-3-2 bit
+# RGB palette so every frame can be quantized on its own (that's what
+# lets frames be encoded in parallel and written out one at a time).
+_GIF_PALETTE = bytes(
+    component
+    for i in range(256)
+    for component in (
+        round(((i >> 5) & 0b111) * 255 / 7),
+        round(((i >> 2) & 0b111) * 255 / 7),
+        round((i & 0b11) * 255 / 3)
+    )
+)
+
+
+def _quantize_332(rgba: np.ndarray) -> bytes:
+    r = (rgba[..., 0].astype(np.uint16) * 7 + 127) // 255
+    g = (rgba[..., 1].astype(np.uint16) * 7 + 127) // 255
+    b = (rgba[..., 2].astype(np.uint16) * 3 + 127) // 255
+    return ((r << 5) | (g << 2) | b).astype(np.uint8).tobytes()
+
+
+def _lzw_encode(indices: bytes, min_code_size: int = 8) -> bytes:
+    "Variable length LZW as GIF wants it, packed least significant bit first"
+    clear = 1 << min_code_size
+    end_of_info = clear + 1
+
+    out = bytearray()
+    bit_buffer = 0
+    bit_count = 0
+    code_size = min_code_size + 1
+    next_code = end_of_info + 1
+    table: dict = {}
+
+    def emit(code: int) -> None:
+        nonlocal bit_buffer, bit_count
+        bit_buffer |= code << bit_count
+        bit_count += code_size
+        while bit_count >= 8:
+            out.append(bit_buffer & 0xFF)
+            bit_buffer >>= 8
+            bit_count -= 8
+
+    emit(clear)
+    prefix = indices[0]
+    for pixel in indices[1:]:
+        key = (prefix << 8) | pixel
+        code = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+
+        emit(prefix)
+        if next_code < 4096:
+            table[key] = next_code
+            if next_code == (1 << code_size):
+                code_size += 1
+            next_code += 1
+        else:
+            emit(clear)
+            table.clear()
+            code_size = min_code_size + 1
+            next_code = end_of_info + 1
+        prefix = pixel
+
+    emit(prefix)
+    emit(end_of_info)
+    if bit_count > 0:
+        out.append(bit_buffer & 0xFF)
+
+    return bytes(out)
+
+
+def encode_gif_frame(rgba: np.ndarray, delay_cs: int) -> bytes:
+    """Encodes one frame (graphic control extension + image) of a GIF
+
+    These are independent of each other, so they can be made anywhere
+    and concatenated later by a GifWriter.
+    """
+    height, width, _ = rgba.shape
+    data = _lzw_encode(_quantize_332(rgba))
+    blocks = b''.join(
+        bytes([len(data[i:i + 255])]) + data[i:i + 255]
+        for i in range(0, len(data), 255)
+    )
+    return (
+        b'\x21\xF9\x04' + struct.pack('<BHBB', 0b0100, delay_cs, 0, 0) +
+        b'\x2C' + struct.pack('<HHHHB', 0, 0, width, height, 0) +
+        b'\x08' + blocks + b'\x00'
+    )
+
+
+class GifWriter():
+    """Writes an animated GIF one frame at a time
+
+    Nothing is kept around after a frame is written, so memory doesn't
+    grow with the length of the animation.
+    """
+
+    def __init__(self, file: BinaryIO, width: int, height: int, loop: bool = True):
+        self.file = file
+        file.write(b'GIF89a' + struct.pack('<HHBBB', width, height, 0b11110111, 0, 0))
+        file.write(_GIF_PALETTE)
+        if loop:
+            file.write(b'\x21\xFF\x0BNETSCAPE2.0\x03\x01\x00\x00\x00')
+
+    def write_encoded(self, frame: bytes) -> None:
+        self.file.write(frame)
+
+    def write(self, rgba: np.ndarray, delay_cs: int) -> None:
+        self.write_encoded(encode_gif_frame(rgba, delay_cs))
+
+    def close(self) -> None:
+        self.file.write(b'\x3B')
+
+
+def _gif_delay(index: int, fps: float) -> int:
+    "GIF delays are in hundredths of a second, spread the rounding error"
+    return round((index + 1) * 100 / fps) - round(index * 100 / fps)
+
+
+# Each worker process gets its own copy of the animation and renderer.
+# These are set once per process by _init_worker.
+_worker_animation: Animation | None = None
+_worker_renderer: RasterRenderer | None = None
+_worker_last_frame = -1
+
+
+def _init_worker(animation: Animation, width: int, height: int, background: Color) -> None:
+    global _worker_animation, _worker_renderer, _worker_last_frame
+    _worker_animation = animation
+    _worker_renderer = RasterRenderer(width, height, background, workers=1)
+    _worker_last_frame = -1
+
+
+def _worker_frames(first: int, last: int, fps: float) -> Iterator[Tuple[int, np.ndarray]]:
+    """Renders frames [first, last) in this worker
+
+    Seekable animations can jump straight to `first`. Others might
+    capture state the first time they see a frame, so skipping ahead
+    could give a different picture than playing from the start. For
+    those we replay get_state for every frame this worker hasn't seen
+    yet (no rasterizing, that's the expensive part).
+    """
+    global _worker_last_frame
+    assert _worker_animation is not None and _worker_renderer is not None
+
+    if not _worker_animation.seekable:
+        for i in range(_worker_last_frame + 1, first):
+            _worker_animation.get_state(frame_time(i, fps))
+
+    for i in range(first, last):
+        shapes = _worker_animation.get_state(frame_time(i, fps))
+        _worker_renderer.update_animation_layer('export', shapes)
+        _worker_last_frame = i
+        yield i, _worker_renderer.render()
+
+
+def _png_chunk(first: int, last: int, fps: float, directory: str, prefix: str) -> int:
+    for i, rgba in _worker_frames(first, last, fps):
+        with open(os.path.join(directory, f'{prefix}{i:05d}.png'), 'wb') as f:
+            f.write(encode_png(rgba))
+    return last - first
+
+
+def _gif_chunk(first: int, last: int, fps: float) -> List[bytes]:
+    return [encode_gif_frame(rgba, _gif_delay(i, fps)) for i, rgba in _worker_frames(first, last, fps)]
+
+
+def _run_chunks(
+    animation: Animation,
+    fps: float,
+    width: int,
+    height: int,
+    background: Color,
+    workers: int | None,
+    chunk_size: int,
+    job: Callable,
+    *job_args
+) -> Iterator:
+    """Spreads frame ranges over a process pool, yields results in order
+
+    Only a couple of chunks per worker are in flight at once, so a long
+    animation never piles up finished frames in memory. Workers start
+    from parallel.worker_context.
+    """
+    total = frame_count(animation, fps)
+    workers = workers or os.cpu_count() or 1
+    chunks = [(i, min(i + chunk_size, total)) for i in range(0, total, chunk_size)]
+    context = worker_context()
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(animation, width, height, background)
+    ) as pool:
+        pending: Deque[Future] = deque()
+        for first, last in chunks:
+            pending.append(pool.submit(job, first, last, fps, *job_args))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def export_png_sequence(
+    animation: Animation,
+    directory: str,
+    fps: float = 20,
+    width: int = 800,
+    height: int = 450,
+    background: Color = ColorNames.WHITE(),
+    prefix: str = 'frame_',
+    workers: int | None = None,
+    chunk_size: int = 50
+) -> int:
+    """Renders an animation to numbered PNG files
+
+    Frames are written by the workers as soon as they're rendered.
+    Returns how many frames were written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return sum(_run_chunks(
+        animation, fps, width, height, background, workers, chunk_size,
+        _png_chunk, directory, prefix
+    ))
+
+
+def export_gif(
+    animation: Animation,
+    path: str,
+    fps: float = 20,
+    width: int = 800,
+    height: int = 450,
+    background: Color = ColorNames.WHITE(),
+    loop: bool = True,
+    workers: int | None = None,
+    chunk_size: int = 50
+) -> int:
+    """Renders an animation to an animated GIF
+
+    Workers rasterize and LZW-encode their frames, this process just
+    appends them to the file in order. Returns how many frames were
+    written.
+    """
+    written = 0
+    with open(path, 'wb') as f:
+        gif = GifWriter(f, width, height, loop)
+        for frames in _run_chunks(
+            animation, fps, width, height, background, workers, chunk_size,
+            _gif_chunk
+        ):
+            for frame in frames:
+                gif.write_encoded(frame)
+            written += len(frames)
+        gif.close()
+    return written
+
+
+def export_html(
+    animation: Animation,
+    path: str,
+    fps: float = 20,
+    width: int = 800,
+    height: int = 450,
+    background: Color = ColorNames.WHITE(),
+    loop: bool = True
+) -> int:
+    """Writes an animation as a self contained HTML page (SVG)
+
+    Each frame only holds what changed since the one before, so this
+    runs in order in this process. Returns how many frames were written.
+    """
+    renderer = SvgRenderer(width, height, background)
+    for i in range(frame_count(animation, fps)):
+        renderer.update_animation_layer('export', animation.get_state(frame_time(i, fps)))
+        renderer.flush()
+    renderer.save(path, fps, loop, animation.name)
+    return len(renderer.frames)
@@ -0,0 +1,202 @@
+import asyncio
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Tuple
+from animation import Animation
+from rendering import CanvasRenderer, FrameStats, Renderer, end_frame, evaluate, innermost, layer_name
+from shapes import Shape, clone_value
+
+# What goes down a sink's queue besides frames
+_END = object()     # playback is over
+_DETACH = object()  # the sink was detached
+
+Frame = Tuple[int, List[Shape]] # (time, shapes)
+
+
+class Sink():
+    """One renderer attached to a FanOut, with its own queue of frames
+
+    With max_frames set, the queue only keeps that many frames. When a
+    new one comes in the oldest is dropped, so a sink that can't keep
+    up just skips ahead (that's what you want for a preview or a
+    stream). Without it every frame is drawn, however far behind the
+    sink falls (an exporter).
+
+    Threaded sinks draw on a thread of their own, so a slow one never
+    holds up the event loop. Tk has to be drawn on from its own thread,
+    so CanvasRenderers default to drawing on the loop.
+    """
+
+    def __init__(self, renderer: Renderer, max_frames: int | None = None, threaded: bool | None = None):
+        if max_frames is not None and max_frames < 1:
+            raise ValueError(f'max_frames has to be at least 1 (or None), not {max_frames}')
+        self.renderer = renderer
+        self.max_frames = max_frames
+        self.threaded = not isinstance(innermost(renderer), CanvasRenderer) if threaded is None else threaded
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: asyncio.Task | None = None
+        self.rendered = 0
+        self.dropped = 0
+        self.error: BaseException | None = None
+
+    @property
+    def queued(self) -> int:
+        return self.queue.qsize()
+
+    def push(self, frame: Any) -> None:
+        if self.max_frames is not None and isinstance(frame, tuple):
+            while self.queue.qsize() >= self.max_frames:
+                self.queue.get_nowait()
+                self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    def _draw(self, layer: str, frame: Frame) -> None:
+        self.renderer.update_animation_layer(layer, frame[1])
+        self.renderer.flush()
+
+    def _clear(self, layer: str) -> None:
+        self.renderer.clear_animation_layer(layer)
+        self.renderer.flush()
+
+    async def run(self, layer: str) -> None:
+        "Draws frames until playback ends or the sink is detached"
+        executor = ThreadPoolExecutor(1) if self.threaded else None
+        loop = asyncio.get_running_loop()
+
+        async def call(fn: Callable, *args: Any) -> None:
+            if executor is None:
+                fn(*args)
+            else:
+                await loop.run_in_executor(executor, fn, *args)
+
+        try:
+            while True:
+                frame = await self.queue.get()
+                if frame is _END or frame is _DETACH:
+                    await call(self._clear, layer)
+                    return
+                await call(self._draw, layer, frame)
+                self.rendered += 1
+        except Exception as e:
+            # Only this sink is done for, playback goes on without it
+            self.error = e
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+
+class FanOut():
+    """Plays an animation once and sends every frame to many renderers
+
+    Each frame, get_state is called once and the shapes are copied
+    once. That copy is put on every sink's queue, so each sink draws
+    at its own pace from a frame nothing can change under it. A slow
+    exporter falls behind on its own queue while the live preview
+    keeps drawing.
+
+    Sinks can be attached and detached at any time, also while play()
+    runs (from the loop's thread). A sink attached mid-playback starts
+    with the next frame, a detached one has its layer cleared.
+
+    Renderers with auto_flush (CanvasRenderer) should have it off,
+    each frame is flushed once.
+    """
+
+    def __init__(self,
+        animation: Animation,
+        fps: float = 20,
+        now: Callable[[], float] = clock.monotonic
+    ):
+        self.animation = animation
+        self.fps = fps
+        self.layer = layer_name(animation)
+        self.sinks: List[Sink] = []
+        self.stats = FrameStats(fps)
+        self._now = now
+        self._running = False
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def attach(self, renderer: Renderer, max_frames: int | None = None, threaded: bool | None = None) -> Sink:
+        sink = Sink(renderer, max_frames, threaded)
+        self.sinks.append(sink)
+        if self._running:
+            self._start(sink)
+        return sink
+
+    def detach(self, sink: Sink) -> None:
+        "Stops sending frames to a sink, whatever it hasn't drawn yet is thrown away"
+        if sink not in self.sinks:
+            return
+        self.sinks.remove(sink)
+        while not sink.queue.empty():
+            sink.queue.get_nowait()
+        sink.push(_DETACH)
+
+    def stop(self) -> None:
+        "Ends playback before the next frame"
+        self._running = False
+
+    def _start(self, sink: Sink) -> None:
+        sink.task = asyncio.get_running_loop().create_task(sink.run(self.layer))
+        self._tasks.append(sink.task)
+
+    def _send(self, frame: Frame) -> None:
+        for sink in list(self.sinks):
+            if sink.error is not None:
+                self.sinks.remove(sink)
+            else:
+                sink.push(frame)
+
+    async def play(self) -> FrameStats:
+        """Plays the animation in real time, returns once every sink
+        has drawn what it was sent (or been detached)
+        """
+        self._running = True
+        self.stats = FrameStats(self.fps)
+        for sink in self.sinks:
+            self._start(sink)
+
+        start = self._now()
+        last_index = -1
+        try:
+            while self._running:
+                elapsed = self._now() - start
+                time = round(elapsed * 1000)
+                if time > self.animation.duration:
+                    break
+
+                index = int(elapsed * self.fps)
+                self.stats.skipped += max(0, index - last_index - 1)
+                last_index = index
+
+                shapes = evaluate(self.animation, time, self.layer)
+                if self.sinks:
+                    self._send((time, clone_value(shapes)))
+                end_frame(time)
+                self.stats.frames += 1
+
+                finished = self._now() - start
+                self.stats.elapsed = finished
+                await asyncio.sleep(max(0, (int(finished * self.fps) + 1) / self.fps - finished))
+        finally:
+            self._running = False
+            for sink in self.sinks:
+                sink.push(_END)
+            await asyncio.gather(*self._tasks)
+            self._tasks = []
+        return self.stats
+
+
+async def tk_updates(root: Any, interval: float = 0.005) -> None:
+    "Keeps a Tk window responsive from asyncio, until it's destroyed"
+    import tkinter
+    try:
+        while True:
+            root.update()
+            await asyncio.sleep(interval)
+    except tkinter.TclError:
+        pass
@@ -0,0 +1,147 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Tuple
+
+# A font is fully described by a Text shape's font fields:
+# (family, size, bold, slant, underline, overstrike)
+FontKey = Tuple[str, int, bool, bool, bool, bool]
+
+# Tk falls back on TkDefaultFont (about 10pt) without a size. A pt is
+# 4/3 of a pixel and an average character is roughly 0.6 em wide.
+DEFAULT_FONT_SIZE = 10
+
+
+def font_key(text: Any) -> FontKey:
+    "The FontKey of a Text shape"
+    return (
+        text.font_family, text.font_size, text.font_bold,
+        text.font_slant, text.font_underline, text.font_overstrike
+    )
+
+
+class FontBackend(ABC):
+    """Makes and measures fonts for one way of drawing text
+
+    Whatever create() returns is the backend's font, the registry just
+    hands it back to width() and line_height().
+    """
+
+    @abstractmethod
+    def create(self, key: FontKey) -> Any:
+        pass
+
+    @abstractmethod
+    def width(self, font: Any, line: str) -> int:
+        "How wide (in pixels) a single line of text is"
+        pass
+
+    @abstractmethod
+    def line_height(self, font: Any) -> float:
+        pass
+
+
+class ApproximateFonts(FontBackend):
+    "No real fonts, every character is the average width. Needs no display"
+
+    def create(self, key: FontKey) -> float:
+        size = key[1]
+        return (size if size > 0 else DEFAULT_FONT_SIZE) * 4 / 3 # pixels per em
+
+    def width(self, font: float, line: str) -> int:
+        return round(len(line) * font * 0.6)
+
+    def line_height(self, font: float) -> float:
+        return font * 1.2
+
+
+class _LRU(OrderedDict):
+    def __init__(self, size: int):
+        super().__init__()
+        self.size = size
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        value = super().get(key, default)
+        if value is not default:
+            self.move_to_end(key)
+        return value
+
+    def put(self, key: Any, value: Any) -> Any:
+        self[key] = value
+        if len(self) > self.size:
+            self.popitem(last=False)
+        return value
+
+
+class FontRegistry():
+    """Fonts and text measurements, made once and shared
+
+    Fonts are made by the backend the first time a FontKey is asked
+    for and kept for the `fonts` most recently used keys, so a scene
+    that cycles through sizes can't pile up fonts forever. Line widths,
+    text sizes and line breaks are cached (per FontKey and string) for
+    the `metrics` most recently used, that's what makes measuring text
+    every frame (captions, scoreboards, credits) cheap.
+    """
+
+    def __init__(self, backend: FontBackend, fonts: int = 64, metrics: int = 4096):
+        self.backend = backend
+        self._fonts = _LRU(fonts)
+        self._widths = _LRU(metrics)
+        self._sizes = _LRU(metrics)
+        self._wraps = _LRU(metrics)
+
+    def font(self, key: FontKey) -> Any:
+        font = self._fonts.get(key)
+        if font is None:
+            font = self._fonts.put(key, self.backend.create(key))
+        return font
+
+    def line_width(self, key: FontKey, line: str) -> int:
+        width = self._widths.get((key, line))
+        if width is None:
+            width = self._widths.put((key, line), self.backend.width(self.font(key), line))
+        return width
+
+    def size(self, key: FontKey, text: str) -> Tuple[int, int]:
+        "(width, height) of some text, lines split on newlines"
+        size = self._sizes.get((key, text))
+        if size is None:
+            lines = text.split('\n')
+            size = self._sizes.put((key, text), (
+                max(self.line_width(key, line) for line in lines),
+                round(len(lines) * self.backend.line_height(self.font(key)))
+            ))
+        return size
+
+    def wrap(self, key: FontKey, text: str, width: int) -> Tuple[str, ...]:
+        """Breaks text into lines no wider than `width`, at spaces
+
+        Newlines always break. A single word wider than `width` gets a
+        line of its own rather than being split up.
+        """
+        lines = self._wraps.get((key, text, width))
+        if lines is None:
+            out = []
+            for paragraph in text.split('\n'):
+                words = paragraph.split(' ')
+                line = words[0]
+                for word in words[1:]:
+                    if self.line_width(key, f'{line} {word}') <= width:
+                        line = f'{line} {word}'
+                    else:
+                        out.append(line)
+                        line = word
+                out.append(line)
+            lines = self._wraps.put((key, text, width), tuple(out))
+        return lines
+
+    def clear(self) -> None:
+        self._fonts.clear()
+        self._widths.clear()
+        self._sizes.clear()
+        self._wraps.clear()
+
+
+# For anything that needs a size without a real font (bounds, culling,
+# layout on machines without a display)
+approximate = FontRegistry(ApproximateFonts())
@@ -0,0 +1,118 @@
+from typing import List, Sequence, Tuple
+import numpy as np
+from shapes import Color, seed_hex_strings
+
+# Color spaces a gradient can be blended in. 'rgb' blends the sRGB
+# numbers straight (what animate_color does), 'linear' blends light
+# intensity (no dark band between saturated colors) and 'oklab' blends
+# perceived lightness and hue, so steps look evenly spaced.
+SPACES = ('rgb', 'linear', 'oklab')
+
+_LMS = np.array([
+    [0.4122214708, 0.5363325363, 0.0514459929],
+    [0.2119034982, 0.6806995451, 0.1073969566],
+    [0.0883024619, 0.2817188376, 0.6299787005],
+])
+_LAB = np.array([
+    [0.2104542553, 0.7936177850, -0.0040720468],
+    [1.9779984951, -2.4285922050, 0.4505937099],
+    [0.0259040371, 0.7827717662, -0.8086757660],
+])
+
+
+def _to_linear(srgb: np.ndarray) -> np.ndarray:
+    c = srgb / 255
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+
+def _from_linear(linear: np.ndarray) -> np.ndarray:
+    c = np.clip(linear, 0, 1)
+    return 255 * np.where(c <= 0.0031308, 12.92 * c, 1.055 * c ** (1 / 2.4) - 0.055)
+
+
+def _to_space(srgb: np.ndarray, space: str) -> np.ndarray:
+    if space == 'rgb':
+        return srgb
+    linear = _to_linear(srgb)
+    if space == 'linear':
+        return linear
+    return np.cbrt(linear @ _LMS.T) @ _LAB.T
+
+
+def _from_space(values: np.ndarray, space: str) -> np.ndarray:
+    if space == 'rgb':
+        return values
+    if space == 'linear':
+        return _from_linear(values)
+    lms = values @ np.linalg.inv(_LAB).T
+    return _from_linear((lms ** 3) @ np.linalg.inv(_LMS).T)
+
+
+class Gradient():
+    """A color ramp worked out once into a lookup table
+
+    Stops are colors spread evenly from 0 to 1, or (position, color)
+    pairs. The ramp is blended in `space` (see SPACES) and sampled at
+    `steps` evenly spaced points, progress is rounded to the nearest
+    one. Every entry is kept as an (r, g, b) tuple, a packed int and
+    the '#RRGGBB' string renderers use, and those strings go straight
+    into the cache Color.hex_str() reads, so nothing gets formatted
+    while a gradient plays.
+    """
+
+    def __init__(self,
+        stops: Sequence[Color] | Sequence[Tuple[float, Color]],
+        steps: int = 256,
+        space: str = 'rgb'
+    ):
+        if space not in SPACES:
+            raise ValueError(f'Unknown color space "{space}", try one of {SPACES}')
+        if len(stops) < 1 or steps < 2:
+            raise ValueError('a gradient needs at least one stop and two steps')
+
+        if all(isinstance(s, Color) for s in stops):
+            colors: List[Color] = list(stops) # type: ignore
+            positions = [i / max(1, len(colors) - 1) for i in range(len(colors))]
+        else:
+            pairs = sorted(stops, key=lambda s: s[0]) # type: ignore
+            positions = [float(p) for p, _ in pairs]
+            colors = [c for _, c in pairs]
+        if not all(c.visible for c in colors):
+            raise ValueError("a gradient can't go through an invisible color")
+
+        self.space = space
+        values = _to_space(np.array([[c.red, c.green, c.blue] for c in colors], dtype=np.float64), space)
+        t = np.linspace(0, 1, steps)
+        blended = np.stack([np.interp(t, positions, values[:, i]) for i in range(3)], axis=1)
+        rgb = np.clip(np.round(_from_space(blended, space)), 0, 255).astype(np.int64)
+
+        self.table: np.ndarray = rgb # steps x 3
+        self.rgb: List[Tuple[int, int, int]] = [tuple(c) for c in rgb.tolist()] # type: ignore
+        self.packed: List[int] = (rgb[:, 0] << 16 | rgb[:, 1] << 8 | rgb[:, 2]).tolist()
+        self.strings: List[str] = [f'#{p:06X}' for p in self.packed]
+        seed_hex_strings(self.packed, self.strings)
+
+    def __len__(self) -> int:
+        return len(self.rgb)
+
+    def index(self, t: float) -> int:
+        "The table entry for progress t (0 to 1, held at the ends)"
+        last = len(self.rgb) - 1
+        return min(last, max(0, round(t * last)))
+
+    def indices(self, t: np.ndarray) -> np.ndarray:
+        "index() for a whole array of progress values"
+        last = len(self.rgb) - 1
+        return np.clip(np.round(t * last), 0, last).astype(np.int64)
+
+    def color(self, t: float) -> Color:
+        r, g, b = self.rgb[self.index(t)]
+        return Color(r, g, b)
+
+    def hex_str(self, t: float) -> str:
+        return self.strings[self.index(t)]
+
+    def apply(self, color: Color, t: float) -> None:
+        "Sets an existing Color to the gradient at t"
+        color.red, color.green, color.blue = self.rgb[self.index(t)]
+
@@ -1,7 +1,10 @@
 from tkinter import ttk, Tk, Canvas, TOP, BOTTOM, LEFT, RIGHT, Y, X
 from typing import List
-from animation import Animation
-from rendering import CanvasRenderer, RenderThunk
+import profiling
+from animation import Animation, ProfilerOverlay
+from culling import CullingRenderer
+from rendering import CanvasRenderer, Compositor
+from shapes import BoundingBox
 
 def tkcanvas_animiation_gui(animations: List[Animation]) -> None:
     """ Mega-simple GUI: 
@@ -15,7 +18,11 @@ def tkcanvas_animiation_gui(animations: List[Animation]) -> None:
     canvas = Canvas(root, bg="white", height=450, width=800)
     canvas.pack(side=LEFT)
 
-    rederer = CanvasRenderer(canvas)
+    rederer = CullingRenderer(
+        CanvasRenderer(canvas, auto_flush=False),
+        BoundingBox(0, 0, 800, 450)
+    )
+    compositor = Compositor(rederer)
 
     button_frame = ttk.LabelFrame(
         root,
@@ -28,9 +35,23 @@ def tkcanvas_animiation_gui(animations: List[Animation]) -> None:
         ttk.Button(
             button_frame, 
             text=a.name, 
-            command=RenderThunk(rederer, a).render
+            command=lambda a=a: compositor.add(a)
         ).pack(side=TOP, fill=X)
 
+    overlay: List[str] = []
+    def toggle_profiler() -> None:
+        if overlay:
+            compositor.remove(overlay.pop())
+            profiling.disable()
+        else:
+            overlay.append(compositor.add(ProfilerOverlay(profiling.enable())))
+
+    ttk.Button(
+        button_frame, 
+        text="Profiler", 
+        command=toggle_profiler
+    ).pack(side=BOTTOM, fill=X)
+
     ttk.Button(
         button_frame, 
         text="Quit", 
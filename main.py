@@ -14,7 +14,10 @@ def main() -> None:
         animations=[(i * 500, ani) for i, ani in enumerate([a, *b])]
     )
 
-    gui.tkcanvas_animiation_gui([a, *b, together, staggered])
+    particles = examples.firework_via_particles(fireworks=3, sparks=100)
+    balls = examples.bouncing_balls()
+
+    gui.tkcanvas_animiation_gui([a, *b, together, staggered, particles, balls])
 
 if __name__ == "__main__":
     main()
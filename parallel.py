@@ -0,0 +1,89 @@
+import multiprocessing as mp
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Tuple
+import numpy as np
+from animation import Animation, Scene
+from utility import use_id_namespace
+
+# Namespace 0 belongs to this process, workers get the next ones up.
+# Never handed out twice, not even by later pools.
+_next_namespace = 1
+
+
+def worker_context() -> Any:
+    """The multiprocessing context worker processes are started from
+
+    Every pool and worker (building Scenes, export, the pipeline) uses
+    it. Fork where the platform has it, workers then inherit whatever
+    they need as is. Elsewhere they're spawned and everything handed to
+    them (animations, child functions) has to be picklable, so no
+    lambdas or locally defined classes.
+    """
+    return mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else None)
+
+
+# Set in each worker by _init_worker
+_worker_child: Callable[[int], Tuple[int, Animation]] | None = None
+
+
+def _init_worker(child: Callable[[int], Tuple[int, Animation]], counter) -> None:
+    global _worker_child
+    _worker_child = child
+    with counter.get_lock():
+        namespace = counter.value
+        counter.value += 1
+    use_id_namespace(namespace)
+    # Forked workers start with our random state, they'd all build the
+    # same "random" children
+    random.seed()
+    np.random.seed()
+
+
+def _build_chunk(first: int, last: int) -> List[Tuple[int, Animation]]:
+    assert _worker_child is not None
+    return [_worker_child(i) for i in range(first, last)]
+
+
+def build_scene(
+    child: Callable[[int], Tuple[int, Animation]],
+    count: int,
+    name: str = '',
+    workers: int | None = None,
+    chunk_size: int = 100
+) -> Scene:
+    """Builds a Scene's children in a process pool
+
+    child(i) makes the i-th child as a (start time, animation) pair,
+    like the ones you'd give to Scene. The children come back in
+    order of i and are put in one Scene.
+
+    Each worker makes its shapes in its own id namespace (see
+    utility.use_id_namespace) so ids stay unique across the whole
+    Scene. Children are pickled on the way back, and child has to be
+    picklable too where workers can't fork (see worker_context).
+    """
+    global _next_namespace
+    workers = workers or os.cpu_count() or 1
+    context = worker_context()
+    counter = context.Value('q', _next_namespace)
+
+    children: List[Tuple[int, Animation]] = []
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(child, counter)
+        ) as pool:
+            for chunk in pool.map(
+                _build_chunk,
+                range(0, count, chunk_size),
+                [min(i + chunk_size, count) for i in range(0, count, chunk_size)]
+            ):
+                children += chunk
+    finally:
+        _next_namespace = counter.value
+
+    return Scene(children, name=name)
@@ -0,0 +1,234 @@
+import math
+from dataclasses import dataclass, field
+from typing import List, Sequence
+import numpy as np
+from animation import Animation
+from shapes import BoundingBox, Circle, Color, ColorNames, Point, Shape
+
+
+@dataclass(slots=True)
+class ParticleBatch(Shape):
+    """Lots of filled circles as arrays rather than as Circle objects
+
+    Renderers that understand this (like RasterRenderer) can draw the
+    whole batch in one go. Each array has one entry per live particle.
+    `colors` is (n x 3) uint8.
+    """
+    x: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    y: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    radius: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    colors: np.ndarray = field(default_factory=lambda: np.zeros((0, 3), dtype=np.uint8))
+
+    def bounds(self) -> BoundingBox:
+        if len(self.x) == 0:
+            return BoundingBox(0, 0, -1, -1)
+        return BoundingBox(
+            float((self.x - self.radius).min()), float((self.y - self.radius).min()),
+            float((self.x + self.radius).max()), float((self.y + self.radius).max())
+        )
+
+
+class ParticleSystem(Animation):
+    """Animation for a lot of little circles
+
+    Every particle is a row in a handful of NumPy arrays (birth time,
+    lifetime, start position, velocity, radius and color at birth and
+    at death). Motion under gravity and drag has a closed form, so a
+    frame is one vectorized evaluation over every particle. There's no
+    state carried between frames which means you can ask for any time
+    in any order.
+
+    Velocities are in pixels per second and gravity is in pixels per
+    second squared (positive y is down, like the canvas). Drag is the
+    fraction of velocity lost per second (roughly).
+
+    By default get_state returns one Circle per live particle (the same
+    Circle object every frame, so renderers can track it by id). Set
+    `batched=True` to get a single ParticleBatch instead; that's much
+    faster but only works with renderers that know how to draw it.
+
+    Add particles (emit/burst) before putting this into a Scene, the
+    duration grows to cover the last particle's death.
+    """
+
+    def __init__(self,
+        gravity: Point = Point(0, 0),
+        drag: float = 0,
+        batched: bool = False,
+        seed: int | None = None,
+        duration: int = 0,
+        *args, **kwargs
+    ):
+        self.gravity = (float(gravity.x), float(gravity.y))
+        self.drag = drag
+        self.batched = batched
+        self._rng = np.random.default_rng(seed)
+        self._count = 0
+
+        self._birth = np.zeros(0)
+        self._lifetime = np.zeros(0)
+        self._pos = np.zeros((0, 2))
+        self._vel = np.zeros((0, 2))
+        self._radius = np.zeros((0, 2))
+        self._colors = np.zeros((0, 2, 3))
+
+        self._circles: List[Circle | None] = []
+        self._batch = ParticleBatch()
+
+        super().__init__(duration, *args, **kwargs)
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def seekable(self) -> bool:
+        return True
+
+    def _grow(self, extra: int) -> None:
+        needed = self._count + extra
+        if needed <= len(self._birth):
+            return
+        capacity = max(needed, 2 * len(self._birth), 64)
+
+        def resized(a: np.ndarray) -> np.ndarray:
+            bigger = np.zeros((capacity, *a.shape[1:]), dtype=a.dtype)
+            bigger[:self._count] = a[:self._count]
+            return bigger
+
+        self._birth = resized(self._birth)
+        self._lifetime = resized(self._lifetime)
+        self._pos = resized(self._pos)
+        self._vel = resized(self._vel)
+        self._radius = resized(self._radius)
+        self._colors = resized(self._colors)
+        self._circles += [None] * (capacity - len(self._circles))
+
+    def emit(self,
+        at: int,
+        position: Point,
+        velocities: np.ndarray,
+        lifetimes: np.ndarray,
+        radius: Sequence[float] = (4, 0),
+        start_colors: np.ndarray | Color = ColorNames.WHITE(),
+        end_colors: np.ndarray | Color | None = None
+    ) -> None:
+        """Adds particles that are born at time `at` from `position`
+
+        velocities is (n x 2), lifetimes has n entries (milliseconds).
+        radius is (at birth, at death). Colors are either a Color for
+        every particle or an (n x 3) array, end colors default to the
+        start colors.
+        """
+        n = len(velocities)
+        self._grow(n)
+        s = slice(self._count, self._count + n)
+
+        def as_rgb(c: np.ndarray | Color) -> np.ndarray:
+            return np.array([c.red, c.green, c.blue]) if isinstance(c, Color) else np.asarray(c)
+
+        self._birth[s] = at
+        self._lifetime[s] = lifetimes
+        self._pos[s] = (position.x, position.y)
+        self._vel[s] = velocities
+        self._radius[s] = radius
+        self._colors[s, 0] = as_rgb(start_colors)
+        self._colors[s, 1] = as_rgb(start_colors if end_colors is None else end_colors)
+        self._count += n
+
+        self.duration = max(self.duration, math.ceil(at + float(np.max(lifetimes, initial=0))))
+
+    def burst(self,
+        at: int,
+        position: Point,
+        count: int = 100,
+        speed: Sequence[float] = (50, 150),
+        lifetime: Sequence[int] = (1500, 2500),
+        radius: Sequence[float] = (4, 0),
+        start_color: Color | None = None,
+        end_color: Color | None = None
+    ) -> None:
+        """A firework style explosion, particles fly off in every direction
+
+        speed and lifetime are (min, max) ranges. Without a start color
+        each particle gets a random one.
+        """
+        angle = self._rng.uniform(0, 2 * math.pi, count)
+        magnitude = self._rng.uniform(speed[0], speed[1], count)
+        self.emit(
+            at=at,
+            position=position,
+            velocities=np.column_stack([np.cos(angle), np.sin(angle)]) * magnitude[:, None],
+            lifetimes=self._rng.uniform(lifetime[0], lifetime[1], count),
+            radius=radius,
+            start_colors=(
+                self._rng.integers(0, 256, (count, 3)) if start_color is None
+                else start_color
+            ),
+            end_colors=end_color
+        )
+
+    def live(self, time: int) -> np.ndarray:
+        "Indices of the particles that are alive at this time"
+        age = time - self._birth[:self._count]
+        return np.flatnonzero((age >= 0) & (age < self._lifetime[:self._count]))
+
+    def get_batch(self, time: int, idx: np.ndarray | None = None) -> ParticleBatch:
+        """All live particles at this time, as arrays
+
+        The batch is reused between calls, copy it if you want to keep it.
+        """
+        if idx is None:
+            idx = self.live(time)
+        t = (time - self._birth[idx]) * 0.001
+        g = np.array(self.gravity)
+        p0, v0 = self._pos[idx], self._vel[idx]
+
+        if self.drag > 0:
+            k = self.drag
+            decay = (1 - np.exp(-k * t))[:, None] / k
+            pos = p0 + (v0 - g / k) * decay + (g / k) * t[:, None]
+        else:
+            pos = p0 + v0 * t[:, None] + 0.5 * g * (t * t)[:, None]
+
+        progress = ((time - self._birth[idx]) / self._lifetime[idx])[:, None]
+        radius = self._radius[idx, 0] + (self._radius[idx, 1] - self._radius[idx, 0]) * progress[:, 0]
+        colors = self._colors[idx, 0] + (self._colors[idx, 1] - self._colors[idx, 0]) * progress
+
+        batch = self._batch
+        batch.x = pos[:, 0]
+        batch.y = pos[:, 1]
+        batch.radius = np.maximum(radius, 0)
+        batch.colors = np.clip(np.round(colors), 0, 255).astype(np.uint8)
+        return batch
+
+    def _circle(self, i: int) -> Circle:
+        circle = self._circles[i]
+        if circle is None:
+            circle = Circle(border_color=ColorNames.NONE(), border_width=0)
+            self._circles[i] = circle
+        return circle
+
+    def get_state(self, time: int) -> List[Shape]:
+        idx = self.live(time)
+        batch = self.get_batch(time, idx)
+        if self.batched:
+            return [batch] if len(batch.x) else []
+
+        shapes: List[Shape] = []
+        rows = zip(
+            idx.tolist(),
+            np.round(batch.x).astype(int).tolist(),
+            np.round(batch.y).astype(int).tolist(),
+            np.round(batch.radius).astype(int).tolist(),
+            batch.colors.tolist()
+        )
+        for i, x, y, r, (red, green, blue) in rows:
+            circle = self._circle(i)
+            circle.position.x = x
+            circle.position.y = y
+            circle.radius = r
+            circle.fill_color.red = red
+            circle.fill_color.green = green
+            circle.fill_color.blue = blue
+            shapes.append(circle)
+        return shapes
@@ -0,0 +1,391 @@
+import math
+import multiprocessing as mp
+import time as clock
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Any, Callable, List, Tuple
+import numpy as np
+from animation import Animation
+from export import frame_count, frame_time
+from parallel import worker_context
+from raster import RasterRenderer
+from rendering import FrameScheduler
+from shapes import Color, ColorNames
+
+# What a slot in the ring is doing
+FREE, WRITING, READY, SHOWN = range(4)
+
+# What a producer does when every slot is taken
+BLOCK = 'block'             # wait for the display to let one go
+DROP_OLDEST = 'drop_oldest' # write over the oldest finished frame the clock has passed
+POLICIES = (BLOCK, DROP_OLDEST)
+
+# The header is int64s: state and frame index for every slot, then these
+_RUNNING = 0
+_TIME = 1         # the playback time (ms) the display last asked for
+_STAMP = 2        # and when it asked (monotonic ns, 0 before it first did)
+_PRODUCED = 3
+_DISPLAYED = 4
+_DROPPED = 5      # overwritten by DROP_OLDEST before they were shown
+_STALE = 6        # finished, but the display had already moved past them
+_LATE = 7         # not rendered at all, they'd have been stale
+_WAITS = 8        # times a producer had to wait for a slot
+_REPEATS = 9      # display asked and there was nothing new
+_OCCUPANCY = 10   # READY slots, summed over every time the display asked
+_SAMPLES = 11
+_COUNTERS = 12
+
+# How long a waiting producer sleeps before checking it hasn't been stopped
+_WAIT = 0.1 # seconds
+
+
+@dataclass
+class RingStats():
+    slots: int
+    free: int
+    writing: int
+    ready: int
+    shown: int
+    produced: int
+    displayed: int
+    dropped: int
+    stale: int
+    late: int
+    waits: int
+    repeats: int
+    occupancy_sum: int
+    samples: int
+
+    @property
+    def mean_occupancy(self) -> float:
+        "How many finished frames were waiting, on average, when the display asked"
+        return self.occupancy_sum / self.samples if self.samples else 0
+
+
+class FrameRing():
+    """A ring of RGBA frames in shared memory
+
+    Every slot is a (height x width x 4) uint8 array that producers
+    draw into and the display reads from where it is, frames never get
+    pickled or copied between processes. A slot goes FREE -> WRITING
+    (one producer) -> READY -> SHOWN (the display) -> FREE. The display
+    keeps its slot until it takes a newer one, so the frame it's
+    showing can't be drawn over.
+
+    Frames are numbered, frame i is sampled at frame_time(i, fps).
+    The display says what playback time it's at whenever it asks for a
+    frame, producers go by that (plus however long it's been since) to
+    tell which frames are already too late to bother with.
+
+    All the bookkeeping is one shared int64 header behind one
+    Condition. Only the slot states change under it, the drawing
+    itself happens outside.
+    """
+
+    def __init__(self, width: int, height: int, slots: int = 4, fps: float = 20, context: Any = None):
+        if slots < 2:
+            raise ValueError('a ring needs at least 2 slots')
+        context = context or mp.get_context()
+        self.width = width
+        self.height = height
+        self.slots = slots
+        self.fps = fps
+        self._owner = True
+        header = (2 * slots + _COUNTERS) * 8
+        self._offset = -(-header // 64) * 64
+        self._shm = shared_memory.SharedMemory(create=True, size=self._offset + slots * height * width * 4)
+        self._cond = context.Condition()
+        self._map()
+        self._header[:] = 0
+        self._counters[_RUNNING] = 1
+
+    def _map(self) -> None:
+        self._header = np.ndarray((2 * self.slots + _COUNTERS,), np.int64, self._shm.buf)
+        self._state = self._header[:self.slots]
+        self._frame = self._header[self.slots:2 * self.slots]
+        self._counters = self._header[2 * self.slots:]
+        self.frames = np.ndarray(
+            (self.slots, self.height, self.width, 4), np.uint8, self._shm.buf, self._offset
+        )
+
+    def __getstate__(self) -> dict:
+        # Only for starting producers without fork, they attach by name
+        state = self.__dict__.copy()
+        for name in ('_shm', '_header', '_state', '_frame', '_counters', 'frames'):
+            del state[name]
+        state['_name'] = self._shm.name
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        name = state.pop('_name')
+        self.__dict__.update(state)
+        self._owner = False
+        # Producers share our resource tracker, so attaching doesn't
+        # get it unlinked behind our back when they exit
+        self._shm = shared_memory.SharedMemory(name=name)
+        self._map()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._counters[_RUNNING])
+
+    def due(self, time: int) -> int:
+        "The last frame sampled at or before `time`"
+        i = max(0, math.floor(time * self.fps / 1000))
+        while frame_time(i + 1, self.fps) <= time:
+            i += 1
+        while i > 0 and frame_time(i, self.fps) > time:
+            i -= 1
+        return i
+
+    def _now(self) -> int:
+        "The frame playback is at, going by the display's clock"
+        stamp = self._counters[_STAMP]
+        if not stamp:
+            return 0
+        return self.due(int(self._counters[_TIME] + (clock.monotonic_ns() - stamp) // 1_000_000))
+
+    def _late(self, frame: int) -> bool:
+        if frame < self._now():
+            self._counters[_LATE] += 1
+            return True
+        return False
+
+    def claim(self, frame: int, policy: str = BLOCK) -> int | None:
+        """A slot to draw `frame` into, None if it shouldn't be drawn
+
+        That's when the ring was stopped or the display has already
+        moved past the frame (now or while we were waiting).
+        """
+        with self._cond:
+            while True:
+                if not self.running or self._late(frame):
+                    return None
+                free = np.flatnonzero(self._state == FREE)
+                if len(free):
+                    slot = int(free[0])
+                    break
+                if policy == DROP_OLDEST:
+                    # Only frames the clock has passed, they'd be
+                    # stale by the time the display asks anyway
+                    ready = np.flatnonzero(self._state == READY)
+                    ready = ready[self._frame[ready] < self._now()]
+                    if len(ready):
+                        slot = int(ready[np.argmin(self._frame[ready])])
+                        self._counters[_DROPPED] += 1
+                        break
+                self._counters[_WAITS] += 1
+                self._cond.wait(_WAIT)
+            self._state[slot] = WRITING
+            self._frame[slot] = frame
+            return slot
+
+    def publish(self, slot: int) -> None:
+        "The frame in `slot` is done"
+        with self._cond:
+            self._state[slot] = READY
+            self._counters[_PRODUCED] += 1
+
+    def latest(self, time: int) -> Tuple[int, np.ndarray] | None:
+        """The newest finished frame that's due at playback `time`
+
+        Returns (frame index, pixels) and holds on to that slot until
+        the next call, None if nothing new has come in since. Finished
+        frames it skips over are let go.
+        """
+        due = self.due(time)
+        with self._cond:
+            self._counters[_TIME] = time
+            self._counters[_STAMP] = clock.monotonic_ns()
+            ready = np.flatnonzero(self._state == READY)
+            self._counters[_OCCUPANCY] += len(ready)
+            self._counters[_SAMPLES] += 1
+            ready = ready[self._frame[ready] <= due]
+            if not len(ready):
+                self._counters[_REPEATS] += 1
+                return None
+
+            newest = int(ready[np.argmax(self._frame[ready])])
+            self._counters[_STALE] += len(ready) - 1
+            self._state[ready] = FREE
+            self._state[self._state == SHOWN] = FREE
+            self._state[newest] = SHOWN
+            self._counters[_DISPLAYED] += 1
+            self._cond.notify_all()
+            return int(self._frame[newest]), self.frames[newest]
+
+    def stats(self) -> RingStats:
+        with self._cond:
+            states = np.bincount(self._state, minlength=4)
+            c = self._counters
+            return RingStats(
+                self.slots, int(states[FREE]), int(states[WRITING]), int(states[READY]), int(states[SHOWN]),
+                int(c[_PRODUCED]), int(c[_DISPLAYED]), int(c[_DROPPED]), int(c[_STALE]), int(c[_LATE]),
+                int(c[_WAITS]), int(c[_REPEATS]), int(c[_OCCUPANCY]), int(c[_SAMPLES])
+            )
+
+    def stop(self) -> None:
+        "Wakes every waiting producer, they all give up"
+        with self._cond:
+            self._counters[_RUNNING] = 0
+            self._cond.notify_all()
+
+    def close(self) -> None:
+        # The arrays point into the mapping, they have to go first
+        del self.frames, self._header, self._state, self._frame, self._counters
+        try:
+            self._shm.close()
+        except BufferError:
+            pass # someone still holds a frame, the mapping goes when they let go
+        if self._owner:
+            self._shm.unlink()
+
+
+def _produce(
+    ring: FrameRing,
+    animation: Animation,
+    worker: int,
+    workers: int,
+    fps: float,
+    background: Color,
+    policy: str,
+    loop: bool
+) -> None:
+    """Renders every `workers`-th frame, starting at `worker`, into the ring
+
+    Seekable animations only get asked for the frames this worker
+    draws. Others might capture state the first time they see a frame,
+    so those are asked for every frame, in order (like export does).
+    """
+    renderer = RasterRenderer(ring.width, ring.height, background, workers=1)
+    total = frame_count(animation, fps)
+    i = 0
+    while ring.running and (loop or i < total):
+        slot = ring.claim(i, policy) if i % workers == worker else None
+        if slot is not None or not animation.seekable:
+            shapes = animation.get_state(frame_time(i % total, fps))
+        if slot is not None:
+            renderer.update_animation_layer('pipeline', shapes)
+            renderer.render(into=ring.frames[slot])
+            ring.publish(slot)
+        i += 1
+    renderer.close()
+
+
+class FramePipeline():
+    """Plays an animation with evaluating and rasterizing done elsewhere
+
+    Worker processes take turns at frames (worker k gets frames k,
+    k + workers, ...), evaluate the animation and rasterize straight
+    into a FrameRing. The display process only ever asks for frame(time)
+    and gets the newest finished frame that's due, so a slow get_state
+    costs frames, not a frozen display.
+
+    Producers work ahead of the display as far as the ring lets them.
+    When it's full, `policy` says what a producer does: BLOCK waits for
+    the display to take something, DROP_OLDEST writes over the oldest
+    finished frame that playback has already passed (when the display
+    stalls, the ring keeps filling with current frames instead of old
+    ones) and only waits if there's none. Either way producers skip
+    frames that would be late. See stats() for how full the ring runs
+    and where frames went. Workers start from parallel.worker_context.
+    """
+
+    def __init__(self,
+        animation: Animation,
+        fps: float = 20,
+        width: int = 800,
+        height: int = 450,
+        background: Color = ColorNames.WHITE(),
+        slots: int = 4,
+        workers: int = 2,
+        policy: str = BLOCK,
+        loop: bool = False
+    ):
+        if policy not in POLICIES:
+            raise ValueError(f'unknown policy {policy!r}, use one of {POLICIES}')
+        self.animation = animation
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.loop = loop
+        self.frame_index = -1 # the last one handed out
+
+        context = worker_context()
+        self.ring = FrameRing(width, height, max(slots, 2), fps, context)
+        self.workers: List[Any] = [
+            context.Process(
+                target=_produce,
+                args=(self.ring, animation, k, workers, fps, background, policy, loop),
+                daemon=True
+            )
+            for k in range(workers)
+        ]
+        for w in self.workers:
+            w.start()
+
+    @property
+    def duration(self) -> float:
+        return math.inf if self.loop else self.animation.duration
+
+    def frame(self, time: int) -> np.ndarray | None:
+        """The frame to show at `time`, None if it's still the last one
+
+        The array is a view of the ring and stays good until the next
+        call. Don't write to it.
+        """
+        latest = self.ring.latest(time)
+        if latest is None:
+            return None
+        self.frame_index, pixels = latest
+        return pixels
+
+    def stats(self) -> RingStats:
+        return self.ring.stats()
+
+    def close(self) -> None:
+        if self.ring is None:
+            return
+        self.ring.stop()
+        for w in self.workers:
+            w.join(1)
+            if w.is_alive():
+                w.terminate()
+                w.join()
+        self.ring.close()
+        self.ring = None # type: ignore
+
+    def __enter__(self) -> 'FramePipeline':
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def play_on_canvas(canvas: Any, pipeline: FramePipeline, on_done: Callable[[], None] = lambda: None) -> FrameScheduler:
+    """Shows a FramePipeline on a Tk canvas (the display side)
+
+    Every tick just blits the newest due frame into one PhotoImage.
+    On the way a frame is copied twice, once to drop the alpha and once
+    to put the PPM header in front (tkinter only takes bytes), and then
+    Tk copies it again. The pipeline is closed when playback ends.
+    """
+    from tkinter import PhotoImage
+
+    photo = PhotoImage(master=canvas, width=pipeline.width, height=pipeline.height)
+    item = canvas.create_image(0, 0, image=photo, anchor='nw')
+    header = f'P6 {pipeline.width} {pipeline.height} 255\n'.encode()
+
+    def on_frame(time: int) -> None:
+        rgba = pipeline.frame(time)
+        if rgba is not None:
+            photo.configure(data=header + rgba[..., :3].tobytes(), format='ppm')
+
+    def done() -> None:
+        canvas.delete(item)
+        pipeline.close()
+        on_done()
+
+    scheduler = FrameScheduler(canvas.after, pipeline.fps)
+    scheduler.start(pipeline.duration, on_frame, done)
+    return scheduler
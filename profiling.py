@@ -0,0 +1,191 @@
+from collections import deque
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Any, Callable, Deque, Dict, List, Tuple, TypeVar
+
+# The profiler everything reports to, None when profiling is off.
+# Instrumented code checks this once per call and takes its usual path
+# when it's None, so leaving profiling off costs (almost) nothing.
+current: 'Profiler | None' = None
+
+
+@dataclass
+class AnimationSample():
+    "get_state calls made by a Scene for one path in its tree"
+    calls: int = 0
+    seconds: float = 0
+    shapes: int = 0
+
+
+@dataclass
+class LayerSample():
+    "Where one layer's time went. Seconds, and how many items were touched"
+    evaluate: float = 0
+    shapes: int = 0
+    create: float = 0
+    created: int = 0
+    update: float = 0
+    updated: int = 0
+    delete: float = 0
+    deleted: int = 0
+
+    @property
+    def total(self) -> float:
+        return self.evaluate + self.create + self.update + self.delete
+
+
+@dataclass
+class FrameProfile():
+    """Everything recorded between two end_frame calls
+
+    animations is keyed by path in the Scene tree (Scene names down to
+    the animation's own name), layers by layer name. canvas_update is
+    time spent in canvas.update()/update_idletasks(), which is when Tk
+    actually paints.
+    """
+    time: int | None = None # The animation time of the frame, if known
+    animations: Dict[Tuple[str, ...], AnimationSample] = field(default_factory=dict)
+    layers: Dict[str, LayerSample] = field(default_factory=dict)
+    canvas_update: float = 0
+    started: float = field(default_factory=perf_counter)
+    elapsed: float = 0 # Wall clock, first record to end_frame
+
+    def slowest_animations(self, n: int = 5) -> List[Tuple[Tuple[str, ...], AnimationSample]]:
+        return sorted(self.animations.items(), key=lambda kv: -kv[1].seconds)[:n]
+
+    def slowest_layers(self, n: int = 5) -> List[Tuple[str, LayerSample]]:
+        return sorted(self.layers.items(), key=lambda kv: -kv[1].total)[:n]
+
+
+# A layer phase's time field -> the field counting what it touched
+_PHASE_COUNTS = {'evaluate': 'shapes', 'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+_LAYER_PHASES = tuple(_PHASE_COUNTS)
+_LAYER_COUNTS = tuple(_PHASE_COUNTS.values())
+
+T = TypeVar('T')
+
+
+class Profiler():
+    """Collects per frame timings from Scenes and renderers
+
+    Turn it on with enable(), everything that runs afterwards reports
+    to it. Frames are closed by end_frame; Compositor and RenderThunk
+    do that after every frame they draw. The last `history` frames are
+    kept in `frames`, oldest first.
+    """
+
+    def __init__(self, history: int = 300):
+        self.frames: Deque[FrameProfile] = deque(maxlen=history)
+        self._frame: FrameProfile | None = None
+
+    @property
+    def frame(self) -> FrameProfile:
+        "The frame being recorded right now"
+        if self._frame is None:
+            self._frame = FrameProfile()
+        return self._frame
+
+    @property
+    def last(self) -> FrameProfile | None:
+        "The most recent finished frame"
+        return self.frames[-1] if self.frames else None
+
+    def end_frame(self, time: int | None = None) -> FrameProfile:
+        frame = self.frame
+        frame.time = time
+        frame.elapsed = perf_counter() - frame.started
+        self.frames.append(frame)
+        self._frame = None
+        return frame
+
+    def record_state(self, path: Tuple[str, ...], seconds: float, shapes: int) -> None:
+        sample = self.frame.animations.get(path)
+        if sample is None:
+            sample = self.frame.animations[path] = AnimationSample()
+        sample.calls += 1
+        sample.seconds += seconds
+        sample.shapes += shapes
+
+    def layer(self, layer: str) -> LayerSample:
+        sample = self.frame.layers.get(layer)
+        if sample is None:
+            sample = self.frame.layers[layer] = LayerSample()
+        return sample
+
+    def record_evaluate(self, layer: str, seconds: float, shapes: int) -> None:
+        sample = self.layer(layer)
+        sample.evaluate += seconds
+        sample.shapes += shapes
+
+    def measure(self, layer: str, phase: str, fn: Callable[..., int], *args: Any) -> int:
+        """Times fn(*args) as a phase ('create', 'update' or 'delete')
+        of a layer. fn returns how many items it touched.
+        """
+        counter = _PHASE_COUNTS.get(phase)
+        if counter is None:
+            raise ValueError(f'Unknown phase "{phase}", try one of {_LAYER_PHASES}')
+        start = perf_counter()
+        count = fn(*args)
+        seconds = perf_counter() - start
+        sample = self.layer(layer)
+        setattr(sample, phase, getattr(sample, phase) + seconds)
+        setattr(sample, counter, getattr(sample, counter) + count)
+        return count
+
+    def measure_canvas_update(self, fn: Callable[[], T]) -> T:
+        start = perf_counter()
+        result = fn()
+        self.frame.canvas_update += perf_counter() - start
+        return result
+
+    def summary(self, frames: int | None = None) -> Dict[str, Any]:
+        """Averages over the last `frames` frames (all of them if None),
+        in milliseconds per frame. Plain dicts, ready for json.dumps.
+        """
+        recent = list(self.frames)[-frames:] if frames else list(self.frames)
+        n = max(len(recent), 1)
+        animations: Dict[Tuple[str, ...], AnimationSample] = dict()
+        layers: Dict[str, LayerSample] = dict()
+        for frame in recent:
+            for path, a in frame.animations.items():
+                total = animations.setdefault(path, AnimationSample())
+                total.calls += a.calls
+                total.seconds += a.seconds
+                total.shapes += a.shapes
+            for name, l in frame.layers.items():
+                total_layer = layers.setdefault(name, LayerSample())
+                for k in _LAYER_PHASES + _LAYER_COUNTS:
+                    setattr(total_layer, k, getattr(total_layer, k) + getattr(l, k))
+
+        return {
+            'frames': len(recent),
+            'frame_ms': sum(f.elapsed for f in recent) * 1000 / n,
+            'canvas_update_ms': sum(f.canvas_update for f in recent) * 1000 / n,
+            'animations': {
+                '/'.join(path): {'ms': a.seconds * 1000 / n, 'calls': a.calls / n, 'shapes': a.shapes / n}
+                for path, a in sorted(animations.items(), key=lambda kv: -kv[1].seconds)
+            },
+            'layers': {
+                name: {
+                    'ms': l.total * 1000 / n,
+                    **{f'{k}_ms': getattr(l, k) * 1000 / n for k in _LAYER_PHASES},
+                    **{k: getattr(l, k) / n for k in _LAYER_COUNTS}
+                }
+                for name, l in sorted(layers.items(), key=lambda kv: -kv[1].total)
+            }
+        }
+
+
+def enable(profiler: Profiler | None = None) -> Profiler:
+    "Start reporting to a profiler (a new one if not given)"
+    global current
+    current = Profiler() if profiler is None else profiler
+    return current
+
+
+def disable() -> Profiler | None:
+    "Stop profiling, returns the profiler that was in use"
+    global current
+    profiler, current = current, None
+    return profiler
+
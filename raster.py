@@ -0,0 +1,460 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Tuple
+import numpy as np
+from fonts import DEFAULT_FONT_SIZE
+from shapes import Arc, Circle, Color, ColorNames, Line, Oval, Polygon, PrimitiveShape, Rectangle, Shape, Text
+from rendering import Renderer
+from particles import ParticleBatch
+
+# Classic 5x7 LCD font for printable ASCII (32 - 126). Every glyph is
+# 5 columns, each column is a byte where bit 0 is the top row.
+_GLYPHS_5X7 = bytes.fromhex(
+    "0000000000" "00005f0000" "0007000700" "147f147f14" "242a7f2a12"
+    "2313086462" "3649552250" "0005030000" "001c224100" "0041221c00"
+    "082a1c2a08" "08083e0808" "0050300000" "0808080808" "0060600000"
+    "2010080402" "3e5149453e" "00427f4000" "4261514946" "2141454b31"
+    "1814127f10" "2745454539" "3c4a494930" "0171090503" "3649494936"
+    "064949291e" "0036360000" "0056360000" "0814224100" "1414141414"
+    "0041221408" "0201510906" "324979413e" "7e1111117e" "7f49494936"
+    "3e41414122" "7f4141221c" "7f49494941" "7f09090101" "3e41415132"
+    "7f0808087f" "00417f4100" "2040413f01" "7f08142241" "7f40404040"
+    "7f0204027f" "7f0408107f" "3e4141413e" "7f09090906" "3e4151215e"
+    "7f09192946" "4649494931" "01017f0101" "3f4040403f" "1f2040201f"
+    "7f2018207f" "6314081463" "0304780403" "6151494543" "00007f4141"
+    "0204081020" "41417f0000" "0402010204" "4040404040" "0001020400"
+    "2054545478" "7f48444438" "3844444420" "384444487f" "3854545418"
+    "087e090102" "081454543c" "7f08040478" "00447d4000" "2040443d00"
+    "007f102844" "00417f4000" "7c04180478" "7c08040478" "3844444438"
+    "7c14141408" "081414187c" "7c08040408" "4854545420" "043f444020"
+    "3c4040207c" "1c2040201c" "3c4030403c" "4428102844" "0c5050503c"
+    "4464544c44" "0008364100" "00007f0000" "0041360800" "0804081008"
+)
+
+RGBA = Tuple[int, int, int, int]
+
+
+def _rgba(c: Color) -> RGBA | None:
+    "None means invisible, there's nothing to draw"
+    return (c.red, c.green, c.blue, 255) if c.visible else None
+
+
+@lru_cache(maxsize=512)
+def _text_bitmap(text: str, scale: int, bold: bool, underline: bool, overstrike: bool) -> np.ndarray:
+    """Rasterizes text with the built-in bitmap font.
+
+    The result is a boolean mask, one row per pixel. Lines are centered
+    on each other the way Tk centers multi-line text.
+    """
+    lines = text.split('\n')
+    width = max(len(line) for line in lines) * 6
+    cell = np.zeros((len(lines) * 9, width), dtype=bool)
+
+    for row, line in enumerate(lines):
+        left = (width - len(line) * 6) // 2
+        for i, ch in enumerate(line):
+            code = ord(ch) - 32
+            if code < 0 or code >= len(_GLYPHS_5X7) // 5:
+                code = ord('?') - 32
+            cols = np.frombuffer(_GLYPHS_5X7, dtype=np.uint8, count=5, offset=code * 5)
+            bits = (cols[None, :] >> np.arange(7)[:, None]) & 1
+            cell[row * 9:row * 9 + 7, left + i * 6:left + i * 6 + 5] = bits.astype(bool)
+        if underline:
+            cell[row * 9 + 8, left:left + len(line) * 6 - 1] = True
+        if overstrike:
+            cell[row * 9 + 3, left:left + len(line) * 6 - 1] = True
+
+    if bold:
+        cell[:, 1:] |= cell[:, :-1]
+
+    return np.kron(cell, np.ones((scale, scale), dtype=bool))
+
+
+class _DrawOp():
+    """A snapshot of one shape, ready to be rasterized
+
+    Animations mutate their shapes in place, so the renderer copies
+    out the numbers it needs as soon as it's handed a shape. Each op
+    knows its bounding box (x0, y0, x1, y1) in pixels so tiles can
+    skip ops that don't touch them.
+    """
+    bbox: Tuple[int, int, int, int]
+
+    def paint(self, fb: np.ndarray, window: Tuple[int, int, int, int]) -> None:
+        raise NotImplementedError
+
+
+def _grid(window: Tuple[int, int, int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    "Pixel centers for a window as a row of x's and a column of y's"
+    x0, y0, x1, y1 = window
+    return (
+        np.arange(x0, x1, dtype=np.float64)[None, :] + 0.5,
+        np.arange(y0, y1, dtype=np.float64)[:, None] + 0.5
+    )
+
+
+def _paint_mask(fb: np.ndarray, window: Tuple[int, int, int, int], mask: np.ndarray, rgba: RGBA) -> None:
+    x0, y0, x1, y1 = window
+    fb[y0:y1, x0:x1][mask] = rgba
+
+
+class _EllipseOp(_DrawOp):
+
+    def __init__(self, cx: float, cy: float, rx: float, ry: float, fill: RGBA | None, outline: RGBA | None, width: float):
+        self.cx, self.cy, self.rx, self.ry = cx, cy, abs(rx), abs(ry)
+        self.fill, self.outline = fill, outline
+        self.half_width = max(width, 0) / 2 if outline else 0
+        pad = self.half_width + 1
+        self.bbox = (
+            math.floor(cx - self.rx - pad), math.floor(cy - self.ry - pad),
+            math.ceil(cx + self.rx + pad), math.ceil(cy + self.ry + pad)
+        )
+
+    def _inside(self, xs: np.ndarray, ys: np.ndarray, grow: float) -> np.ndarray:
+        rx, ry = self.rx + grow, self.ry + grow
+        if rx <= 0 or ry <= 0:
+            return np.zeros((ys.shape[0], xs.shape[1]), dtype=bool)
+        return ((xs - self.cx) / rx) ** 2 + ((ys - self.cy) / ry) ** 2 <= 1
+
+    def paint(self, fb: np.ndarray, window: Tuple[int, int, int, int]) -> None:
+        xs, ys = _grid(window)
+        if self.fill:
+            _paint_mask(fb, window, self._inside(xs, ys, 0), self.fill)
+        if self.outline and self.half_width > 0:
+            ring = self._inside(xs, ys, self.half_width) & ~self._inside(xs, ys, -self.half_width)
+            _paint_mask(fb, window, ring, self.outline)
+
+
+class _RectangleOp(_DrawOp):
+
+    def __init__(self, x0: float, y0: float, x1: float, y1: float, fill: RGBA | None, outline: RGBA | None, width: float):
+        self.x0, self.x1 = sorted((x0, x1))
+        self.y0, self.y1 = sorted((y0, y1))
+        self.fill, self.outline = fill, outline
+        self.half_width = max(width, 0) / 2 if outline else 0
+        pad = self.half_width + 1
+        self.bbox = (
+            math.floor(self.x0 - pad), math.floor(self.y0 - pad),
+            math.ceil(self.x1 + pad), math.ceil(self.y1 + pad)
+        )
+
+    def _inside(self, xs: np.ndarray, ys: np.ndarray, grow: float) -> np.ndarray:
+        return (
+            ((xs >= self.x0 - grow) & (xs < self.x1 + grow)) &
+            ((ys >= self.y0 - grow) & (ys < self.y1 + grow))
+        )
+
+    def paint(self, fb: np.ndarray, window: Tuple[int, int, int, int]) -> None:
+        xs, ys = _grid(window)
+        if self.fill:
+            _paint_mask(fb, window, self._inside(xs, ys, 0), self.fill)
+        if self.outline and self.half_width > 0:
+            ring = self._inside(xs, ys, self.half_width) & ~self._inside(xs, ys, -self.half_width)
+            _paint_mask(fb, window, ring, self.outline)
+
+
+class _PolygonOp(_DrawOp):
+    """Filled polygons and stroked polylines
+
+    Fills use an even-odd scanline: every edge toggles the pixels to
+    its right on each row it crosses, then a cumulative sum along the
+    row gives inside/outside. Strokes are the set of pixels within
+    half the line width of any segment.
+    """
+
+    # Bound the (segments x pixels) temporaries when stroking
+    _STROKE_CHUNK = 64
+
+    def __init__(self, vertices: np.ndarray, fill: RGBA | None, outline: RGBA | None, width: float, closed: bool):
+        self.vertices = vertices
+        self.fill, self.outline = fill, outline
+        self.half_width = max(width, 1) / 2 if outline else 0
+        self.closed = closed
+
+        ends = np.roll(vertices, -1, axis=0) if closed else vertices[1:]
+        self.segments = np.hstack([vertices[:len(ends)], ends])
+
+        pad = self.half_width + 1
+        lo = vertices.min(axis=0)
+        hi = vertices.max(axis=0)
+        self.bbox = (
+            math.floor(lo[0] - pad), math.floor(lo[1] - pad),
+            math.ceil(hi[0] + pad), math.ceil(hi[1] + pad)
+        )
+
+    def _fill_mask(self, window: Tuple[int, int, int, int]) -> np.ndarray:
+        wx0, wy0, wx1, wy1 = window
+        rows = np.arange(wy0, wy1, dtype=np.float64) + 0.5
+        x1, y1, x2, y2 = (self.segments[:, i][:, None] for i in range(4))
+
+        crosses = ((y1 <= rows) & (rows < y2)) | ((y2 <= rows) & (rows < y1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_at = x1 + (rows - y1) * (x2 - x1) / (y2 - y1)
+
+        edge_idx, row_idx = np.nonzero(crosses)
+        cols = np.ceil(x_at[edge_idx, row_idx] - 0.5).astype(np.int64) - wx0
+        cols = np.clip(cols, 0, wx1 - wx0)
+
+        toggles = np.zeros((wy1 - wy0, wx1 - wx0 + 1), dtype=np.int32)
+        np.add.at(toggles, (row_idx, cols), 1)
+        return (np.cumsum(toggles, axis=1)[:, :-1] & 1).astype(bool)
+
+    def _stroke_mask(self, window: Tuple[int, int, int, int]) -> np.ndarray:
+        xs, ys = _grid(window)
+        xs, ys = xs[None], ys[None]
+        mask = np.zeros((ys.shape[1], xs.shape[2]), dtype=bool)
+        reach = self.half_width ** 2
+
+        for i in range(0, len(self.segments), self._STROKE_CHUNK):
+            seg = self.segments[i:i + self._STROKE_CHUNK]
+            ax, ay, bx, by = (seg[:, j][:, None, None] for j in range(4))
+            dx, dy = bx - ax, by - ay
+            length = dx * dx + dy * dy
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t = np.clip(((xs - ax) * dx + (ys - ay) * dy) / length, 0, 1)
+            t = np.nan_to_num(t)
+            px, py = ax + t * dx - xs, ay + t * dy - ys
+            mask |= ((px * px + py * py) <= reach).any(axis=0)
+
+        return mask
+
+    def paint(self, fb: np.ndarray, window: Tuple[int, int, int, int]) -> None:
+        if self.fill and self.closed:
+            _paint_mask(fb, window, self._fill_mask(window), self.fill)
+        if self.outline and len(self.segments):
+            _paint_mask(fb, window, self._stroke_mask(window), self.outline)
+
+
+class _BitmapOp(_DrawOp):
+
+    def __init__(self, bitmap: np.ndarray, x: int, y: int, rgba: RGBA):
+        self.bitmap = bitmap
+        self.rgba = rgba
+        self.bbox = (x, y, x + bitmap.shape[1], y + bitmap.shape[0])
+
+    def paint(self, fb: np.ndarray, window: Tuple[int, int, int, int]) -> None:
+        bx0, by0 = self.bbox[0], self.bbox[1]
+        x0, y0, x1, y1 = window
+        mask = self.bitmap[y0 - by0:y1 - by0, x0 - bx0:x1 - bx0]
+        _paint_mask(fb, window, mask, self.rgba)
+
+
+@lru_cache(maxsize=64)
+def _disc_offsets(radius: int) -> Tuple[np.ndarray, np.ndarray]:
+    "Pixel offsets that make up a filled disc"
+    dy, dx = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+    inside = dx * dx + dy * dy <= radius * radius
+    return dx[inside], dy[inside]
+
+
+class _ParticleOp(_DrawOp):
+    """Stamps a whole ParticleBatch
+
+    Particles are grouped by (rounded) radius and every group is drawn
+    with one fancy-indexed assignment, no Python loop per particle.
+    """
+
+    def __init__(self, batch: ParticleBatch):
+        self.cx = np.round(batch.x).astype(np.int64)
+        self.cy = np.round(batch.y).astype(np.int64)
+        self.r = np.round(batch.radius).astype(np.int64)
+        self.rgba = np.empty((len(self.cx), 4), dtype=np.uint8)
+        self.rgba[:, :3] = batch.colors
+        self.rgba[:, 3] = 255
+        self.bbox = (
+            int((self.cx - self.r).min()), int((self.cy - self.r).min()),
+            int((self.cx + self.r).max()) + 1, int((self.cy + self.r).max()) + 1
+        )
+
+    def paint(self, fb: np.ndarray, window: Tuple[int, int, int, int]) -> None:
+        x0, y0, x1, y1 = window
+        cx, cy, r = self.cx, self.cy, self.r
+        touching = np.flatnonzero(
+            (r > 0) & (cx + r >= x0) & (cx - r < x1) & (cy + r >= y0) & (cy - r < y1)
+        )
+        for radius in np.unique(r[touching]).tolist():
+            group = touching[r[touching] == radius]
+            dx, dy = _disc_offsets(radius)
+            px = cx[group][:, None] + dx[None, :]
+            py = cy[group][:, None] + dy[None, :]
+            keep = (px >= x0) & (px < x1) & (py >= y0) & (py < y1)
+            rows = np.broadcast_to(np.arange(len(group))[:, None], keep.shape)[keep]
+            fb[py[keep], px[keep]] = self.rgba[group][rows]
+
+
+def _arc_points(shape: Arc, steps_per_degree: float = 0.5) -> np.ndarray:
+    "Samples the curved part of an arc. Tk measures angles counterclockwise from 3 o'clock"
+    cx = (shape.upper_left.x + shape.lower_right.x) / 2
+    cy = (shape.upper_left.y + shape.lower_right.y) / 2
+    rx = abs(shape.lower_right.x - shape.upper_left.x) / 2
+    ry = abs(shape.lower_right.y - shape.upper_left.y) / 2
+    start = max(0, min(359, shape.start))
+    extent = max(0, min(359, shape.extent))
+    angles = np.radians(np.linspace(start, start + extent, max(2, round(extent * steps_per_degree) + 1)))
+    return np.column_stack([cx + rx * np.cos(angles), cy - ry * np.sin(angles)])
+
+
+def compile_shape(shape: Shape) -> List[_DrawOp]:
+    "Turns a shape into the draw ops that rasterize it"
+    if isinstance(shape, ParticleBatch):
+        return [_ParticleOp(shape)] if len(shape.x) else []
+
+    if isinstance(shape, Text):
+        rgba = _rgba(shape.color)
+        if rgba is None or not shape.text:
+            return []
+        size = shape.font_size if shape.font_size > 0 else DEFAULT_FONT_SIZE
+        scale = max(1, round(size * 4 / 3 / 9))
+        bitmap = _text_bitmap(shape.text, scale, shape.font_bold, shape.font_underline, shape.font_overstrike)
+        return [_BitmapOp(
+            bitmap,
+            shape.position.x - bitmap.shape[1] // 2,
+            shape.position.y - bitmap.shape[0] // 2,
+            rgba
+        )]
+
+    if isinstance(shape, Line):
+        rgba = _rgba(shape.color)
+        if rgba is None or len(shape.vertices) < 2:
+            return []
+        vertices = np.array([(p.x, p.y) for p in shape.vertices], dtype=np.float64)
+        return [_PolygonOp(vertices, None, rgba, shape.width, closed=False)]
+
+    if not isinstance(shape, PrimitiveShape):
+        raise NotImplementedError
+
+    fill = _rgba(shape.fill_color)
+    outline = _rgba(shape.border_color) if shape.border_width > 0 else None
+
+    if isinstance(shape, Circle):
+        return [_EllipseOp(
+            shape.position.x, shape.position.y, shape.radius, shape.radius,
+            fill, outline, shape.border_width
+        )]
+
+    if isinstance(shape, Oval):
+        return [_EllipseOp(
+            (shape.upper_left.x + shape.lower_right.x) / 2,
+            (shape.upper_left.y + shape.lower_right.y) / 2,
+            (shape.lower_right.x - shape.upper_left.x) / 2,
+            (shape.lower_right.y - shape.upper_left.y) / 2,
+            fill, outline, shape.border_width
+        )]
+
+    if isinstance(shape, Rectangle):
+        return [_RectangleOp(
+            shape.upper_left.x, shape.upper_left.y,
+            shape.lower_right.x, shape.lower_right.y,
+            fill, outline, shape.border_width
+        )]
+
+    if isinstance(shape, Polygon):
+        if len(shape.vertices) < 2:
+            return []
+        vertices = np.array([(p.x, p.y) for p in shape.vertices], dtype=np.float64)
+        return [_PolygonOp(vertices, fill, outline, shape.border_width, closed=True)]
+
+    if isinstance(shape, Arc):
+        points = _arc_points(shape)
+        if shape.style == Arc.STYLE_ARC:
+            return [_PolygonOp(points, None, outline, shape.border_width, closed=False)]
+        if shape.style == Arc.STYLE_PIESLICE:
+            center = np.array([[
+                (shape.upper_left.x + shape.lower_right.x) / 2,
+                (shape.upper_left.y + shape.lower_right.y) / 2
+            ]])
+            points = np.vstack([center, points])
+        return [_PolygonOp(points, fill, outline, shape.border_width, closed=True)]
+
+    raise NotImplementedError
+
+
+class RasterRenderer(Renderer):
+    """A headless Renderer that draws into a NumPy RGBA framebuffer
+
+    No display needed. Layers work the same as they do for the
+    CanvasRenderer: updating a layer replaces whatever it showed
+    before, and layers are drawn in the order they were first created.
+
+    Each update snapshots the shapes it's given, rasterizing happens
+    when you ask for the framebuffer. Big canvases are split into
+    tiles that are rasterized on a thread pool (NumPy lets go of the
+    GIL for the heavy lifting).
+    """
+
+    def __init__(self,
+        width: int = 800,
+        height: int = 450,
+        background: Color = ColorNames.WHITE(),
+        tile_size: int = 128,
+        workers: int | None = None
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.background = _rgba(background) or (0, 0, 0, 0)
+        self.tile_size = tile_size
+        self.layers: Dict[str, List[_DrawOp]] = dict()
+
+        self._framebuffer = np.empty((height, width, 4), dtype=np.uint8)
+        self._dirty = True
+        self._tiles = [
+            (x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in range(0, height, tile_size)
+            for x in range(0, width, tile_size)
+        ]
+        self._pool = ThreadPoolExecutor(workers) if len(self._tiles) > 1 else None
+
+    def update_animation_layer(self, layer: str, shapes: List[Shape]) -> None:
+        self.layers[layer] = [op for shape in shapes for op in compile_shape(shape)]
+        self._dirty = True
+
+    def clear_animation_layer(self, layer: str) -> None:
+        if self.layers.pop(layer, None) is not None:
+            self._dirty = True
+
+    def clear_everything(self) -> None:
+        self.layers.clear()
+        self._dirty = True
+
+    def _rasterize_tile(self, fb: np.ndarray, tile: Tuple[int, int, int, int], ops: List[_DrawOp]) -> None:
+        tx0, ty0, tx1, ty1 = tile
+        fb[ty0:ty1, tx0:tx1] = self.background
+        for op in ops:
+            ox0, oy0, ox1, oy1 = op.bbox
+            window = (max(tx0, ox0), max(ty0, oy0), min(tx1, ox1), min(ty1, oy1))
+            if window[0] < window[2] and window[1] < window[3]:
+                op.paint(fb, window)
+
+    def _rasterize(self, fb: np.ndarray) -> None:
+        ops = [op for layer in self.layers.values() for op in layer]
+        if self._pool is None:
+            for tile in self._tiles:
+                self._rasterize_tile(fb, tile, ops)
+        else:
+            list(self._pool.map(lambda tile: self._rasterize_tile(fb, tile, ops), self._tiles))
+
+    def render(self, into: np.ndarray | None = None) -> np.ndarray:
+        """Returns the framebuffer (height x width x RGBA)
+
+        The array is reused between frames, copy it if you want to
+        keep it around. Or pass your own (height x width x 4) uint8
+        array as `into` and the frame is drawn straight into that one
+        (shared memory, say) and returned.
+        """
+        if into is not None:
+            self._rasterize(into)
+            return into
+        if self._dirty:
+            self._rasterize(self._framebuffer)
+            self._dirty = False
+        return self._framebuffer
+
+    @property
+    def framebuffer(self) -> np.ndarray:
+        return self.render()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
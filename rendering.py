@@ -1,13 +1,18 @@
+import math
+import re
+import threading
+import time as clock
 import tkinter.font as tkfont
 import tkinter as tk
 from tkinter import Canvas, ALL
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, TypedDict
-import rx
-from rx import operators as ops
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple, TypedDict
 from shapes import Arc, BoxCoords, Line, Oval, Polygon, PrimitiveShape, Rectangle, Shape, Circle, Color, Text
 from animation import Animation
+from fonts import FontBackend, FontKey, FontRegistry, font_key
 from utility import clamp_int, gen_unique_number
+import profiling
 
 class Renderer(ABC):
     """Abstract Class
@@ -26,12 +31,150 @@ class Renderer(ABC):
     @abstractmethod
     def clear_everything(self) -> None:
         pass
+    def flush(self) -> None:
+        """Push everything drawn since the last flush to the screen.
+        Renderers that draw straight away don't need to do anything.
+        """
+        pass
 
 
 class ConvasSceneToken(TypedDict):
-    "A helper class for CanvasRenderer"
+    """A helper class for CanvasRenderer
+
+    coords and config remember what was last sent to the canvas for
+    this item, so unchanged fields don't get sent again.
+    """
     id: int
     dirty: bool
+    coords: List[int]
+    config: Dict[str, Any]
+
+
+_TCL_SAFE = re.compile(r'[A-Za-z0-9_#.:!+-]+')
+
+def tcl_word(value: Any) -> str:
+    "Quotes a value so Tcl reads it back as exactly one word"
+    if type(value) is int:
+        return str(value)
+    text = str(value)
+    if _TCL_SAFE.fullmatch(text):
+        return text
+    if not text:
+        return '{}'
+    return re.sub(r'([\\\s"$\[\]{};])', lambda m: '\\n' if m.group(1) == '\n' else '\\' + m.group(1), text)
+
+
+class TclBatch():
+    """Stands in for a Canvas and writes a Tcl script instead
+
+    Has the few canvas methods CanvasRenderer uses. Nothing reaches Tk
+    until run(), which evaluates the whole script in one call. Items
+    created in the batch don't have a real id yet, they get a negative
+    stand-in (kept in a Tcl array by the script) and track()ed tokens
+    get their real ids when the script has run.
+    """
+
+    def __init__(self, canvas: Canvas):
+        self.canvas = canvas
+        self.widget = str(canvas)
+        self.lines: List[str] = ['array unset ::hn_new']
+        self._created = 0
+        self._tokens: List[ConvasSceneToken] = []
+
+    def _id(self, id: int) -> str:
+        return f'$::hn_new({-id - 1})' if id < 0 else str(id)
+
+    @staticmethod
+    def _options(options: Dict[str, Any]) -> str:
+        return ''.join(f' -{k} {tcl_word(v)}' for k, v in options.items())
+
+    def _create(self, kind: str, coords: tuple, options: Dict[str, Any]) -> int:
+        index = self._created
+        self._created += 1
+        self.lines.append(
+            f'set ::hn_new({index}) [{self.widget} create {kind} '
+            f'{" ".join(tcl_word(c) for c in coords)}{self._options(options)}]'
+        )
+        return -index - 1
+
+    def create_text(self, *coords: Any, **options: Any) -> int:
+        return self._create('text', coords, options)
+    def create_oval(self, *coords: Any, **options: Any) -> int:
+        return self._create('oval', coords, options)
+    def create_line(self, *coords: Any, **options: Any) -> int:
+        return self._create('line', coords, options)
+    def create_polygon(self, *coords: Any, **options: Any) -> int:
+        return self._create('polygon', coords, options)
+    def create_rectangle(self, *coords: Any, **options: Any) -> int:
+        return self._create('rectangle', coords, options)
+    def create_arc(self, *coords: Any, **options: Any) -> int:
+        return self._create('arc', coords, options)
+
+    def coords(self, id: int, *coords: Any) -> None:
+        self.lines.append(f'{self.widget} coords {self._id(id)} {" ".join(tcl_word(c) for c in coords)}')
+
+    def itemconfigure(self, id: int, **options: Any) -> None:
+        self.lines.append(f'{self.widget} itemconfigure {self._id(id)}{self._options(options)}')
+
+    def delete(self, id: int) -> None:
+        self.lines.append(f'{self.widget} delete {self._id(id)}')
+
+    def track(self, token: ConvasSceneToken) -> None:
+        "token['id'] is a stand-in, fix it up after run()"
+        self._tokens.append(token)
+
+    def run(self) -> None:
+        if len(self.lines) == 1:
+            return
+        self.lines.append('list ' + ' '.join(f'$::hn_new({i})' for i in range(self._created)))
+        ids = self.canvas.tk.splitlist(self.canvas.tk.eval('\n'.join(self.lines)))
+        for token in self._tokens:
+            token['id'] = int(ids[-token['id'] - 1])
+
+    def discard(self) -> None:
+        "After a failed run(), deletes whatever the script created before it stopped"
+        self.canvas.tk.eval(
+            f'catch {{foreach {{k id}} [array get ::hn_new] {{{self.widget} delete $id}}}}'
+        )
+
+
+class TkFonts(FontBackend):
+    "Real Tk fonts, measured by Tk. Needs a display"
+
+    def __init__(self, root: tk.Misc | None = None):
+        self.root = root
+
+    def create(self, key: FontKey) -> tkfont.Font:
+        family, size, bold, slant, underline, overstrike = key
+        font_config: Any = dict()
+        if family != "default":
+            font_config['family'] = family
+        if size > 0:
+            font_config['size'] = size
+        font_config['weight'] = "bold" if bold else "normal"
+        font_config['slant'] = "italic" if slant else "roman"
+        font_config['underline'] = 1 if underline else 0
+        font_config['overstrike'] = 1 if overstrike else 0
+        return tkfont.Font(root=self.root, **font_config)
+
+    def width(self, font: tkfont.Font, line: str) -> int:
+        return font.measure(line)
+
+    def line_height(self, font: tkfont.Font) -> float:
+        return font.metrics('linespace')
+
+
+def tk_fonts(widget: tk.Misc) -> FontRegistry:
+    """The FontRegistry every CanvasRenderer on this widget's Tk shares
+
+    Fonts belong to the interpreter, so the registry is kept on its
+    root window and goes away with it.
+    """
+    root = widget._root()
+    registry = getattr(root, '_hanabi_fonts', None)
+    if registry is None:
+        registry = root._hanabi_fonts = FontRegistry(TkFonts(root)) # type: ignore
+    return registry
 
 
 class CanvasRenderer(Renderer):
@@ -43,11 +186,36 @@ class CanvasRenderer(Renderer):
     @staticmethod
     def color_str(c: Color):
         "Outputs a string in the format that tk canvas expects"
-        return '' if not c.visible else f'#{c.red:02X}{c.green:02X}{c.blue:02X}'
+        return c.hex_str()
 
-    def __init__(self, canvas: Canvas) -> None:
+    def __init__(self,
+        canvas: Canvas,
+        auto_flush: bool = True,
+        batched: bool = False,
+        fonts: FontRegistry | None = None
+    ) -> None:
+        """With auto_flush off, updating a layer doesn't repaint the
+        canvas, call flush() once you've updated every layer.
+
+        With batched on, everything a layer update says to the canvas
+        is written into one Tcl script (see TclBatch) and sent in a
+        single call, instead of one Python to Tcl call per command.
+
+        Fonts come from `fonts`, by default the registry shared by
+        everything on the canvas' Tk (see tk_fonts). Use it to
+        measure text the way this canvas will draw it.
+        """
         self.canvas = canvas
+        self.auto_flush = auto_flush
+        self.batched = batched
+        # Where canvas commands go, the canvas or a TclBatch
+        self.commands: Any = canvas
         self.layers: Dict[str, Dict[int, ConvasSceneToken]] = dict()
+        self.fonts = tk_fonts(canvas) if fonts is None else fonts
+
+    def font_for(self, shape: Text) -> tkfont.Font:
+        "Fonts are shared and cached by their configuration, creating them is costly"
+        return self.fonts.font(font_key(shape))
 
     def create_default_shape(self, shape: Shape) -> int:
         """ Canvas tracks items by ID but also by what type of thing
@@ -56,17 +224,17 @@ class CanvasRenderer(Renderer):
         we can safely update afterward.
         """
         if isinstance(shape, Text):
-            return self.canvas.create_text(0,0)
+            return self.commands.create_text(0,0)
         if isinstance(shape, Circle) or isinstance(shape, Oval):
-            return self.canvas.create_oval(0,0,0,0)
+            return self.commands.create_oval(0,0,0,0)
         if isinstance(shape, Line):
-            return self.canvas.create_line(0,0,0,0)
+            return self.commands.create_line(0,0,0,0)
         if isinstance(shape, Polygon):
-            return self.canvas.create_polygon(0,0,0,0,0,0)
+            return self.commands.create_polygon(0,0,0,0,0,0)
         if isinstance(shape, Rectangle):
-            return self.canvas.create_rectangle(0,0,0,0)
+            return self.commands.create_rectangle(0,0,0,0)
         if isinstance(shape, Arc):
-            return self.canvas.create_arc(0,0,0,0)
+            return self.commands.create_arc(0,0,0,0)
 
         raise NotImplementedError
 
@@ -88,17 +256,7 @@ class CanvasRenderer(Renderer):
             update_item_coords = [shape.position.x, shape.position.y]
             update_item_config['fill'] = CanvasRenderer.color_str(shape.color)
             update_item_config['text'] = shape.text
-            update_item_config['font'] = dict()
-            font_config: Any = dict()
-            if shape.font_family != "default":
-                font_config['family'] = shape.font_family
-            if shape.font_size > 0:
-                font_config['size'] = shape.font_size
-            font_config['weight'] = "bold" if shape.font_bold else "normal"
-            font_config['slant'] = "italic" if shape.font_slant else "roman"
-            font_config['underline'] = 1 if shape.font_underline else 0
-            font_config['overstrike'] = 1 if shape.font_underline else 0
-            update_item_config['font'] = tkfont.Font(**font_config)
+            update_item_config['font'] = self.font_for(shape)
 
         if isinstance(shape, Line):
             v_tex_s = map(lambda p: [p.x, p.y], shape.vertices)
@@ -141,8 +299,19 @@ class CanvasRenderer(Renderer):
             v_tex_s = map(lambda p: [p.x, p.y], shape.vertices)
             update_item_coords = [j for sub in v_tex_s for j in sub]
 
-        self.canvas.coords(canvas_item['id'], *update_item_coords)
-        self.canvas.itemconfigure(canvas_item['id'], **update_item_config)
+        # Only talk to Tcl about what actually changed since last frame
+        if update_item_coords != canvas_item['coords']:
+            self.commands.coords(canvas_item['id'], *update_item_coords)
+            canvas_item['coords'] = update_item_coords
+
+        last_config = canvas_item['config']
+        changed = {
+            k: v for k, v in update_item_config.items()
+            if k not in last_config or last_config[k] != v
+        }
+        if changed:
+            self.commands.itemconfigure(canvas_item['id'], **changed)
+            last_config.update(changed)
 
 
     def update_animation_layer(self, layer: str, shapes: List[Shape]) -> None:
@@ -165,70 +334,349 @@ class CanvasRenderer(Renderer):
         
         item_dict = self.layers[layer]
 
+        if self.batched:
+            self.commands = batch = TclBatch(self.canvas)
+
+        profiler = profiling.current
+        try:
+            if profiler is None:
+                self._create_items(layer, item_dict, shapes)
+                self._update_items(item_dict, shapes)
+                self._delete_items(item_dict)
+                if self.batched:
+                    self._run_batch(layer, batch)
+                if self.auto_flush:
+                    self.canvas.update()
+            else:
+                # Batched, the phases just write Tcl, running it counts
+                # as canvas time
+                profiler.measure(layer, 'create', self._create_items, layer, item_dict, shapes)
+                profiler.measure(layer, 'update', self._update_items, item_dict, shapes)
+                profiler.measure(layer, 'delete', self._delete_items, item_dict)
+                if self.batched:
+                    profiler.measure_canvas_update(lambda: self._run_batch(layer, batch))
+                if self.auto_flush:
+                    profiler.measure_canvas_update(self.canvas.update)
+        finally:
+            self.commands = self.canvas
+
+    def _run_batch(self, layer: str, batch: TclBatch) -> None:
+        try:
+            batch.run()
+        except Exception:
+            # The script stopped part way and nothing says how far it
+            # got. The layer's tokens can't be trusted (some still have
+            # stand-in ids), so it starts over on the next frame.
+            batch.discard()
+            self.canvas.delete(layer)
+            self.layers.pop(layer, None)
+            raise
+
+    # The steps of update_animation_layer. Each returns how many items
+    # it touched (for the profiler)
+
+    def _create_items(self, layer: str, item_dict: Dict[int, ConvasSceneToken], shapes: List[Shape]) -> int:
+        created = 0
         for shape in shapes:
             if not shape.id in item_dict:
 
                 new_id = self.create_default_shape(shape)
-                self.canvas.itemconfigure(new_id, tags=layer)
-                item_dict[shape.id] = {
+                self.commands.itemconfigure(new_id, tags=layer)
+                token: ConvasSceneToken = {
                     'id': new_id,
-                    'dirty': False
+                    'dirty': False,
+                    'coords': [],
+                    'config': dict()
                 }
+                item_dict[shape.id] = token
+                if self.commands is not self.canvas:
+                    self.commands.track(token)
+                created += 1
+        return created
 
+    def _update_items(self, item_dict: Dict[int, ConvasSceneToken], shapes: List[Shape]) -> int:
         for shape in shapes:
             # assert shape.id in item_dict
             item_dict[shape.id]['dirty'] = True
             self.update_shape(item_dict, shape)
-        
+        return len(shapes)
+
+    def _delete_items(self, item_dict: Dict[int, ConvasSceneToken]) -> int:
+        deleted = 0
         for (id, token) in list(item_dict.items()):
             if token['dirty'] == False:
                 del item_dict[id]
-                self.canvas.delete(token['id'])
+                self.commands.delete(token['id'])
+                deleted += 1
             else:
                 item_dict[id]['dirty'] = False
-        
-        self.canvas.update()
+        return deleted
 
 
     def clear_animation_layer(self, layer: str) -> None:
+        self.layers.pop(layer, None)
         self.canvas.delete(layer)
 
 
     def clear_everything(self) -> None:
+        self.layers.clear()
         self.canvas.delete(ALL)
 
 
+    def flush(self) -> None:
+        profiler = profiling.current
+        if profiler is None:
+            self.canvas.update_idletasks()
+        else:
+            profiler.measure_canvas_update(self.canvas.update_idletasks)
+
+
+# Something that calls a function after some milliseconds. Tk's
+# `widget.after` is the one you want for anything that touches Tk.
+AfterHook = Callable[[int, Callable[[], None]], Any]
+
+
+def thread_after(ms: int, fn: Callable[[], None]) -> None:
+    "An AfterHook for renderers that don't need to live on a main loop"
+    timer = threading.Timer(ms * 0.001, fn)
+    timer.daemon = True
+    timer.start()
+
+
+def layer_name(animation: Animation) -> str:
+    "A unique layer name for one playback of an animation"
+    return f"""{animation.name}_{gen_unique_number()}
+        """.translate({ord(c):None for c in ' \n\t\r'})
+
+
+def evaluate(animation: Animation, time: int, layer: str) -> List[Shape]:
+    "animation.get_state(time), timed against its layer if profiling"
+    profiler = profiling.current
+    if profiler is None:
+        return animation.get_state(time)
+    start = clock.perf_counter()
+    shapes = animation.get_state(time)
+    profiler.record_evaluate(layer, clock.perf_counter() - start, len(shapes))
+    return shapes
+
+
+def end_frame(time: int) -> None:
+    "Tells the profiler (if there is one) a frame is done"
+    if profiling.current is not None:
+        profiling.current.end_frame(time)
+
+
+def innermost(renderer: Renderer) -> Renderer:
+    "The renderer that actually draws, under any that wrap it"
+    # Renderers that wrap another one keep it in `inner`
+    while hasattr(renderer, 'inner'):
+        renderer = renderer.inner
+    return renderer
+
+
+def default_after(renderer: Renderer) -> AfterHook:
+    renderer = innermost(renderer)
+    return renderer.canvas.after if isinstance(renderer, CanvasRenderer) else thread_after
+
+
+@dataclass
+class FrameStats():
+    target_fps: float
+    frames: int = 0
+    skipped: int = 0
+    elapsed: float = 0 # seconds
+
+    @property
+    def achieved_fps(self) -> float:
+        return self.frames / self.elapsed if self.elapsed > 0 else 0
+
+
+class FrameScheduler():
+    """Calls on_frame(time) at a target frame rate until duration runs out
+
+    Runs on whatever main loop `after` belongs to (for Tk that means
+    everything happens on Tk's thread, the way Tk wants it). The time
+    passed to on_frame comes from the monotonic clock, so a slow frame
+    doesn't make the animation run slow. If we fall behind, the frames
+    we missed are skipped rather than queued up.
+    """
+
+    def __init__(self,
+        after: AfterHook,
+        target_fps: float = 20,
+        now: Callable[[], float] = clock.monotonic
+    ):
+        self._after = after
+        self._now = now
+        self.target_fps = target_fps
+        self._period = 1 / target_fps # seconds
+        self.stats = FrameStats(target_fps)
+        self._running = False
+        self._generation = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self,
+        duration: int,
+        on_frame: Callable[[int], None],
+        on_done: Callable[[], None] = lambda: None
+    ) -> None:
+        self._duration = duration
+        self._on_frame = on_frame
+        self._on_done = on_done
+        self._start = self._now()
+        self._last_index = -1
+        self.stats = FrameStats(self.target_fps)
+        self._running = True
+        # A tick from an earlier run may still be pending, this lets
+        # it know it's stale
+        self._generation += 1
+        self._tick(self._generation)
+
+    def clock(self) -> int:
+        "Milliseconds since start"
+        return round((self._now() - self._start) * 1000)
+
+    def stop(self) -> None:
+        "Stops before the next frame, on_done is still called"
+        self._running = False
+
+    def _tick(self, generation: int) -> None:
+        if generation != self._generation:
+            return
+        elapsed = self._now() - self._start
+        time = round(elapsed * 1000)
+        if not self._running or time > self._duration:
+            self._running = False
+            self.stats.elapsed = elapsed
+            self._on_done()
+            return
+
+        index = int(elapsed / self._period)
+        self.stats.skipped += max(0, index - self._last_index - 1)
+        self._last_index = index
+
+        self._on_frame(time)
+        self.stats.frames += 1
+
+        finished = self._now() - self._start
+        self.stats.elapsed = finished
+        next_due = (int(finished / self._period) + 1) * self._period
+        self._after(
+            max(0, round((next_due - finished) * 1000)),
+            lambda: self._tick(generation)
+        )
+
+
+class Compositor():
+    """One frame clock for every running animation
+
+    Rather than every animation running on its own timer (and
+    repainting the canvas on its own schedule), the compositor ticks
+    once per frame, updates the layer of every running animation and
+    then flushes the renderer once. The clock stops when nothing is
+    running and starts again when something is added.
+
+    Give it a CanvasRenderer with auto_flush off, otherwise every layer
+    update still repaints the canvas.
+    """
+
+    def __init__(self,
+        renderer: Renderer,
+        target_fps: float = 20,
+        after: AfterHook | None = None,
+        now: Callable[[], float] = clock.monotonic
+    ):
+        self.renderer = renderer
+        self._now = now
+        self.scheduler = FrameScheduler(
+            default_after(renderer) if after is None else after,
+            target_fps,
+            now
+        )
+        # layer -> (animation, when it started in scheduler time (ms))
+        self._running: Dict[str, Tuple[Animation, int]] = dict()
+
+    def add(self, animation: Animation) -> str:
+        "Starts playing an animation, returns the layer it's drawn on"
+        layer = layer_name(animation)
+
+        if self.scheduler.running:
+            self._running[layer] = (animation, self.scheduler.clock())
+        else:
+            self._running[layer] = (animation, 0)
+            self.scheduler.start(math.inf, self._frame, self._idle)
+        return layer
+
+    def remove(self, layer: str) -> None:
+        if self._running.pop(layer, None) is not None:
+            self.renderer.clear_animation_layer(layer)
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    def _frame(self, time: int) -> None:
+        for layer, (animation, start) in list(self._running.items()):
+            local = time - start
+            if local > animation.duration:
+                self.remove(layer)
+            else:
+                self.renderer.update_animation_layer(layer, evaluate(animation, local, layer))
+        self.renderer.flush()
+        end_frame(time)
+
+        if not self._running:
+            self.scheduler.stop()
+
+    def _idle(self) -> None:
+        self.renderer.flush()
+
+
 class RenderThunk():
     """Run an animation
     
     This class has a single function `render` returns a thunk that runs 
     the given animation in the given rederer.
+
+    Frames are driven by a FrameScheduler. For a CanvasRenderer it runs
+    on the canvas' own main loop (canvas.after), other renderers get a
+    timer thread unless you pass your own `after` hook.
     """
 
     def __init__(self,
         renderer: Renderer, 
         animation: Animation,
-        refresh_rate: int = 50 # milliseconds
+        refresh_rate: int = 50, # milliseconds
+        after: AfterHook | None = None
     ):
         self.renderer = renderer
         self.animation = animation
         self.refresh_rate = refresh_rate # milliseconds
-        self._refresh_rate_s = refresh_rate * 0.001 # seconds
-        self._duration_s = animation.duration * 0.001 # seconds
+        if after is None:
+            after = default_after(renderer)
+        self._after = after
+        self.scheduler: FrameScheduler | None = None
+
+
+    @property
+    def stats(self) -> FrameStats | None:
+        "Achieved vs target frame rate for the most recent run"
+        return None if self.scheduler is None else self.scheduler.stats
 
 
     def render(self) -> None:
         
-        layer_name = f"""{self.animation.name}_{gen_unique_number()}
-            """.translate({ord(c):None for c in ' \n\t\r'})
-
-        rx.interval(self._refresh_rate_s).pipe(
-            ops.take(round(self._duration_s/self._refresh_rate_s + 0.5)),
-            ops.map(lambda v: v * self.refresh_rate),
-            ops.map(lambda time: self.animation.get_state(time)),
-            ops.do_action(on_completed=lambda: 
-                self.renderer.clear_animation_layer(layer_name)
-            )
-        ).subscribe(lambda shapes: 
-            self.renderer.update_animation_layer(layer_name, shapes)
+        layer = layer_name(self.animation)
+
+        def on_frame(time: int) -> None:
+            self.renderer.update_animation_layer(layer, evaluate(self.animation, time, layer))
+            end_frame(time)
+
+        self.scheduler = FrameScheduler(self._after, 1000 / self.refresh_rate)
+        self.scheduler.start(
+            self.animation.duration,
+            on_frame=on_frame,
+            on_done=lambda: self.renderer.clear_animation_layer(layer)
         )
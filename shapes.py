@@ -1,19 +1,75 @@
+import copy
 import random as rand
 from abc import ABC, abstractmethod
-from typing import List
-from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List
+from dataclasses import dataclass, field, fields
 
+import fonts
 from utility import clamp_int, gen_unique_number
 
+# packed -> '#RRGGBB'. Gradients seed their whole table up front (see
+# gradient.py), those are never evicted. Everything else is formatted
+# on first use, when that fills up the cache it goes back to just the
+# seeded ones.
+_seeded_hex_strings: Dict[int, str] = dict()
+_hex_strings: Dict[int, str] = dict()
+_HEX_CACHE_SIZE = 1 << 16
+
+def _hex_str(packed: int) -> str:
+    s = _hex_strings.get(packed)
+    if s is None:
+        if len(_hex_strings) >= _HEX_CACHE_SIZE + len(_seeded_hex_strings):
+            _hex_strings.clear()
+            _hex_strings.update(_seeded_hex_strings)
+        s = _hex_strings[packed] = '' if packed < 0 else f'#{packed:06X}'
+    return s
+
+def seed_hex_strings(packed: Iterable[int], strings: Iterable[str]) -> None:
+    "Puts already formatted strings in the cache hex_str() reads, for good"
+    seeded = dict(zip(packed, strings))
+    _seeded_hex_strings.update(seeded)
+    _hex_strings.update(seeded)
+
+
 class Color():
     "Describes and RGB color. Set invisible if any inputs are negative"
 
+    __slots__ = ('visible', 'red', 'green', 'blue')
+
     def __init__(self, red:int, green:int, blue:int):
         self.visible = not (red < 0 or green < 0 or blue < 0)
         self.red = clamp_int(red,0,255) 
         self.green = clamp_int(green,0,255)
         self.blue = clamp_int(blue,0,255)
 
+    def __repr__(self) -> str:
+        return f'Color({self.red}, {self.green}, {self.blue})' if self.visible else 'Color(-1, -1, -1)'
+
+    def copy(self) -> 'Color':
+        c = Color.__new__(Color)
+        c.visible = self.visible
+        c.red = self.red
+        c.green = self.green
+        c.blue = self.blue
+        return c
+
+    @property
+    def packed(self) -> int:
+        "0xRRGGBB as a single int, or -1 if the color is invisible"
+        return (self.red << 16 | self.green << 8 | self.blue) if self.visible else -1
+
+    @staticmethod
+    def from_packed(packed: int) -> 'Color':
+        if packed < 0:
+            return Color(-1, -1, -1)
+        return Color((packed >> 16) & 0xFF, (packed >> 8) & 0xFF, packed & 0xFF)
+
+    def hex_str(self) -> str:
+        """'#RRGGBB' (or '' if invisible). Formatted strings are cached
+        by packed value, so renderers don't rebuild them every frame.
+        """
+        return _hex_str(self.packed)
+
     @staticmethod
     def random():
         return Color(
@@ -46,16 +102,102 @@ class ColorNames():
     TEAL = lambda: Color(0,128,128)
     NAVY = lambda: Color(0,0,128)
 
-@dataclass
+@dataclass(slots=True)
 class Point():
     x: int
     y: int
 
-@dataclass
+    def copy(self) -> 'Point':
+        return Point(self.x, self.y)
+
+def clone_value(value: Any) -> Any:
+    """A cheap deep copy for the things shapes are made of
+
+    Points, Colors, Shapes and lists of them know how to copy
+    themselves, anything else falls back to copy.deepcopy.
+    """
+    if isinstance(value, (Point, Color, Shape)):
+        return value.copy()
+    if isinstance(value, list):
+        return [clone_value(v) for v in value]
+    if isinstance(value, (int, float, str, bool)):
+        return value
+    return copy.deepcopy(value)
+
+@dataclass(slots=True)
+class BoundingBox():
+    "An axis aligned box, in canvas coordinates (y grows downward)"
+    left: float
+    top: float
+    right: float
+    bottom: float
+
+    def intersects(self, other: 'BoundingBox') -> bool:
+        return (
+            self.left <= other.right and other.left <= self.right and
+            self.top <= other.bottom and other.top <= self.bottom
+        )
+
+    def intersection(self, other: 'BoundingBox') -> 'BoundingBox':
+        "May come back empty (right < left), check with intersects first"
+        return BoundingBox(
+            max(self.left, other.left), max(self.top, other.top),
+            min(self.right, other.right), min(self.bottom, other.bottom)
+        )
+
+    def grow(self, by: float) -> 'BoundingBox':
+        return BoundingBox(self.left - by, self.top - by, self.right + by, self.bottom + by)
+
+    @staticmethod
+    def around(points: List[Point]) -> 'BoundingBox':
+        "The smallest box holding every point. No points, no box (it's empty)"
+        if not points:
+            return BoundingBox(0, 0, -1, -1)
+        xs = [p.x for p in points]
+        ys = [p.y for p in points]
+        return BoundingBox(min(xs), min(ys), max(xs), max(ys))
+
+def approximate_text_size(text: str, font_size: int) -> Point:
+    "A rough (width, height) in pixels, for when there's no real font"
+    return Point(*fonts.approximate.size(('default', font_size, False, False, False, False), text))
+
+def copy_into(target: Any, source: Any) -> bool:
+    """Overwrites target with source's values, in place. Returns False
+    if that's not possible (ints, strings, lists of another length...)
+    """
+    if isinstance(target, Point) and isinstance(source, Point):
+        target.x = source.x
+        target.y = source.y
+        return True
+    if isinstance(target, Color) and isinstance(source, Color):
+        target.visible = source.visible
+        target.red = source.red
+        target.green = source.green
+        target.blue = source.blue
+        return True
+    if isinstance(target, list) and isinstance(source, list) and len(target) == len(source):
+        for i, (t, s) in enumerate(zip(target, source)):
+            if not copy_into(t, s):
+                target[i] = clone_value(s)
+        return True
+    return False
+
+@dataclass(slots=True)
 class Shape(ABC):
     id:int = field(default_factory=gen_unique_number)
 
-@dataclass
+    def copy(self) -> 'Shape':
+        "A deep copy that keeps the same id"
+        c = object.__new__(type(self))
+        for f in fields(self):
+            object.__setattr__(c, f.name, clone_value(getattr(self, f.name)))
+        return c
+
+    def bounds(self) -> BoundingBox:
+        "The area this shape could draw on (borders included)"
+        raise NotImplementedError
+
+@dataclass(slots=True)
 class Text(Shape):
     position: Point = field(default_factory=lambda:Point(0,0))
     color: Color = field(default_factory=ColorNames.BLACK)
@@ -67,7 +209,15 @@ class Text(Shape):
     font_underline: bool = False
     font_overstrike: bool = False
 
-@dataclass
+    def bounds(self) -> BoundingBox:
+        "Text is centered on its position. This is an estimate"
+        width, height = fonts.approximate.size(fonts.font_key(self), self.text)
+        return BoundingBox(
+            self.position.x - width / 2, self.position.y - height / 2,
+            self.position.x + width / 2, self.position.y + height / 2
+        )
+
+@dataclass(slots=True)
 class Line(Shape):
     """A line can consist of any number of segments connected end 
     end. Specified by a series of vertices (Point(x, y))
@@ -76,18 +226,28 @@ class Line(Shape):
     color: Color = field(default_factory=ColorNames.BLACK)
     width: int = 3 # Pixels
 
-@dataclass
+    def bounds(self) -> BoundingBox:
+        return BoundingBox.around(self.vertices).grow(self.width / 2)
+
+@dataclass(slots=True)
 class PrimitiveShape(Shape, ABC):
     fill_color: Color = field(default_factory=ColorNames.BLACK)
     border_color: Color = field(default_factory=ColorNames.BLACK)
     border_width: int = 1 # Pixels
 
-@dataclass
+@dataclass(slots=True)
 class Circle(PrimitiveShape):
     radius: int = 5
     position: Point = field(default_factory=lambda:Point(0,0))
 
-@dataclass
+    def bounds(self) -> BoundingBox:
+        r = abs(self.radius) + self.border_width / 2
+        return BoundingBox(
+            self.position.x - r, self.position.y - r,
+            self.position.x + r, self.position.y + r
+        )
+
+@dataclass(slots=True)
 class Polygon(PrimitiveShape):
     """Describes a polygon
     
@@ -97,20 +257,38 @@ class Polygon(PrimitiveShape):
     """
     vertices: List[Point] = field(default_factory=lambda:[])
 
+    def bounds(self) -> BoundingBox:
+        return BoundingBox.around(self.vertices).grow(self.border_width / 2)
+
 @dataclass
 class BoxCoords(ABC):
+    """Mixed into shapes alongside PrimitiveShape. It declares no slots
+    of its own (two slotted bases can't be combined), the shapes that
+    use it get slots for these fields instead.
+    """
+    __slots__ = ()
+
     upper_left: Point = field(default_factory=lambda:Point(0,0))
     lower_right: Point = field(default_factory=lambda:Point(0,0))
 
-@dataclass
+    def box_bounds(self, border_width: float) -> BoundingBox:
+        return BoundingBox.around([self.upper_left, self.lower_right]).grow(border_width / 2)
+
+@dataclass(slots=True)
 class Rectangle(PrimitiveShape, BoxCoords):
     "A rectangle is defined by box coordinates"
 
-@dataclass
+    def bounds(self) -> BoundingBox:
+        return self.box_bounds(self.border_width)
+
+@dataclass(slots=True)
 class Oval(PrimitiveShape, BoxCoords):
     "The ellipse is fit into a rectangle defined by box coordinates"
 
-@dataclass
+    def bounds(self) -> BoundingBox:
+        return self.box_bounds(self.border_width)
+
+@dataclass(slots=True)
 class Arc(PrimitiveShape, BoxCoords):
     "a wedge-shaped slice taken out of an ellipse"
 
@@ -122,6 +300,10 @@ class Arc(PrimitiveShape, BoxCoords):
     extent: int = 360 # Degrees
     style: int = STYLE_PIESLICE
 
+    def bounds(self) -> BoundingBox:
+        "The whole ellipse, a slice of it never reaches further"
+        return self.box_bounds(self.border_width)
+
 class Picture(ABC):
     """A picture generates a list of shapes"""
     @abstractmethod
@@ -137,6 +319,9 @@ class PurePicture(Picture):
         self._internal_proxy_shape = shape
 
     def __getattr__(self, name):
+        if name == "_internal_proxy_shape":
+            # Not set yet (happens while unpickling), don't recurse
+            raise AttributeError(name)
         return getattr(self._internal_proxy_shape, name)
     
     def __setattr__(self, name, value):
@@ -0,0 +1,179 @@
+from abc import abstractmethod
+from bisect import bisect_right
+from typing import Dict, List
+import numpy as np
+from animation import Animation
+from particles import ParticleBatch
+from shapes import BoundingBox, Circle, Color, Point, Shape
+
+# A simulation's state: named arrays, one row per body
+State = Dict[str, np.ndarray]
+
+
+class Simulation(Animation):
+    """Base class for animations that are integrated rather than solved
+
+    Subclasses give the starting state, how to advance it by one
+    fixed timestep, and how to draw it:
+
+        initial_state() -> State
+        step(state, dt)          # dt in seconds, update the arrays in place
+        draw(state, time) -> List[Shape]
+
+    State is a dict of NumPy arrays, so one step moves every body at
+    once. The timestep (milliseconds) has nothing to do with how often
+    frames are drawn, get_state(t) shows the state after the last whole
+    step before t.
+
+    Every `checkpoint_interval` milliseconds of simulated time a copy
+    of the state is kept. Asking for a time earlier than the current
+    one restarts from the closest checkpoint before it, so once a
+    stretch has been played, any frame in it costs at most one interval
+    of steps. step must only depend on the state it's given (keep
+    randomness to initial_state, or seed it from the state) or seeking
+    will give different answers than playing.
+    """
+
+    def __init__(self,
+        duration: int,
+        timestep: float = 10, # milliseconds
+        checkpoint_interval: int = 1000, # milliseconds
+        *args, **kwargs
+    ):
+        super().__init__(duration, *args, **kwargs)
+        self.timestep = timestep
+        self._every = max(1, round(checkpoint_interval / timestep)) # steps
+        self._state: State | None = None
+        self._step = 0
+        self._checkpoints: Dict[int, State] = dict()
+        self._checkpoint_steps: List[int] = []
+
+    @property
+    def seekable(self) -> bool:
+        return True
+
+    @abstractmethod
+    def initial_state(self) -> State:
+        raise NotImplementedError
+
+    @abstractmethod
+    def step(self, state: State, dt: float) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def draw(self, state: State, time: int) -> List[Shape]:
+        raise NotImplementedError
+
+    def _checkpoint(self) -> None:
+        if self._step not in self._checkpoints:
+            self._checkpoints[self._step] = {k: v.copy() for k, v in self._state.items()}
+            self._checkpoint_steps.insert(bisect_right(self._checkpoint_steps, self._step), self._step)
+
+    def _restore(self, step: int) -> None:
+        self._state = {k: v.copy() for k, v in self._checkpoints[step].items()}
+        self._step = step
+
+    def reset(self) -> None:
+        "Forget every checkpoint (say, after changing the initial state)"
+        self._state = None
+        self._checkpoints.clear()
+        self._checkpoint_steps.clear()
+
+    def state_at(self, time: float) -> State:
+        """The state after the last whole step at or before time. Don't
+        hold on to it, it's the simulation's working copy.
+        """
+        if self._state is None:
+            self._state = self.initial_state()
+            self._step = 0
+            self._checkpoint()
+
+        target = max(0, int(time // self.timestep))
+        closest = self._checkpoint_steps[bisect_right(self._checkpoint_steps, target) - 1]
+        if target < self._step or closest > self._step:
+            self._restore(closest)
+
+        dt = self.timestep / 1000
+        while self._step < target:
+            self.step(self._state, dt)
+            self._step += 1
+            if self._step % self._every == 0:
+                self._checkpoint()
+        return self._state
+
+    def precompute(self) -> None:
+        "Runs the whole thing once so every checkpoint exists up front"
+        self.state_at(self.duration)
+
+    def get_state(self, time:int) -> List[Shape]:
+        if(time > 0 and time < self.duration):
+            return self.draw(self.state_at(time), time)
+        return []
+
+
+class BouncingBalls(Simulation):
+    """Balls falling under gravity and bouncing off the walls of a box
+
+    Velocities are in pixels per second, gravity in pixels per second
+    squared. Each bounce keeps `restitution` of the speed. Drag is the
+    fraction of velocity lost per second. Like ParticleSystem, draws
+    one Circle per ball, or one ParticleBatch with batched=True.
+    """
+
+    def __init__(self,
+        positions: np.ndarray,
+        velocities: np.ndarray,
+        radii: np.ndarray,
+        colors: np.ndarray,
+        walls: BoundingBox = BoundingBox(0, 0, 800, 450),
+        gravity: Point = Point(0, 600),
+        drag: float = 0.1,
+        restitution: float = 0.8,
+        batched: bool = False,
+        *args, **kwargs
+    ):
+        self._initial = {
+            'position': np.asarray(positions, dtype=np.float64).reshape(-1, 2),
+            'velocity': np.asarray(velocities, dtype=np.float64).reshape(-1, 2),
+        }
+        self.radii = np.asarray(radii, dtype=np.float64)
+        self.colors = np.asarray(colors, dtype=np.uint8).reshape(-1, 3)
+        self.walls = walls
+        self.gravity = np.array([gravity.x, gravity.y], dtype=np.float64)
+        self.drag = drag
+        self.restitution = restitution
+        self.batched = batched
+        self._circles = [
+            Circle(radius=round(r), fill_color=Color(*c), border_color=Color(*c))
+            for r, c in zip(self.radii.tolist(), self.colors.tolist())
+        ]
+        self._batch = ParticleBatch(radius=self.radii, colors=self.colors)
+        super().__init__(*args, **kwargs)
+
+    def initial_state(self) -> State:
+        return {k: v.copy() for k, v in self._initial.items()}
+
+    def step(self, state: State, dt: float) -> None:
+        p, v = state['position'], state['velocity']
+        v += self.gravity * dt
+        v *= max(0.0, 1 - self.drag * dt)
+        p += v * dt
+
+        r = self.radii
+        for axis, low, high in ((0, self.walls.left, self.walls.right), (1, self.walls.top, self.walls.bottom)):
+            under = p[:, axis] - r < low
+            over = p[:, axis] + r > high
+            p[under, axis] = 2 * (low + r[under]) - p[under, axis]
+            p[over, axis] = 2 * (high - r[over]) - p[over, axis]
+            v[under | over, axis] *= -self.restitution
+
+    def draw(self, state: State, time: int) -> List[Shape]:
+        p = state['position']
+        if self.batched:
+            self._batch.x = p[:, 0].copy()
+            self._batch.y = p[:, 1].copy()
+            return [self._batch]
+        for circle, (x, y) in zip(self._circles, np.round(p).astype(np.int64).tolist()):
+            circle.position.x = x
+            circle.position.y = y
+        return list(self._circles)
@@ -0,0 +1,347 @@
+import os
+import socket
+import struct
+import time as clock
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+from animation import Animation
+from delta import KINDS, DeltaEncoder, Op
+from rendering import Renderer
+from shapes import Shape
+
+# The wire format. A stream is a series of messages:
+#
+#   u32 length, u8 type, ops...     (length counts the type byte and ops)
+#
+# A KEYFRAME means "forget everything, here's what's on screen now",
+# a DELTA holds the changes since the message before it. Each op is a
+# one letter code followed by its arguments (see delta.py for what the
+# ops mean):
+#
+#   'L' u16 layer, str name
+#   'c' u16 layer, u64 id, u8 kind, fields
+#   'u' u16 layer, u64 id, fields
+#   'd' u16 layer, u64 id
+#   'D' u16 layer
+#
+# fields is u8 count then (u8 field, value) pairs. Values are tagged:
+# 'T'/'F' bools, 'i' i32, 'q' i64, 'f' f64, 's' u32 length + UTF-8,
+# 'I' u32 count + i32s and 'V' u32 count + f64s (flattened points).
+# Everything is little endian.
+KEYFRAME = 1
+DELTA = 2
+
+_KIND_NAMES = list(KINDS)
+_KIND_INDEX = {k: i for i, k in enumerate(_KIND_NAMES)}
+_FIELD_NAMES = sorted({
+    name for kind in KINDS.values() for name in kind.__dataclass_fields__ if name != 'id'
+})
+_FIELD_INDEX = {f: i for i, f in enumerate(_FIELD_NAMES)}
+
+_HEADER = struct.Struct('<IB')
+_ITEM = struct.Struct('<HQ')
+_LAYER = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_I32 = struct.Struct('<i')
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+
+
+def _encode_value(out: bytearray, value: Any) -> None:
+    if value is True or value is False:
+        out += b'T' if value else b'F'
+    elif isinstance(value, int):
+        if -2**31 <= value < 2**31:
+            out += b'i' + _I32.pack(value)
+        else:
+            out += b'q' + _I64.pack(value)
+    elif isinstance(value, float):
+        out += b'f' + _F64.pack(value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        out += b's' + _U32.pack(len(data)) + data
+    elif isinstance(value, list):
+        if all(isinstance(v, int) and -2**31 <= v < 2**31 for v in value):
+            out += b'I' + _U32.pack(len(value)) + struct.pack(f'<{len(value)}i', *value)
+        else:
+            out += b'V' + _U32.pack(len(value)) + struct.pack(f'<{len(value)}d', *value)
+    else:
+        raise TypeError(f"can't stream a {type(value).__name__}")
+
+
+def _encode_fields(out: bytearray, fields: Dict[str, Any]) -> None:
+    out.append(len(fields))
+    for name, value in fields.items():
+        out.append(_FIELD_INDEX[name])
+        _encode_value(out, value)
+
+
+def encode_message(kind: int, ops: List[Op]) -> bytes:
+    out = bytearray()
+    for op in ops:
+        code = op[0]
+        out += code.encode()
+        if code == 'L':
+            out += _LAYER.pack(op[1])
+            _encode_value(out, op[2])
+        elif code == 'c':
+            out += _ITEM.pack(op[1], op[2])
+            out.append(_KIND_INDEX[op[3]])
+            _encode_fields(out, op[4])
+        elif code == 'u':
+            out += _ITEM.pack(op[1], op[2])
+            _encode_fields(out, op[3])
+        elif code == 'd':
+            out += _ITEM.pack(op[1], op[2])
+        elif code == 'D':
+            out += _LAYER.pack(op[1])
+    return _HEADER.pack(len(out) + 1, kind) + out
+
+
+def _decode_value(data: memoryview, at: int) -> Tuple[Any, int]:
+    tag = data[at]
+    at += 1
+    if tag == ord('T'):
+        return True, at
+    if tag == ord('F'):
+        return False, at
+    if tag == ord('i'):
+        return _I32.unpack_from(data, at)[0], at + 4
+    if tag == ord('q'):
+        return _I64.unpack_from(data, at)[0], at + 8
+    if tag == ord('f'):
+        return _F64.unpack_from(data, at)[0], at + 8
+    n = _U32.unpack_from(data, at)[0]
+    at += 4
+    if tag == ord('s'):
+        return bytes(data[at:at + n]).decode('utf-8'), at + n
+    if tag == ord('I'):
+        return list(struct.unpack_from(f'<{n}i', data, at)), at + 4 * n
+    if tag == ord('V'):
+        return list(struct.unpack_from(f'<{n}d', data, at)), at + 8 * n
+    raise ValueError(f'bad value tag {tag}')
+
+
+def _decode_fields(data: memoryview, at: int) -> Tuple[Dict[str, Any], int]:
+    fields = dict()
+    count = data[at]
+    at += 1
+    for _ in range(count):
+        name = _FIELD_NAMES[data[at]]
+        fields[name], at = _decode_value(data, at + 1)
+    return fields, at
+
+
+def decode_ops(body: bytes) -> List[Op]:
+    "The ops in a message body (everything after the header)"
+    data = memoryview(body)
+    ops: List[Op] = []
+    at = 0
+    while at < len(data):
+        code = chr(data[at])
+        at += 1
+        if code == 'L':
+            layer = _LAYER.unpack_from(data, at)[0]
+            name, at = _decode_value(data, at + 2)
+            ops.append(['L', layer, name])
+        elif code == 'D':
+            ops.append(['D', _LAYER.unpack_from(data, at)[0]])
+            at += 2
+        else:
+            layer, id = _ITEM.unpack_from(data, at)
+            at += _ITEM.size
+            if code == 'c':
+                kind = _KIND_NAMES[data[at]]
+                fields, at = _decode_fields(data, at + 1)
+                ops.append(['c', layer, id, kind, fields])
+            elif code == 'u':
+                fields, at = _decode_fields(data, at)
+                ops.append(['u', layer, id, fields])
+            elif code == 'd':
+                ops.append(['d', layer, id])
+            else:
+                raise ValueError(f'bad op {code!r}')
+    return ops
+
+
+class MessageReader():
+    "Splits bytes off a socket back into (type, ops) messages"
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Tuple[int, List[Op]]]:
+        self._buffer += data
+        messages = []
+        while len(self._buffer) >= _HEADER.size:
+            length, kind = _HEADER.unpack_from(self._buffer)
+            end = 4 + length
+            if len(self._buffer) < end:
+                break
+            messages.append((kind, decode_ops(bytes(self._buffer[_HEADER.size:end]))))
+            del self._buffer[:end]
+        return messages
+
+
+Address = Tuple[str, int] | str
+
+
+def socket_for(address: Address) -> socket.socket:
+    "A string is a Unix socket path, a (host, port) pair is TCP"
+    if isinstance(address, str):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+
+class _Client():
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.queue: Deque[memoryview] = deque()
+        self.queued = 0 # bytes
+
+    def push(self, message: bytes) -> None:
+        self.queue.append(memoryview(message))
+        self.queued += len(message)
+
+    def drop_backlog(self) -> None:
+        "Throws away every message that hasn't started going out yet"
+        head = self.queue.popleft() if self.queue else None
+        self.queue.clear()
+        self.queued = 0
+        if head is not None and head.obj is not None and len(head) < len(head.obj):
+            # Half sent, it has to be finished or the stream is garbage
+            self.push(head) # type: ignore
+
+    def send(self) -> None:
+        "Sends as much as the socket takes right now, never waits"
+        while self.queue:
+            head = self.queue[0]
+            sent = self.sock.send(head)
+            self.queued -= sent
+            if sent < len(head):
+                self.queue[0] = head[sent:]
+                return
+            self.queue.popleft()
+
+
+class StreamRenderer(Renderer):
+    """Streams what's drawn to any number of viewers over a socket
+
+    Listens on a TCP (host, port) or Unix socket path. Nothing here
+    ever blocks: new viewers are picked up on the next flush and get a
+    keyframe, after that every flush sends one delta message with the
+    creates, changed fields and deletes since the last one. A viewer
+    that falls more than `max_backlog` bytes behind has its queued
+    deltas thrown away and gets a fresh keyframe instead, so a slow
+    viewer never holds up the producer (or the other viewers).
+
+    With auto_flush (the default, like CanvasRenderer) every layer
+    update goes out right away. Turn it off under a Compositor.
+    """
+
+    def __init__(self,
+        address: Address = ('127.0.0.1', 8765),
+        auto_flush: bool = True,
+        max_backlog: int = 1 << 20
+    ):
+        self.address = address
+        self.auto_flush = auto_flush
+        self.max_backlog = max_backlog
+        self.encoder = DeltaEncoder()
+        self.clients: List[_Client] = []
+        self._pending: List[Op] = []
+
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+        self._server = socket_for(address)
+        if not isinstance(address, str):
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(address)
+        self._server.listen()
+        self._server.setblocking(False)
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except BlockingIOError:
+                return
+            sock.setblocking(False)
+            if sock.family == socket.AF_INET:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client = _Client(sock)
+            client.push(encode_message(KEYFRAME, self.encoder.keyframe()))
+            self.clients.append(client)
+
+    def update_animation_layer(self, layer: str, shapes: List[Shape]) -> None:
+        self._pending += self.encoder.update_layer(layer, shapes)
+        if self.auto_flush:
+            self.flush()
+
+    def clear_animation_layer(self, layer: str) -> None:
+        self._pending += self.encoder.clear_layer(layer)
+        if self.auto_flush:
+            self.flush()
+
+    def clear_everything(self) -> None:
+        self._pending += self.encoder.clear()
+        if self.auto_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        delta = encode_message(DELTA, self._pending) if self._pending else None
+        self._pending = []
+        keyframe: bytes | None = None
+
+        # Clients accepted now get a keyframe that already has this delta in it
+        known = len(self.clients)
+        self._accept()
+        for i, client in enumerate(self.clients):
+            if i < known and delta is not None:
+                if client.queued + len(delta) > self.max_backlog:
+                    if keyframe is None:
+                        keyframe = encode_message(KEYFRAME, self.encoder.keyframe())
+                    client.drop_backlog()
+                    client.push(keyframe)
+                else:
+                    client.push(delta)
+            try:
+                client.send()
+            except BlockingIOError:
+                pass
+            except OSError:
+                client.sock.close()
+                client.queue.clear()
+
+        self.clients = [c for c in self.clients if c.sock.fileno() >= 0]
+
+    def close(self) -> None:
+        for client in self.clients:
+            client.sock.close()
+        self.clients = []
+        self._server.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+
+def serve(animation: Animation, address: Address = ('127.0.0.1', 8765), fps: float = 20, loop: bool = True) -> None:
+    "Plays an animation to whoever connects, forever if loop is set"
+    renderer = StreamRenderer(address, auto_flush=False)
+    try:
+        while True:
+            start = clock.monotonic()
+            frame = 0
+            while True:
+                time = round((clock.monotonic() - start) * 1000)
+                if time > animation.duration:
+                    break
+                renderer.update_animation_layer(animation.name or 'stream', animation.get_state(time))
+                renderer.flush()
+                frame += 1
+                clock.sleep(max(0, start + frame / fps - clock.monotonic()))
+            renderer.clear_everything()
+            renderer.flush()
+            if not loop:
+                return
+    finally:
+        renderer.close()
@@ -0,0 +1,200 @@
+import json
+from typing import List
+from delta import DeltaEncoder, Op
+from rendering import Renderer
+from shapes import Color, ColorNames, Shape
+
+
+class SvgRenderer(Renderer):
+    """Records what's drawn as a stream of SVG updates
+
+    Every flush() ends a frame. Nothing is drawn here, the frames are
+    kept (as DeltaEncoder ops) until save() writes them out as a single
+    HTML page that plays them back with SVG, no Tk needed. Items are
+    created once and then only their changed attributes are touched,
+    so the file and the work the browser does per frame grow with what
+    changes, not with how much is on screen.
+    """
+
+    def __init__(self,
+        width: int = 800,
+        height: int = 450,
+        background: Color = ColorNames.WHITE()
+    ):
+        self.width = width
+        self.height = height
+        self.background = background
+        self.encoder = DeltaEncoder()
+        self.frames: List[List[Op]] = []
+        self._pending: List[Op] = []
+
+    def update_animation_layer(self, layer: str, shapes: List[Shape]) -> None:
+        self._pending += self.encoder.update_layer(layer, shapes)
+
+    def clear_animation_layer(self, layer: str) -> None:
+        self._pending += self.encoder.clear_layer(layer)
+
+    def clear_everything(self) -> None:
+        self._pending += self.encoder.clear()
+
+    def flush(self) -> None:
+        self.frames.append(self._pending)
+        self._pending = []
+
+    def html(self, fps: float = 20, loop: bool = True, title: str = '') -> str:
+        # </script> inside a string would end the script early
+        frames = json.dumps(self.frames, separators=(',', ':')).replace('</', '<\\/')
+        return (
+            _PAGE
+            .replace('$TITLE', title.replace('&', '&amp;').replace('<', '&lt;'))
+            .replace('$WIDTH', str(self.width))
+            .replace('$HEIGHT', str(self.height))
+            .replace('$BACKGROUND', self.background.hex_str() or 'none')
+            .replace('$FPS', json.dumps(fps))
+            .replace('$LOOP', json.dumps(loop))
+            .replace('$FRAMES', frames)
+        )
+
+    def save(self, path: str, fps: float = 20, loop: bool = True, title: str = '') -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.html(fps, loop, title))
+
+
+# The player. Each item keeps its fields, an update merges the changed
+# ones in and only the SVG attributes built from those are rewritten.
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$TITLE</title>
+<style>body { margin: 0; } svg { display: block; }</style>
+</head>
+<body>
+<svg id="stage" xmlns="http://www.w3.org/2000/svg" width="$WIDTH" height="$HEIGHT" viewBox="0 0 $WIDTH $HEIGHT">
+<rect width="100%" height="100%" fill="$BACKGROUND"/>
+</svg>
+<script id="frames" type="application/json">$FRAMES</script>
+<script>
+(function () {
+  const NS = 'http://www.w3.org/2000/svg';
+  const FPS = $FPS, LOOP = $LOOP;
+  const frames = JSON.parse(document.getElementById('frames').textContent);
+  const stage = document.getElementById('stage');
+  let layers = {}, items = {};
+
+  const TAGS = {Text: 'text', Line: 'polyline', Circle: 'circle', Polygon: 'polygon',
+                Rectangle: 'rect', Oval: 'ellipse', Arc: 'path'};
+  const color = c => c < 0 ? 'none' : '#' + c.toString(16).padStart(6, '0');
+  const points = v => { let s = []; for (let i = 0; i < v.length; i += 2) s.push(v[i] + ',' + v[i + 1]); return s.join(' '); };
+  const clamp = (v, lo, hi) => Math.min(hi, Math.max(lo, v));
+
+  function arcPath(f) {
+    const [x0, y0] = f.upper_left, [x1, y1] = f.lower_right;
+    const cx = (x0 + x1) / 2, cy = (y0 + y1) / 2, rx = Math.abs(x1 - x0) / 2, ry = Math.abs(y1 - y0) / 2;
+    const start = clamp(f.start, 0, 359) * Math.PI / 180, extent = clamp(f.extent, 0, 359);
+    const end = start + extent * Math.PI / 180;
+    const sx = cx + rx * Math.cos(start), sy = cy - ry * Math.sin(start);
+    const ex = cx + rx * Math.cos(end), ey = cy - ry * Math.sin(end);
+    const arc = `A ${rx} ${ry} 0 ${extent > 180 ? 1 : 0} 0 ${ex} ${ey}`;
+    if (f.style === 926383808) return `M ${sx} ${sy} ${arc}`;          // STYLE_ARC
+    if (f.style === 926383806) return `M ${sx} ${sy} ${arc} Z`;        // STYLE_CHORD
+    return `M ${cx} ${cy} L ${sx} ${sy} ${arc} Z`;                     // STYLE_PIESLICE
+  }
+
+  function draw(item, changed) {
+    const e = item.el, f = item.fields, kind = item.kind;
+    const has = (...names) => names.some(n => n in changed);
+    if (kind === 'Text') {
+      if (has('position')) { e.setAttribute('x', f.position[0]); e.setAttribute('y', f.position[1]); }
+      if (has('color')) e.setAttribute('fill', color(f.color));
+      if (has('text')) e.textContent = f.text;
+      if (has('font_family', 'font_size', 'font_bold', 'font_slant', 'font_underline', 'font_overstrike')) {
+        e.setAttribute('font-family', f.font_family === 'default' ? 'sans-serif' : f.font_family);
+        e.setAttribute('font-size', (f.font_size > 0 ? f.font_size : 10) + 'pt');
+        e.setAttribute('font-weight', f.font_bold ? 'bold' : 'normal');
+        e.setAttribute('font-style', f.font_slant ? 'italic' : 'normal');
+        const deco = [f.font_underline ? 'underline' : '', f.font_overstrike ? 'line-through' : ''].join(' ').trim();
+        e.setAttribute('text-decoration', deco || 'none');
+      }
+      return;
+    }
+    if (kind === 'Line') {
+      if (has('vertices')) e.setAttribute('points', points(f.vertices));
+      if (has('color')) e.setAttribute('stroke', color(f.color));
+      if (has('width')) e.setAttribute('stroke-width', f.width);
+      return;
+    }
+    if (has('fill_color')) e.setAttribute('fill', kind === 'Arc' && f.style === 926383808 ? 'none' : color(f.fill_color));
+    if (has('border_color')) e.setAttribute('stroke', color(f.border_color));
+    if (has('border_width')) e.setAttribute('stroke-width', f.border_width);
+    if (kind === 'Circle' && has('position', 'radius')) {
+      e.setAttribute('cx', f.position[0]); e.setAttribute('cy', f.position[1]); e.setAttribute('r', Math.abs(f.radius));
+    } else if (kind === 'Polygon' && has('vertices')) {
+      e.setAttribute('points', points(f.vertices));
+    } else if (kind === 'Rectangle' && has('upper_left', 'lower_right')) {
+      const [x0, y0] = f.upper_left, [x1, y1] = f.lower_right;
+      e.setAttribute('x', Math.min(x0, x1)); e.setAttribute('y', Math.min(y0, y1));
+      e.setAttribute('width', Math.abs(x1 - x0)); e.setAttribute('height', Math.abs(y1 - y0));
+    } else if (kind === 'Oval' && has('upper_left', 'lower_right')) {
+      const [x0, y0] = f.upper_left, [x1, y1] = f.lower_right;
+      e.setAttribute('cx', (x0 + x1) / 2); e.setAttribute('cy', (y0 + y1) / 2);
+      e.setAttribute('rx', Math.abs(x1 - x0) / 2); e.setAttribute('ry', Math.abs(y1 - y0) / 2);
+    } else if (kind === 'Arc' && has('upper_left', 'lower_right', 'start', 'extent', 'style')) {
+      e.setAttribute('d', arcPath(f));
+      e.setAttribute('fill', f.style === 926383808 ? 'none' : color(f.fill_color));
+    }
+  }
+
+  function apply(op) {
+    switch (op[0]) {
+      case 'L': {
+        const g = document.createElementNS(NS, 'g');
+        stage.appendChild(g);
+        layers[op[1]] = g; items[op[1]] = {};
+        break;
+      }
+      case 'c': {
+        const [, layer, id, kind, fields] = op;
+        const el = document.createElementNS(NS, TAGS[kind]);
+        if (kind === 'Text') { el.setAttribute('text-anchor', 'middle'); el.setAttribute('dominant-baseline', 'central'); }
+        if (kind === 'Line') el.setAttribute('fill', 'none');
+        layers[layer].appendChild(el);
+        const item = items[layer][id] = {el, kind, fields};
+        draw(item, fields);
+        break;
+      }
+      case 'u': {
+        const item = items[op[1]][op[2]];
+        Object.assign(item.fields, op[3]);
+        draw(item, op[3]);
+        break;
+      }
+      case 'd':
+        items[op[1]][op[2]].el.remove();
+        delete items[op[1]][op[2]];
+        break;
+      case 'D':
+        layers[op[1]].remove();
+        delete layers[op[1]]; delete items[op[1]];
+        break;
+    }
+  }
+
+  let next = 0, started = null;
+  function tick(now) {
+    if (started === null) started = now;
+    const due = Math.floor((now - started) * FPS / 1000);
+    while (next <= due && next < frames.length) frames[next++].forEach(apply);
+    if (next >= frames.length) {
+      if (!LOOP) return;
+      Object.values(layers).forEach(g => g.remove());
+      layers = {}; items = {}; next = 0; started = now;
+    }
+    requestAnimationFrame(tick);
+  }
+  requestAnimationFrame(tick);
+})();
+</script>
+</body>
+</html>
+"""
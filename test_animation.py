@@ -0,0 +1,49 @@
+import random
+from typing import List
+from animation import Animation, Scene, TimelineEntry
+from shapes import Shape
+
+
+class Blank(Animation):
+    def get_state(self, time: int) -> List[Shape]:
+        return []
+
+
+def random_scene(rng: random.Random, depth: int = 0) -> Scene:
+    children = []
+    for i in range(rng.randint(1, 6)):
+        start = rng.randint(0, 2000)
+        if depth < 2 and rng.random() < 0.3:
+            children.append((start, random_scene(rng, depth + 1)))
+        else:
+            children.append((start, Blank(rng.randint(0, 1500), f'leaf{i}')))
+    return Scene(children)
+
+
+def brute_force(entries: List[TimelineEntry], time: float) -> List[TimelineEntry]:
+    return [e for e in entries if e.start <= time <= e.end]
+
+
+def test_index_and_cursor_match_a_full_scan():
+    rng = random.Random(7)
+    for _ in range(50):
+        timeline = random_scene(rng).timeline
+        cursor = timeline.cursor()
+        # Mostly forward like playback, with some jumps back
+        times = sorted(rng.uniform(-100, 6000) for _ in range(80))
+        times += [rng.uniform(-100, 6000) for _ in range(20)]
+        times += [e.start for e in timeline.entries] + [e.end for e in timeline.entries]
+        for time in times:
+            expected = brute_force(timeline.entries, time)
+            assert timeline.active_at(time) == expected
+            assert cursor.advance(time) == expected
+
+
+def test_nested_scenes_are_flattened_in_draw_order():
+    a, b, c = Blank(100, 'a'), Blank(100, 'b'), Blank(100, 'c')
+    scene = Scene([(0, a), (50, Scene([(0, b), (0, c)], 'inner'))])
+    entries = scene.timeline.entries
+    assert [e.animation for e in entries] == [a, b, c]
+    assert [e.offset for e in entries] == [0, 50, 50]
+    assert entries[1].path == ('inner', 'b')
+    assert scene.timeline.active_at(120) == entries[1:]
@@ -0,0 +1,40 @@
+import random
+from animation_builder import AnimationBuilder, animate_color, animate_int, animate_point
+from delta import shape_fields
+from shapes import Circle, Color, Point, PurePicture
+
+
+def builder() -> AnimationBuilder:
+    return AnimationBuilder(
+        subject=PurePicture(Circle(
+            fill_color=Color(0, 0, 0),
+            position=Point(10, 10),
+            radius=20
+        )),
+        animators=[
+            animate_color('fill_color', Color(255, 0, 0), 1000),
+            animate_color('fill_color', Color(0, 0, 255), 1000, 800),
+            animate_int('radius', 5, 1500, 200, easing='ease_in_out'),
+            animate_point('position', Point(300, 200), 2000, 500)
+        ],
+        duration=3000
+    )
+
+
+def test_frames_dont_depend_on_the_order_they_are_asked_for():
+    b = builder()
+    assert b.seekable
+    times = list(range(0, 3000, 25))
+    random.Random(3).shuffle(times)
+    # Scrubbing first, before the builder has played anything
+    seeked = {t: [shape_fields(s) for s in b.get_state(t)] for t in times}
+    for t in sorted(times):
+        assert [shape_fields(s) for s in b.get_state(t)] == seeked[t]
+    assert seeked[0] == []
+    assert seeked[2500][0]['position'] == [300, 200]
+
+
+def test_plain_function_animators_are_not_seekable():
+    b = builder()
+    b.add_animators(lambda subject: lambda time: None)
+    assert not b.seekable
@@ -0,0 +1,39 @@
+from typing import List
+from animation import Animation, Scene
+from culling import Culled
+from shapes import BoundingBox, Circle, Point, Shape
+
+VIEWPORT = BoundingBox(0, 0, 100, 100)
+
+
+class Counting(Animation):
+    def __init__(self, x: float, bounds: BoundingBox | None = None):
+        super().__init__(1000, 'counting', bounds)
+        self.x = x
+        self.calls = 0
+
+    def get_state(self, time: int) -> List[Shape]:
+        self.calls += 1
+        return [Circle(position=Point(self.x, 50), radius=5)]
+
+
+def test_offscreen_scene_is_not_evaluated():
+    leaves = [Counting(50) for _ in range(10)]
+    scene = Scene([(0, a) for a in leaves], bounds=BoundingBox(500, 500, 600, 600))
+    culled = Culled(scene, VIEWPORT)
+    for time in range(0, 1000, 100):
+        assert culled.get_state(time) == []
+    assert sum(a.calls for a in leaves) == 0
+
+
+def test_offscreen_entries_are_skipped():
+    inside = Counting(50, BoundingBox(40, 40, 60, 60))
+    outside = Counting(500, BoundingBox(490, 40, 510, 60))
+    culled = Culled(Scene([(0, inside), (0, outside)]), VIEWPORT)
+    assert len(culled.get_state(0)) == 1
+    assert (inside.calls, outside.calls) == (1, 0)
+
+
+def test_undeclared_shapes_are_culled():
+    culled = Culled(Scene([(0, Counting(50)), (0, Counting(500))]), VIEWPORT)
+    assert [s.position.x for s in culled.get_state(0)] == [50]
@@ -0,0 +1,90 @@
+import asyncio
+import time as clock
+from typing import List, Tuple
+from animation import Animation
+from fanout import FanOut, Sink
+from rendering import Renderer
+from shapes import Circle, Point, Shape
+
+
+class Counting(Animation):
+    def __init__(self):
+        super().__init__(400, 'counting')
+        self.calls = 0
+        self.circle = Circle(position=Point(0, 0))
+
+    def get_state(self, time: int) -> List[Shape]:
+        self.calls += 1
+        self.circle.position.x = time
+        return [self.circle]
+
+
+class Recorder(Renderer):
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.calls: List[Tuple[str, List[int]]] = []
+
+    def update_animation_layer(self, layer: str, shapes: List[Shape]) -> None:
+        clock.sleep(self.delay)
+        self.calls.append(('update', [s.position.x for s in shapes]))
+
+    def clear_animation_layer(self, layer: str) -> None:
+        self.calls.append(('clear', []))
+
+    def clear_everything(self) -> None:
+        pass
+
+    def flush(self) -> None:
+        pass
+
+
+def fake_clock(step: float):
+    now = [-step]
+    def tick() -> float:
+        now[0] += step
+        return now[0]
+    return tick
+
+
+def test_bounded_sink_drops_its_oldest_frames():
+    async def main() -> Sink:
+        sink = Sink(Recorder(), max_frames=2)
+        for time in range(5):
+            sink.push((time, []))
+        return sink
+    sink = asyncio.run(main())
+    assert (sink.queued, sink.dropped) == (2, 3)
+    assert sink.queue.get_nowait()[0] == 3
+
+
+def test_every_sink_sees_one_evaluation_per_frame():
+    animation = Counting()
+    fanout = FanOut(animation, fps=20, now=fake_clock(0.05))
+    exporter = fanout.attach(Recorder(), threaded=True)
+    preview = fanout.attach(Recorder(delay=0.1), max_frames=1, threaded=True)
+    stats = asyncio.run(fanout.play())
+
+    assert animation.calls == stats.frames > 1
+    updates = [xs[0] for kind, xs in exporter.renderer.calls if kind == 'update']
+    # Each frame was copied before it was sent, later frames didn't
+    # change what an earlier one showed
+    assert updates == sorted(set(updates)) and len(updates) == stats.frames
+    assert exporter.renderer.calls[-1] == ('clear', [])
+
+    assert preview.dropped > 0
+    assert preview.rendered + preview.dropped == stats.frames
+    assert preview.renderer.calls[-1] == ('clear', [])
+
+
+def test_detached_sink_is_cleared_and_gets_nothing_more():
+    fanout = FanOut(Counting(), fps=20, now=fake_clock(0.05))
+    sink = fanout.attach(Recorder())
+
+    async def main() -> None:
+        play = asyncio.create_task(fanout.play())
+        await asyncio.sleep(0.12)
+        fanout.detach(sink)
+        await play
+    asyncio.run(main())
+    assert sink.renderer.calls[-1] == ('clear', [])
+    assert sink.renderer.calls.count(('clear', [])) == 1
@@ -0,0 +1,102 @@
+import threading
+import time as clock
+from typing import List
+from animation import Animation
+from pipeline import BLOCK, DROP_OLDEST, FramePipeline, FrameRing
+from shapes import Color, Point, Rectangle, Shape
+
+
+def draw(ring: FrameRing, frame: int, policy: str = BLOCK) -> int | None:
+    slot = ring.claim(frame, policy)
+    if slot is not None:
+        ring.frames[slot][:] = frame
+        ring.publish(slot)
+    return slot
+
+
+def test_display_gets_the_newest_due_frame():
+    ring = FrameRing(4, 2, slots=4, fps=10)
+    try:
+        for frame in range(3):
+            draw(ring, frame)
+        frame, pixels = ring.latest(150)
+        assert frame == 1 and (pixels == 1).all()
+        assert ring.latest(150) is None
+        assert ring.latest(250)[0] == 2
+
+        stats = ring.stats()
+        assert (stats.produced, stats.displayed, stats.stale, stats.repeats) == (3, 2, 1, 1)
+        assert (stats.free, stats.shown) == (3, 1)
+    finally:
+        ring.close()
+
+
+def test_shown_frame_is_kept_until_a_newer_one_is_taken():
+    ring = FrameRing(4, 2, slots=2, fps=10)
+    try:
+        shown = draw(ring, 0)
+        ring.latest(0)
+        assert draw(ring, 1) != shown
+        assert ring.stats().shown == 1
+    finally:
+        ring.close()
+
+
+def test_late_frames_are_skipped_and_drop_oldest_reclaims_passed_ones():
+    ring = FrameRing(4, 2, slots=2, fps=10)
+    try:
+        first, second = ring.claim(0), ring.claim(1)
+        # The display moves on to frame 2 before either is done
+        assert ring.latest(250) is None
+        ring.publish(first)
+        ring.publish(second)
+
+        assert ring.claim(1) is None
+        # Well ahead of the clock, so a slow test run can't make it late
+        assert ring.claim(9, DROP_OLDEST) == first
+        stats = ring.stats()
+        assert (stats.late, stats.dropped) == (1, 1)
+    finally:
+        ring.close()
+
+
+def test_stop_wakes_a_waiting_producer():
+    ring = FrameRing(4, 2, slots=2, fps=10)
+    try:
+        ring.claim(0)
+        ring.claim(1)
+        got = []
+        producer = threading.Thread(target=lambda: got.append(ring.claim(2)))
+        producer.start()
+        clock.sleep(0.05)
+        ring.stop()
+        producer.join(1)
+        assert not producer.is_alive() and got == [None]
+        assert ring.stats().waits >= 1
+    finally:
+        ring.close()
+
+
+class Square(Animation):
+    def __init__(self):
+        super().__init__(1000, 'square')
+
+    def get_state(self, time: int) -> List[Shape]:
+        return [Rectangle(
+            fill_color=Color(255, 0, 0),
+            border_color=Color(255, 0, 0),
+            upper_left=Point(0, 0),
+            lower_right=Point(8, 8)
+        )]
+
+
+def test_pipeline_frames_come_from_the_workers():
+    with FramePipeline(Square(), fps=10, width=32, height=16, workers=2) as pipeline:
+        deadline = clock.monotonic() + 10
+        pixels = None
+        while pixels is None and clock.monotonic() < deadline:
+            pixels = pipeline.frame(0)
+            clock.sleep(0.01)
+        assert pixels is not None and pipeline.frame_index == 0
+        assert tuple(pixels[2, 2, :3]) == (255, 0, 0)
+        assert tuple(pixels[12, 24, :3]) == (255, 255, 255)
@@ -0,0 +1,68 @@
+import tkinter
+import pytest
+from rendering import TclBatch, tcl_word
+
+# A Tcl proc named like a canvas, so batches run without a display.
+# It logs every command, numbers created items from 100 up and fails on
+# anything done to item 13.
+FAKE_CANVAS = '''
+set ::log {}
+set ::next 100
+proc .c {args} {
+    lappend ::log $args
+    if {[lindex $args 0] eq "create"} { return [incr ::next] }
+    if {[lindex $args 1] == 13} { error "bad item" }
+}
+'''
+
+
+class FakeCanvas():
+    def __init__(self) -> None:
+        self.tk = tkinter.Tcl().tk
+        self.tk.eval(FAKE_CANVAS)
+
+    def __str__(self) -> str:
+        return '.c'
+
+    def log(self) -> list:
+        return [list(self.tk.splitlist(line)) for line in self.tk.splitlist(self.tk.eval('set ::log'))]
+
+
+@pytest.mark.parametrize('text', [
+    'plain', '', 'two words', 'a{b', '}', '[exit]', '$x', '"quoted"', 'back\\slash', 'semi;colon', 'line\nbreak', 'tab\there'
+])
+def test_tcl_word_reads_back_as_one_word(text):
+    tk = tkinter.Tcl().tk
+    assert tk.splitlist(tk.eval(f'list {tcl_word(text)}')) == (text,)
+
+
+def test_batch_runs_as_one_script_and_fixes_up_ids():
+    canvas = FakeCanvas()
+    batch = TclBatch(canvas)
+    token = {'id': batch.create_oval(1, 2, 3, 4, fill='#FF0000')}
+    batch.track(token)
+    batch.itemconfigure(token['id'], outline='a b')
+    batch.coords(7, 5, 6)
+    batch.delete(8)
+    assert canvas.log() == []
+
+    batch.run()
+    assert token['id'] == 101
+    assert canvas.log() == [
+        ['create', 'oval', '1', '2', '3', '4', '-fill', '#FF0000'],
+        ['itemconfigure', '101', '-outline', 'a b'],
+        ['coords', '7', '5', '6'],
+        ['delete', '8'],
+    ]
+
+
+def test_discard_deletes_what_a_failed_batch_created():
+    canvas = FakeCanvas()
+    batch = TclBatch(canvas)
+    batch.create_text(0, 0, text='hi')
+    batch.create_line(0, 0, 1, 1)
+    batch.itemconfigure(13, fill='red')
+    with pytest.raises(tkinter.TclError):
+        batch.run()
+    batch.discard()
+    assert sorted(canvas.log()[-2:]) == [['delete', '101'], ['delete', '102']]
@@ -0,0 +1,33 @@
+import random
+import numpy as np
+from simulation import BouncingBalls
+
+
+def balls() -> BouncingBalls:
+    rng = np.random.default_rng(1)
+    count = 20
+    return BouncingBalls(
+        positions=rng.uniform([50, 50], [750, 200], (count, 2)),
+        velocities=rng.uniform(-300, 300, (count, 2)),
+        radii=rng.uniform(4, 12, count),
+        colors=rng.integers(0, 256, (count, 3)),
+        duration=5000,
+        timestep=10,
+        checkpoint_interval=500
+    )
+
+
+def test_seeking_matches_playing():
+    played = balls()
+    times = list(range(0, 5000, 50))
+    expected = {t: played.state_at(t)['position'].copy() for t in times}
+
+    seeked = balls()
+    shuffled = times[:]
+    random.Random(5).shuffle(shuffled)
+    for t in shuffled:
+        assert np.array_equal(seeked.state_at(t)['position'], expected[t])
+    # Going back again, now from checkpoints made out of order
+    for t in times[::-1]:
+        assert np.array_equal(seeked.state_at(t)['position'], expected[t])
+
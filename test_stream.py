@@ -0,0 +1,55 @@
+import socket
+from delta import DeltaEncoder
+from shapes import Circle, Point
+from stream import DELTA, KEYFRAME, MessageReader, StreamRenderer, decode_ops, encode_message
+
+
+def test_layer_numbers_are_reused():
+    # Every playback gets a new layer name, a long running stream goes
+    # through far more than a u16 worth of them
+    encoder = DeltaEncoder()
+    shape = Circle(position=Point(1, 2))
+    for i in range(70000):
+        ops = encoder.update_layer(f'playback_{i}', [shape])
+        ops += encoder.clear_layer(f'playback_{i}')
+        message = encode_message(DELTA, ops)
+    assert decode_ops(message[5:]) == [
+        ['L', 0, 'playback_69999'],
+        ['c', 0, shape.id, 'Circle', ops[1][4]],
+        ['D', 0]
+    ]
+
+
+def test_keyframe_keeps_stacking_order():
+    encoder = DeltaEncoder()
+    encoder.update_layer('a', [])
+    encoder.update_layer('b', [])
+    encoder.clear_layer('a')
+    encoder.update_layer('c', [])
+    assert [op[1:] for op in encoder.keyframe()] == [[1, 'b'], [0, 'c']]
+
+
+def test_clear_goes_out_with_auto_flush(tmp_path):
+    address = str(tmp_path / 'stream.sock')
+    renderer = StreamRenderer(address)
+    viewer = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    viewer.connect(address)
+    viewer.settimeout(1)
+    reader = MessageReader()
+    try:
+        shape = Circle(position=Point(1, 2))
+        renderer.update_animation_layer('playback', [shape])
+        [(kind, ops)] = reader.feed(viewer.recv(1 << 16))
+        assert kind == KEYFRAME and ops[0] == ['L', 0, 'playback']
+
+        # Nothing draws on a layer after it's cleared, so the clear has
+        # to go out by itself
+        renderer.clear_animation_layer('playback')
+        assert reader.feed(viewer.recv(1 << 16)) == [(DELTA, [['D', 0]])]
+        renderer.update_animation_layer('other', [shape])
+        reader.feed(viewer.recv(1 << 16))
+        renderer.clear_everything()
+        assert reader.feed(viewer.recv(1 << 16)) == [(DELTA, [['D', 0]])]
+    finally:
+        viewer.close()
+        renderer.close()
@@ -0,0 +1,229 @@
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from animation import Animation, Scene, TimelineEntry, TimelineIndex
+from animation_builder import (
+    AnimationBuilder,
+    _color_setter_linear, _gradient_setter, _int_setter_linear, _point_setter_linear, _vertices_setter_linear
+)
+from easing import ease_array, easing_id
+from gradient import Gradient
+from shapes import Point, Shape
+
+# A slot is one number that lives on some object: (object, attribute).
+# Every track is split into components, one per slot it drives, e.g.
+# a color track has three (red, green and blue).
+Slot = Tuple[Any, str]
+
+_COMPILABLE = {_int_setter_linear, _point_setter_linear, _color_setter_linear, _vertices_setter_linear, _gradient_setter}
+
+# A component's plan: its slot, the value the slot had before any
+# animation, where it starts and ends, whether to clamp it to a color
+# channel and the lookup table it indexes (see _lut_for, -1 for none)
+Plan = Tuple[Slot, float, float, float, bool, int]
+
+
+class TrackEngine():
+    """Evaluates the tracks of many AnimationBuilders at once
+
+    The tracks made by animate_int, animate_point, animate_color,
+    animate_gradient and animate_vertices are compiled into flat arrays (start time,
+    duration, initial value, target value, easing id, which slot they
+    write to ...). A frame is one pass of NumPy over all of them,
+    instead of a Python closure call per property per builder.
+
+    Builders are given with the time (in the outer clock) they start
+    at. Builders that use any other kind of animator can't be compiled
+    and are left out, check `compiled` to see which made it in.
+    """
+
+    def __init__(self, builders: List[Tuple[int, AnimationBuilder]]):
+        self.compiled: List[AnimationBuilder] = []
+        self._slots: Dict[Tuple[int, str], int] = dict()
+        self._slot_targets: List[Slot] = []
+        self._slot_base: List[float] = []
+        self._slot_builder: List[int] = []
+        # Every gradient channel's table, one after another
+        self._lut_values: List[int] = []
+        self._lut_offsets: Dict[Tuple[int, int], int] = dict()
+
+        offsets: List[int] = []
+        durations: List[int] = []
+        components: Dict[str, list] = {
+            k: [] for k in ('start', 'duration', 'init', 'target', 'easing', 'slot', 'clamp', 'lut')
+        }
+
+        for offset, builder in builders:
+            compiled = self._compile(builder, len(self.compiled), offset, components)
+            if compiled:
+                self.compiled.append(builder)
+                offsets.append(offset)
+                durations.append(builder.duration)
+
+        self._offset = np.array(offsets, dtype=np.float64)
+        self._duration = np.array(durations, dtype=np.float64)
+        self._start = np.array(components['start'], dtype=np.float64)
+        self._length = np.array(components['duration'], dtype=np.float64)
+        self._init = np.array(components['init'], dtype=np.float64)
+        self._target = np.array(components['target'], dtype=np.float64)
+        self._easing = np.array(components['easing'], dtype=np.int64)
+        self._slot = np.array(components['slot'], dtype=np.int64)
+        self._clamp = np.array(components['clamp'], dtype=bool)
+        self._lut = np.array(components['lut'], dtype=np.int64)
+        self._luts = np.array(self._lut_values, dtype=np.float64)
+        self._component_builder = np.array(self._slot_builder, dtype=np.int64)[self._slot] \
+            if len(self._slot) else np.zeros(0, dtype=np.int64)
+        self._base = np.array(self._slot_base, dtype=np.float64)
+        self._slot_owner = np.array(self._slot_builder, dtype=np.int64)
+
+    def _slot_for(self, obj: Any, attr: str, base: float, builder: int) -> int:
+        key = (id(obj), attr)
+        if key not in self._slots:
+            self._slots[key] = len(self._slot_targets)
+            self._slot_targets.append((obj, attr))
+            self._slot_base.append(base)
+            self._slot_builder.append(builder)
+        return self._slots[key]
+
+    def _lut_for(self, gradient: Gradient, channel: int) -> int:
+        "Where one channel of a gradient's table starts in _luts"
+        key = (id(gradient), channel)
+        if key not in self._lut_offsets:
+            self._lut_offsets[key] = len(self._lut_values)
+            self._lut_values += gradient.table[:, channel].tolist()
+        return self._lut_offsets[key]
+
+    def _compile(self, builder: AnimationBuilder, index: int, offset: int, out: Dict[str, list]) -> bool:
+        if not builder.seekable:
+            return False
+        if any(track.track.setter not in _COMPILABLE for track in builder.tracks()):
+            return False
+
+        for track in builder.tracks():
+            plan: List[Plan] = []
+            setter = track.track.setter
+            init = track.init
+            target = track.track.kwargs.get('target')
+            snapshot = builder._initial[track.prop][0]
+
+            if setter is _int_setter_linear:
+                plan.append(((track.src, track.prop), snapshot, init, target, False, -1))
+            elif setter is _point_setter_linear:
+                plan += self._point_plan(track.prop_val, snapshot, init, target)
+            elif setter is _color_setter_linear:
+                plan += [
+                    ((track.prop_val, c), getattr(snapshot, c), getattr(init, c), getattr(target, c), True, -1)
+                    for c in ('red', 'green', 'blue')
+                ]
+            elif setter is _gradient_setter:
+                # The value is the table index, the same rounding
+                # Gradient.index does
+                gradient = track.track.kwargs['gradient']
+                plan += [
+                    ((track.prop_val, c), getattr(snapshot, c), 0, len(gradient) - 1, False, self._lut_for(gradient, i))
+                    for i, c in enumerate(('red', 'green', 'blue'))
+                ]
+            elif setter is _vertices_setter_linear:
+                for p, s, i, t in zip(track.prop_val, snapshot, init, target):
+                    plan += self._point_plan(p, s, i, t)
+
+            kwargs = track.track.kwargs
+            for (obj, attr), base, i, t, clamp, lut in plan:
+                out['start'].append(offset + track.start_time)
+                out['duration'].append(kwargs['duration'])
+                out['init'].append(i)
+                out['target'].append(t)
+                out['easing'].append(easing_id(kwargs.get('easing', 'linear')))
+                out['slot'].append(self._slot_for(obj, attr, base, index))
+                out['clamp'].append(clamp)
+                out['lut'].append(lut)
+
+        return True
+
+    @staticmethod
+    def _point_plan(point: Point, snapshot: Point, init: Point, target: Point) -> List[Plan]:
+        return [
+            ((point, 'x'), snapshot.x, init.x, target.x, False, -1),
+            ((point, 'y'), snapshot.y, init.y, target.y, False, -1)
+        ]
+
+    def evaluate(self, time: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Works out every slot's value at time (in the outer clock)
+
+        Returns (slots, values): the slots that belong to a builder
+        that's running right now, and what they should be set to. Good
+        for renderers that want numbers rather than shapes.
+        """
+        local = time - self._offset
+        running = (local > 0) & (local < self._duration)
+        slots = np.flatnonzero(running[self._slot_owner])
+        values = self._base.copy()
+
+        active = np.flatnonzero(running[self._component_builder] & (time - self._start > 0))
+        if active.size:
+            # When tracks overlap on a slot, the last one added wins
+            reverse = active[::-1]
+            _, first = np.unique(self._slot[reverse], return_index=True)
+            winners = reverse[first]
+
+            progress = ease_array(self._easing[winners], (time - self._start[winners]) / self._length[winners])
+            init = self._init[winners]
+            v = np.round((self._target[winners] - init) * progress + init)
+            clamp = self._clamp[winners]
+            v[clamp] = np.clip(v[clamp], 0, 255)
+            lut = self._lut[winners]
+            indexed = lut >= 0
+            if indexed.any():
+                last = self._target[winners][indexed]
+                v[indexed] = self._luts[lut[indexed] + np.clip(v[indexed], 0, last).astype(np.int64)]
+            values[self._slot[winners]] = v
+
+        return slots, values[slots]
+
+    def apply(self, time: float) -> None:
+        "Writes every running builder's values back onto its subject"
+        slots, values = self.evaluate(time)
+        targets = self._slot_targets
+        for slot, value in zip(slots.tolist(), values.astype(np.int64).tolist()):
+            obj, attr = targets[slot]
+            setattr(obj, attr, value)
+
+
+class CompiledScene(Animation):
+    """Plays an Animation (usually a Scene) with its builders compiled
+
+    Every AnimationBuilder in the tree that can be compiled is run by
+    one TrackEngine, everything else runs as usual. The shapes come out
+    in the same order as the original.
+    """
+
+    def __init__(self, animation: Animation, name: str | None = None):
+        if isinstance(animation, Scene):
+            self.timeline = animation.timeline
+        else:
+            self.timeline = TimelineIndex([TimelineEntry(0, animation.duration, 0, 0, animation)])
+        self._cursor = self.timeline.cursor()
+
+        self.engine = TrackEngine([
+            (e.offset, e.animation) for e in self.timeline.entries
+            if isinstance(e.animation, AnimationBuilder)
+        ])
+        self._compiled = {id(b) for b in self.engine.compiled}
+        self._source = animation
+        super().__init__(animation.duration, animation.name if name is None else name)
+
+    @property
+    def seekable(self) -> bool:
+        return self._source.seekable
+
+    def get_state(self, time: int) -> List[Shape]:
+        self.engine.apply(time)
+
+        shapes: List[Shape] = []
+        for e in self._cursor.advance(time):
+            local = time - e.offset
+            if id(e.animation) in self._compiled:
+                if 0 < local < e.animation.duration:
+                    shapes += e.animation._subject.get_shapes()
+            else:
+                shapes += e.animation.get_state(local)
+        return shapes
@@ -1,11 +1,41 @@
 
-_count = 0
+# Ids are (namespace << NAMESPACE_BITS) | counter. Every process (or
+# anything else that makes shapes on its own) that has to hand ids back
+# to another gets its own namespace, so their ids can't collide. The
+# main process is namespace 0, so its ids are just 1, 2, 3 ...
+NAMESPACE_BITS = 32
+
+class IdAllocator():
+    "Counts up through the ids of one namespace"
+
+    def __init__(self, namespace: int = 0):
+        self.namespace = namespace
+        self._base = namespace << NAMESPACE_BITS
+        self._count = 0
+
+    def __call__(self) -> int:
+        self._count += 1
+        if self._count >> NAMESPACE_BITS:
+            raise OverflowError(f"namespace {self.namespace} is out of ids")
+        return self._base | self._count
+
+_allocator = IdAllocator()
+
 def gen_unique_number() -> int:
-    "TODO: Fix this. This is a hack to get unique numbers. Fine for now"
+    "A number nothing else in this program (or its worker processes) got"
+    return _allocator()
+
+def use_id_namespace(namespace: int) -> None:
+    """Switch this process over to another namespace. Call it once in
+    a worker before it makes any shapes. Namespace 0 is the main
+    process', don't reuse one another process is using.
+    """
+    global _allocator
+    _allocator = IdAllocator(namespace)
 
-    global _count
-    _count += 1
-    return _count
+def id_namespace(id: int) -> int:
+    "Which namespace an id came from"
+    return id >> NAMESPACE_BITS
 
 def ratiod(start: int, end: int, ratio:float) -> int:
     "There's undoubtedly a better name for this :/"
@@ -0,0 +1,119 @@
+"""Watch a stream.StreamRenderer from another process (or machine)
+
+    python viewer.py                    # 127.0.0.1:8765
+    python viewer.py somehost:9000
+    python viewer.py /tmp/show.sock     # a Unix socket
+"""
+import sys
+from typing import Dict, List
+from delta import Op, apply_fields, shape_from_fields
+from rendering import CanvasRenderer, Renderer
+from shapes import Shape
+from stream import KEYFRAME, Address, MessageReader, socket_for
+
+
+class StreamViewer():
+    """Replays a stream through any Renderer
+
+    Keeps a copy of every shape the stream describes (with the ids the
+    producer gave them) and hands each changed layer to the renderer,
+    which then does its usual create/update/delete. The socket is never
+    waited on, call poll() as often as you like.
+    """
+
+    def __init__(self, renderer: Renderer, address: Address):
+        self.renderer = renderer
+        self.sock = socket_for(address)
+        self.sock.connect(address)
+        self.sock.setblocking(False)
+        self.connected = True
+        self._reader = MessageReader()
+        self._names: Dict[int, str] = dict()
+        # layer -> id -> shape, in the order they were created
+        self._layers: Dict[int, Dict[int, Shape]] = dict()
+
+    def poll(self) -> bool:
+        "Applies whatever has arrived, returns True if anything changed"
+        data = bytearray()
+        while self.connected:
+            try:
+                chunk = self.sock.recv(1 << 16)
+            except BlockingIOError:
+                break
+            except OSError:
+                chunk = b''
+            if not chunk:
+                self.connected = False
+                self.sock.close()
+                break
+            data += chunk
+
+        messages = self._reader.feed(bytes(data))
+        for kind, ops in messages:
+            self.apply(kind, ops)
+        if messages:
+            self.renderer.flush()
+        return bool(messages)
+
+    def apply(self, kind: int, ops: List[Op]) -> None:
+        if kind == KEYFRAME:
+            self._names.clear()
+            self._layers.clear()
+            self.renderer.clear_everything()
+
+        touched = set()
+        for op in ops:
+            code, layer = op[0], op[1]
+            if code == 'L':
+                self._names[layer] = op[2]
+                self._layers[layer] = dict()
+            elif code == 'c':
+                self._layers[layer][op[2]] = shape_from_fields(op[3], op[2], op[4])
+            elif code == 'u':
+                apply_fields(self._layers[layer][op[2]], op[3])
+            elif code == 'd':
+                del self._layers[layer][op[2]]
+            elif code == 'D':
+                del self._layers[layer]
+                self.renderer.clear_animation_layer(self._names.pop(layer))
+                touched.discard(layer)
+                continue
+            touched.add(layer)
+
+        for layer in touched:
+            self.renderer.update_animation_layer(self._names[layer], list(self._layers[layer].values()))
+
+    def close(self) -> None:
+        self.sock.close()
+        self.connected = False
+
+
+def parse_address(text: str) -> Address:
+    if '/' in text:
+        return text
+    host, _, port = text.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+
+def main(address: Address = ('127.0.0.1', 8765)) -> None:
+    from tkinter import Tk, Canvas
+
+    root = Tk()
+    root.title(f'Viewing {address}')
+    canvas = Canvas(root, bg="white", height=450, width=800)
+    canvas.pack()
+    viewer = StreamViewer(CanvasRenderer(canvas, auto_flush=False), address)
+
+    def poll() -> None:
+        viewer.poll()
+        if viewer.connected:
+            root.after(5, poll)
+        else:
+            root.title(f'{address} hung up')
+    poll()
+    root.mainloop()
+    viewer.close()
+
+
+if __name__ == "__main__":
+    main(parse_address(sys.argv[1]) if len(sys.argv) > 1 else ('127.0.0.1', 8765))